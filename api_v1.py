@@ -0,0 +1,431 @@
+"""
+Versioned JSON REST API (v1) for complaints, notes, documents and reminders
+
+- Cursor pagination: responses carry `next_cursor`; pass it back as ?cursor=
+- Sparse fieldsets: ?fields=id,title,status limits returned (and loaded) columns
+- Related resources: ?include=notes,documents,reminders loads each relation
+  for the whole page in one extra query
+- Conditional GET: ETags derive from updated_at and child row versions read by a
+  narrow key query, so unchanged resources return 304 without loading them
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, Response, jsonify, request, abort
+from flask_login import current_user
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import load_only, selectinload
+
+from models import db, Complaint, ComplaintArticle, Note, Document, Reminder
+from utils.replicas import use_replica
+
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# Public fields per resource: name -> (model column name or None, serializer)
+COMPLAINT_FIELDS = {
+    'id': ('id', lambda c: c.id),
+    'title': ('title', lambda c: c.title),
+    'status': ('status', lambda c: c.status),
+    'jurisdiction_type': ('jurisdiction_type', lambda c: c.jurisdiction_type),
+    'state': ('state', lambda c: c.state),
+    'respondent_name': ('respondent_name', lambda c: c.respondent_name),
+    'respondent_license_number': ('respondent_license_number', lambda c: c.respondent_license_number),
+    'respondent_brokerage': ('respondent_brokerage', lambda c: c.respondent_brokerage),
+    'respondent_is_realtor': ('respondent_is_realtor', lambda c: c.respondent_is_realtor),
+    'incident_date': ('incident_date', lambda c: _iso(c.incident_date)),
+    'incident_location': ('incident_location', lambda c: c.incident_location),
+    'transaction_type': ('transaction_type', lambda c: c.transaction_type),
+    'complaint_narrative': ('complaint_narrative', lambda c: c.complaint_narrative),
+    'cited_articles': (None, lambda c: [cited.article_number for cited in c.cited_articles]),
+    'filing_deadline': ('filing_deadline', lambda c: _iso(c.filing_deadline)),
+    'deadline_status': ('deadline_status', lambda c: c.deadline_status),
+    'submitted_date': ('submitted_date', lambda c: _iso(c.submitted_date)),
+    'investigation_expected_completion': ('investigation_expected_completion',
+                                          lambda c: _iso(c.investigation_expected_completion)),
+    'investigation_completion_earliest': ('investigation_completion_earliest',
+                                          lambda c: _iso(c.investigation_completion_earliest)),
+    'investigation_completion_latest': ('investigation_completion_latest',
+                                        lambda c: _iso(c.investigation_completion_latest)),
+    'created_at': ('created_at', lambda c: _iso(c.created_at)),
+    'updated_at': ('updated_at', lambda c: _iso(c.updated_at)),
+}
+
+NOTE_FIELDS = {
+    'id': ('id', lambda n: n.id),
+    'complaint_id': ('complaint_id', lambda n: n.complaint_id),
+    'content': ('content', lambda n: n.content),
+    'note_type': ('note_type', lambda n: n.note_type),
+    'created_at': ('created_at', lambda n: _iso(n.created_at)),
+}
+
+DOCUMENT_FIELDS = {
+    'id': ('id', lambda d: d.id),
+    'complaint_id': ('complaint_id', lambda d: d.complaint_id),
+    'original_filename': ('original_filename', lambda d: d.original_filename),
+    'file_type': ('file_type', lambda d: d.file_type),
+    'file_size': ('file_size', lambda d: d.file_size),
+    'description': ('description', lambda d: d.description),
+    'processing_status': ('processing_status', lambda d: d.processing_status),
+    'detected_type': ('detected_type', lambda d: d.detected_type),
+    'page_count': ('page_count', lambda d: d.page_count),
+    'original_sha256': ('original_sha256', lambda d: d.original_sha256),
+    'uploaded_at': ('uploaded_at', lambda d: _iso(d.uploaded_at)),
+}
+
+REMINDER_FIELDS = {
+    'id': ('id', lambda r: r.id),
+    'complaint_id': ('complaint_id', lambda r: r.complaint_id),
+    'reminder_date': ('reminder_date', lambda r: _iso(r.reminder_date)),
+    'reminder_type': ('reminder_type', lambda r: r.reminder_type),
+    'message': ('message', lambda r: r.message),
+    'is_sent': ('is_sent', lambda r: r.is_sent),
+    'created_at': ('created_at', lambda r: _iso(r.created_at)),
+}
+
+INCLUDES = {
+    'notes': (Complaint.notes, Note, NOTE_FIELDS),
+    'documents': (Complaint.documents, Document, DOCUMENT_FIELDS),
+    'reminders': (Complaint.reminders, Reminder, REMINDER_FIELDS),
+}
+
+
+class ApiError(Exception):
+    """Client error rendered as a JSON problem response"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_v1.before_request
+def _read_from_replica():
+    # Every v1 endpoint is a GET that only reads
+    if request.method == 'GET':
+        use_replica()
+
+
+@api_v1.errorhandler(ApiError)
+def _handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+@api_v1.errorhandler(404)
+def _handle_not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting to the login page"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Authentication required'}), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+
+# ==================== REQUEST PARSING ====================
+
+def parse_fields(registry, param='fields'):
+    """Requested field names (always including id), or all fields"""
+    raw = request.args.get(param)
+    if not raw:
+        return list(registry)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in registry]
+    if unknown:
+        raise ApiError(f'Unknown field(s) in {param}: {", ".join(unknown)}')
+    return ['id'] + [name for name in fields if name != 'id']
+
+
+def parse_includes():
+    raw = request.args.get('include')
+    if not raw:
+        return []
+    includes = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in includes if name not in INCLUDES]
+    if unknown:
+        raise ApiError(f'Unknown include(s): {", ".join(unknown)}')
+    return includes
+
+
+def parse_limit():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Values of a cursor from encode_cursor, one per type; datetime values are stored as ISO strings"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError('wrong cursor shape')
+        decoded = []
+        for value, kind in zip(values, types):
+            if kind is datetime:
+                value = datetime.fromisoformat(value)
+            elif not isinstance(value, kind) or isinstance(value, bool):
+                raise ValueError('wrong cursor value type')
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError):
+        raise ApiError('Invalid cursor')
+
+
+def column_options(model, registry, fields):
+    """load_only() for the columns backing the requested fields"""
+    columns = {registry[name][0] for name in fields if registry[name][0]}
+    columns.add('id')
+    return load_only(*[getattr(model, column) for column in columns])
+
+
+def serialize(obj, registry, fields):
+    return {name: registry[name][1](obj) for name in fields}
+
+
+# ==================== CONDITIONAL GET ====================
+
+# Deadline status and urgency are refreshed at day rollover without touching updated_at
+COMPLAINT_VERSION_COLUMNS = (Complaint.id, Complaint.updated_at, Complaint.deadline_status, Complaint.urgency_rank)
+
+# Every serialized child column that can change after insert; ids alone cover inserts and deletes
+VERSION_COLUMNS = {
+    Note: (Note.id, Note.content, Note.note_type),
+    Document: (Document.id, Document.processing_status, Document.file_size, Document.file_type,
+               Document.description, Document.detected_type, Document.page_count),
+    Reminder: (Reminder.id, Reminder.reminder_date, Reminder.reminder_type, Reminder.message, Reminder.is_sent),
+}
+
+
+def make_etag(*parts):
+    """ETag digest over version markers (ids, updated_at values) and the request shape"""
+    return hashlib.sha1(repr(parts + (request.query_string,)).encode()).hexdigest()
+
+
+def _complaint_version(row):
+    return row.id, _iso(row.updated_at), row.deadline_status, row.urgency_rank
+
+
+def child_versions(model, complaint_ids):
+    """Version markers of a complaint's child rows, from a narrow key query"""
+    if not complaint_ids:
+        return []
+    return [tuple(row) for row in db.session.query(model.complaint_id, *VERSION_COLUMNS[model])
+            .filter(model.complaint_id.in_(complaint_ids)).order_by(model.id)]
+
+
+def article_versions(complaint_ids, fields):
+    """Cited articles of the complaints when that field is requested; they live in their own table"""
+    if 'cited_articles' not in fields or not complaint_ids:
+        return []
+    return [tuple(row) for row in db.session.query(ComplaintArticle.complaint_id, ComplaintArticle.article_number)
+            .filter(ComplaintArticle.complaint_id.in_(complaint_ids))
+            .order_by(ComplaintArticle.complaint_id, ComplaintArticle.position, ComplaintArticle.article_number)]
+
+
+def not_modified(etag):
+    """304 response if the client already holds this version, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+
+def with_etag(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _owned_complaint_version(complaint_id):
+    """Version markers of the current user's complaint, or 404"""
+    row = db.session.query(*COMPLAINT_VERSION_COLUMNS) \
+        .filter(Complaint.id == complaint_id, Complaint.user_id == current_user.id).first()
+    if row is None:
+        abort(404)
+    return row
+
+
+# ==================== COMPLAINTS ====================
+
+def _complaint_query(fields, includes):
+    options = [column_options(Complaint, COMPLAINT_FIELDS, fields)]
+    if 'cited_articles' in fields:
+        options.append(selectinload(Complaint.cited_articles))
+    for name in includes:
+        options.append(selectinload(INCLUDES[name][0]))
+    return Complaint.query.options(*options)
+
+
+def _serialize_complaint(complaint, fields, includes):
+    data = serialize(complaint, COMPLAINT_FIELDS, fields)
+    for name in includes:
+        relationship, _, registry = INCLUDES[name]
+        data[name] = [serialize(child, registry, list(registry))
+                      for child in getattr(complaint, relationship.key)]
+    return data
+
+
+@api_v1.route('/complaints')
+@api_login_required
+def list_complaints():
+    """Current user's complaints, most recently updated first"""
+    fields = parse_fields(COMPLAINT_FIELDS)
+    includes = parse_includes()
+    limit = parse_limit()
+
+    keys = db.session.query(*COMPLAINT_VERSION_COLUMNS).filter(Complaint.user_id == current_user.id)
+    status = request.args.get('status')
+    if status:
+        keys = keys.filter(Complaint.status == status)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        updated_at, last_id = decode_cursor(cursor, datetime, int)
+        keys = keys.filter(or_(Complaint.updated_at < updated_at,
+                               and_(Complaint.updated_at == updated_at, Complaint.id < last_id)))
+
+    # Resolve the page with an index-only key query first; the ETag comes from it
+    page = keys.order_by(Complaint.updated_at.desc(), Complaint.id.desc()).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    ids = [row.id for row in page]
+    etag = make_etag('complaints', current_user.id, [_complaint_version(row) for row in page],
+                     article_versions(ids, fields), [child_versions(INCLUDES[name][1], ids) for name in includes])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    complaints = {c.id: c for c in _complaint_query(fields, includes).filter(Complaint.id.in_(ids))} if ids else {}
+
+    next_cursor = encode_cursor([_iso(page[-1].updated_at), page[-1].id]) if has_more else None
+    return with_etag({
+        'data': [_serialize_complaint(complaints[complaint_id], fields, includes) for complaint_id in ids],
+        'next_cursor': next_cursor
+    }, etag)
+
+
+@api_v1.route('/complaints/<int:complaint_id>')
+@api_login_required
+def get_complaint(complaint_id):
+    """Single complaint, optionally with related resources"""
+    fields = parse_fields(COMPLAINT_FIELDS)
+    includes = parse_includes()
+
+    version = _owned_complaint_version(complaint_id)
+    etag = make_etag('complaint', *_complaint_version(version), article_versions([version.id], fields),
+                     [child_versions(INCLUDES[name][1], [version.id]) for name in includes])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    complaint = _complaint_query(fields, includes).filter(Complaint.id == complaint_id).one()
+    return with_etag({'data': _serialize_complaint(complaint, fields, includes)}, etag)
+
+
+def _child_collection(model, registry, complaint_id):
+    """Cursor-paginated children of one complaint in id order"""
+    fields = parse_fields(registry)
+    limit = parse_limit()
+    _owned_complaint_version(complaint_id)
+
+    keys = db.session.query(*VERSION_COLUMNS[model]).filter(model.complaint_id == complaint_id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        last_id, = decode_cursor(cursor, int)
+        keys = keys.filter(model.id > last_id)
+    page = keys.order_by(model.id).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    etag = make_etag(model.__tablename__, complaint_id, [tuple(row) for row in page])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    ids = [row.id for row in page]
+    rows = {row.id: row for row in model.query.options(column_options(model, registry, fields))
+            .filter(model.id.in_(ids))} if ids else {}
+    return with_etag({
+        'data': [serialize(rows[row_id], registry, fields) for row_id in ids],
+        'next_cursor': encode_cursor([ids[-1]]) if has_more else None
+    }, etag)
+
+
+@api_v1.route('/complaints/<int:complaint_id>/notes')
+@api_login_required
+def list_notes(complaint_id):
+    """Notes on a complaint in id order"""
+    return _child_collection(Note, NOTE_FIELDS, complaint_id)
+
+
+@api_v1.route('/complaints/<int:complaint_id>/documents')
+@api_login_required
+def list_documents(complaint_id):
+    """Documents on a complaint in id order"""
+    return _child_collection(Document, DOCUMENT_FIELDS, complaint_id)
+
+
+@api_v1.route('/complaints/<int:complaint_id>/reminders')
+@api_login_required
+def list_complaint_reminders(complaint_id):
+    """Reminders for a complaint in id order"""
+    return _child_collection(Reminder, REMINDER_FIELDS, complaint_id)
+
+
+# ==================== REMINDERS ====================
+
+@api_v1.route('/reminders')
+@api_login_required
+def list_reminders():
+    """Current user's reminders, soonest first; ?pending=1 hides sent reminders"""
+    fields = parse_fields(REMINDER_FIELDS)
+    limit = parse_limit()
+
+    keys = db.session.query(*VERSION_COLUMNS[Reminder]).filter(Reminder.user_id == current_user.id)
+    if request.args.get('pending'):
+        keys = keys.filter(Reminder.is_sent.is_(False))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        reminder_date, last_id = decode_cursor(cursor, datetime, int)
+        keys = keys.filter(or_(Reminder.reminder_date > reminder_date,
+                               and_(Reminder.reminder_date == reminder_date, Reminder.id > last_id)))
+
+    page = keys.order_by(Reminder.reminder_date, Reminder.id).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    etag = make_etag('reminders', current_user.id, [tuple(row) for row in page])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    ids = [row.id for row in page]
+    reminders = {r.id: r for r in Reminder.query.options(column_options(Reminder, REMINDER_FIELDS, fields))
+                 .filter(Reminder.id.in_(ids))} if ids else {}
+    return with_etag({
+        'data': [serialize(reminders[reminder_id], REMINDER_FIELDS, fields) for reminder_id in ids],
+        'next_cursor': encode_cursor([_iso(page[-1].reminder_date), page[-1].id]) if has_more else None
+    }, etag)
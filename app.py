@@ -4,21 +4,29 @@ Assists consumers and REALTORS® in filing complaints against real estate profes
 """
 import os
 import json
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
+from functools import wraps
+import click
 from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 
+from api_v1 import api_v1
 from config import Config
-from models import db, User, Complaint, Document, Note, Reminder
+from models import (
+    db, Tenant, User, Complaint, Document, Note, Reminder, OutboxEvent, WebhookSubscription, upgrade_schema
+)
 from utils.nar_code_articles import get_all_articles, get_article, search_articles, get_articles_list
 from utils.deadline_calculator import (
     calculate_filing_deadline,
     calculate_reminder_dates,
     days_until_deadline,
-    get_deadline_status,
-    estimate_investigation_completion
+    get_deadline_status
 )
+from utils.drafts import DraftConflict, autosave_draft, parse_draft_fields
+from utils.investigation_estimates import rebuild_duration_stats, refresh_open_estimates
+from utils.jurisdiction import determine_jurisdiction, screen_batch
 from utils.state_forms import (
     get_state_requirements,
     get_nar_requirements,
@@ -26,6 +34,85 @@ from utils.state_forms import (
     get_required_documents,
     get_filing_checklist
 )
+from utils.metrics import init_metrics, record_upload
+from utils.fragment_cache import init_fragment_cache
+from utils.assets import build_assets, init_assets, vendor_assets
+from utils.rate_limit import init_rate_limit, rate_limit
+from utils.replicas import init_replicas, replica_reads, replica_bind_keys, measure_lags
+from utils.document_jobs import (
+    enqueue_document_processing,
+    enqueue_unprocessed_documents,
+    optimize_existing_documents,
+    relocate_thumbnails
+)
+from utils.image_optimization import sha256_file
+from utils.jobs import run_worker
+from utils.article_index import (
+    normalize_article_number,
+    set_complaint_articles,
+    complaints_citing,
+    article_counts,
+    backfill_complaint_articles
+)
+from utils.deadline_status import refresh_deadline_statuses, get_expiring_complaints
+from utils.status_transitions import (
+    transition_complaints,
+    allowed_transitions,
+    TransitionConflict,
+    OWNER_TRANSITIONS
+)
+from utils.rollups import complaint_report, rebuild_rollups
+from utils.scheduler import init_scheduler
+from utils.outbox import (
+    record_event,
+    complaint_payload,
+    document_payload,
+    note_payload,
+    COMPLAINT_CREATED,
+    DOCUMENT_UPLOADED,
+    NOTE_ADDED,
+    EVENT_TYPES
+)
+from utils.webhooks import run_dispatcher, prune_outbox, generate_secret
+from utils.webhook_sink import WebhookSink
+from utils.rate_limit_server import RateLimitServer
+from utils.reminder_digest import send_due_reminders
+from utils.review_queue import (
+    ClaimLost,
+    claim_complaint,
+    claim_next,
+    claims_held_by,
+    decide,
+    decode_cursor,
+    encode_cursor,
+    queue_size,
+    release_claim,
+    review_queue,
+    DECISIONS
+)
+from utils.storage_gc import collect_orphaned_files
+from utils.tenants import (
+    create_tenant, init_tenant_databases, init_tenants, run_per_database, tenant_database_slugs, tenant_folder,
+    tenant_option
+)
+from utils.archive import (
+    archive_closed_complaints,
+    archived_complaints_for_user,
+    load_archived_complaint,
+    restore_complaint
+)
+from utils.backup import (
+    BackupError,
+    list_snapshots,
+    restore_snapshot,
+    snapshot_databases,
+    snapshot_manifest,
+    sqlite_databases,
+    verify_snapshot
+)
+from utils.synthetic_data import seed_database
+from utils.load_test import run_load_test
+from utils.profiler import init_profiler, list_profiles, generate_profile_token, PROFILE_EXTENSION
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -36,6 +123,14 @@ db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+init_metrics(app)
+init_profiler(app)
+init_rate_limit(app)
+init_replicas(app)
+init_tenants(app, db.session)
+init_fragment_cache(app, db.session)
+init_assets(app)
+app.register_blueprint(api_v1)
 
 
 @login_manager.user_loader
@@ -44,6 +139,28 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
+def admin_required(view):
+    """Restrict a view to users listed in ADMIN_EMAILS"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def reviewer_required(view):
+    """Restrict a view to agency staff (REVIEWER_EMAILS and administrators)"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_reviewer:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
@@ -59,6 +176,7 @@ def index():
 
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', methods=('POST',))
 def register():
     """User registration"""
     if request.method == 'POST':
@@ -69,8 +187,8 @@ def register():
         phone = request.form.get('phone')
         user_type = request.form.get('user_type')
 
-        # Check if user exists
-        existing_user = User.query.filter_by(email=email).first()
+        # Check if user exists; addresses are unique across tenants sharing a database
+        existing_user = User.query.filter_by(email=email).execution_options(all_tenants=True).first()
         if existing_user:
             flash('Email already registered. Please login.', 'warning')
             return redirect(url_for('login'))
@@ -95,6 +213,7 @@ def register():
 
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', methods=('POST',), account=lambda: request.form.get('email'))
 def login():
     """User login"""
     if request.method == 'POST':
@@ -125,18 +244,26 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@replica_reads
 def dashboard():
     """User dashboard showing all complaints"""
-    complaints = Complaint.query.filter_by(user_id=current_user.id).order_by(Complaint.updated_at.desc()).all()
+    sort = request.args.get('sort', 'updated')
+    query = Complaint.query.filter_by(user_id=current_user.id)
+    if sort == 'urgency':
+        query = query.order_by(Complaint.urgency_rank.asc(), Complaint.filing_deadline.asc())
+    else:
+        query = query.order_by(Complaint.updated_at.desc())
+    complaints = query.all()
+    archived = archived_complaints_for_user(current_user.id)
 
-    # Add deadline status to each complaint
-    for complaint in complaints:
-        if complaint.filing_deadline:
-            complaint.deadline_info = get_deadline_status(complaint.filing_deadline)
-        else:
-            complaint.deadline_info = None
+    # Rows are fragment-cached per complaint version and day; deadline status is computed on a miss
+    return render_template('dashboard.html', complaints=complaints, sort=sort, archived=archived, today=date.today())
 
-    return render_template('dashboard.html', complaints=complaints)
+
+@app.template_filter('deadline_info')
+def deadline_info_filter(filing_deadline):
+    """Deadline status for a filing deadline, or None when it is not set"""
+    return get_deadline_status(filing_deadline) if filing_deadline else None
 
 
 @app.route('/jurisdiction-screening', methods=['GET', 'POST'])
@@ -165,29 +292,6 @@ def jurisdiction_screening():
     return render_template('jurisdiction_screening.html', states=states)
 
 
-def determine_jurisdiction(screening):
-    """Determine appropriate jurisdiction based on screening"""
-    if screening['seeks_damages'] or screening['violation_type'] == 'contract_dispute':
-        return {
-            'type': 'civil_court',
-            'agency': 'Civil Court / Attorney',
-            'message': 'This appears to be a contract dispute. You may need to consult an attorney or file in civil court.'
-        }
-
-    if screening['is_realtor'] and screening['violation_type'] == 'ethics_violation':
-        return {
-            'type': 'nar_association',
-            'agency': 'Local REALTOR® Association',
-            'message': 'This is an ethics complaint against a NAR member. File with your local REALTOR® association.'
-        }
-
-    return {
-        'type': 'state_board',
-        'agency': f'{screening["state"]} Real Estate Commission',
-        'message': 'This is a license law complaint. File with your state licensing board.'
-    }
-
-
 @app.route('/complaint/new', methods=['GET', 'POST'])
 @login_required
 def new_complaint():
@@ -215,39 +319,38 @@ def new_complaint():
 
         # Selected NAR articles (if applicable)
         selected_articles = request.form.getlist('nar_articles')
-        alleged_violations = json.dumps(selected_articles) if selected_articles else None
 
         # Calculate deadline
         filing_deadline = calculate_filing_deadline(incident_date, jurisdiction_type, state)
 
-        # Create complaint
-        complaint = Complaint(
-            user_id=current_user.id,
-            title=title,
-            jurisdiction_type=jurisdiction_type,
-            state=state,
-            respondent_name=respondent_name,
-            respondent_license_number=respondent_license_number,
-            respondent_brokerage=respondent_brokerage,
-            respondent_is_realtor=respondent_is_realtor,
-            incident_date=incident_date,
-            incident_location=incident_location,
-            transaction_type=transaction_type,
-            complaint_narrative=complaint_narrative,
-            alleged_violations=alleged_violations,
-            filing_deadline=filing_deadline
-        )
-
-        db.session.add(complaint)
-        db.session.commit()
-
-        # Create initial note
-        note = Note(
-            complaint_id=complaint.id,
-            content='Complaint created',
-            note_type='system'
-        )
-        db.session.add(note)
+        # Finish an autosaved draft, or create the complaint
+        draft_id = request.form.get('draft_id', type=int)
+        if draft_id:
+            complaint = Complaint.query.filter_by(id=draft_id, user_id=current_user.id, status='draft').first_or_404()
+            complaint.version = (complaint.version or 1) + 1
+            Reminder.query.filter_by(complaint_id=complaint.id, reminder_type='filing_deadline', is_sent=False) \
+                .delete(synchronize_session=False)
+        else:
+            complaint = Complaint(user_id=current_user.id)
+
+        complaint.title = title
+        complaint.jurisdiction_type = jurisdiction_type
+        complaint.state = state
+        complaint.respondent_name = respondent_name
+        complaint.respondent_license_number = respondent_license_number
+        complaint.respondent_brokerage = respondent_brokerage
+        complaint.respondent_is_realtor = respondent_is_realtor
+        complaint.incident_date = incident_date
+        complaint.incident_location = incident_location
+        complaint.transaction_type = transaction_type
+        complaint.complaint_narrative = complaint_narrative
+        complaint.filing_deadline = filing_deadline
+        set_complaint_articles(complaint, selected_articles)
+
+        if not draft_id:
+            db.session.add(complaint)
+            db.session.flush()
+            _record_complaint_created(complaint)
 
         # Create deadline reminders
         if filing_deadline:
@@ -264,25 +367,85 @@ def new_complaint():
 
         db.session.commit()
 
-        flash('Complaint created successfully!', 'success')
+        flash('Complaint saved successfully!' if draft_id else 'Complaint created successfully!', 'success')
         return redirect(url_for('view_complaint', complaint_id=complaint.id))
 
-    # GET request - show form
-    jurisdiction = session.get('jurisdiction', {})
+    # GET request - show form, resuming an autosaved draft if asked
+    draft = None
+    draft_id = request.args.get('draft', type=int)
+    if draft_id:
+        draft = Complaint.query.filter_by(id=draft_id, user_id=current_user.id, status='draft').first_or_404()
+    jurisdiction = {} if draft else session.get('jurisdiction', {})
     nar_articles = get_articles_list()
     states = get_all_states()
 
     return render_template('complaint_form.html',
                          jurisdiction=jurisdiction,
+                         draft=draft,
+                         draft_articles={cited.article_number for cited in draft.cited_articles} if draft else set(),
                          nar_articles=nar_articles,
                          states=states)
 
 
+def _record_complaint_created(complaint):
+    """Outbox event and timeline note for a newly inserted (flushed) complaint"""
+    record_event(COMPLAINT_CREATED, complaint_payload(complaint))
+    db.session.add(Note(complaint_id=complaint.id, content='Complaint created', note_type='system'))
+
+
+@app.route('/api/drafts', methods=['POST'])
+@login_required
+def create_draft():
+    """Start a draft complaint from the form's first autosave"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        values = parse_draft_fields(data.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    values.setdefault('title', 'Untitled draft')
+
+    complaint = Complaint(user_id=current_user.id, status='draft', version=1, **values)
+    db.session.add(complaint)
+    db.session.flush()
+    _record_complaint_created(complaint)
+    db.session.commit()
+    return jsonify({'id': complaint.id, 'version': complaint.version}), 201
+
+
+@app.route('/api/drafts/<int:complaint_id>', methods=['PATCH'])
+@login_required
+def autosave_draft_route(complaint_id):
+    """Autosave changed fields and narrative edits to a draft"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    if not isinstance(data.get('version'), int):
+        return jsonify({'error': 'version is required'}), 400
+    try:
+        version = autosave_draft(complaint_id, current_user.id, data['version'], fields=data.get('fields'),
+                                 edits=data.get('edits'), narrative_length=data.get('narrative_length'))
+    except LookupError:
+        return jsonify({'error': 'Draft not found'}), 404
+    except DraftConflict as e:
+        db.session.rollback()
+        return jsonify({'error': 'This draft was changed in another window', 'version': e.version}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify({'version': version})
+
+
 @app.route('/complaint/<int:complaint_id>')
 @login_required
+@replica_reads
 def view_complaint(complaint_id):
     """View complaint details"""
-    complaint = Complaint.query.get_or_404(complaint_id)
+    complaint = db.session.get(Complaint, complaint_id) or load_archived_complaint(complaint_id)
+    if complaint is None:
+        abort(404)
+    archived = hasattr(complaint, 'archived_at')
 
     # Check ownership
     if complaint.user_id != current_user.id:
@@ -304,17 +467,22 @@ def view_complaint(complaint_id):
     else:
         jurisdiction_info = None
 
-    # Parse alleged violations
-    alleged_violations = []
-    if complaint.alleged_violations:
+    # Cited NAR articles (legacy rows not yet backfilled still carry JSON)
+    if complaint.cited_articles:
+        article_numbers = [cited.article_number for cited in complaint.cited_articles]
+    elif complaint.alleged_violations:
         article_numbers = json.loads(complaint.alleged_violations)
-        for article_num in article_numbers:
-            article = get_article(article_num)
-            if article:
-                alleged_violations.append({
-                    'number': article_num,
-                    'data': article
-                })
+    else:
+        article_numbers = []
+
+    alleged_violations = []
+    for article_num in article_numbers:
+        article = get_article(article_num)
+        if article:
+            alleged_violations.append({
+                'number': article_num,
+                'data': article
+            })
 
     return render_template('complaint_detail.html',
                          complaint=complaint,
@@ -322,7 +490,9 @@ def view_complaint(complaint_id):
                          required_docs=required_docs,
                          filing_checklist=filing_checklist,
                          jurisdiction_info=jurisdiction_info,
-                         alleged_violations=alleged_violations)
+                         alleged_violations=alleged_violations,
+                         archived=archived,
+                         next_statuses=[] if archived else allowed_transitions(complaint.status, OWNER_TRANSITIONS))
 
 
 @app.route('/complaint/<int:complaint_id>/upload', methods=['GET', 'POST'])
@@ -353,10 +523,16 @@ def upload_document(complaint_id):
             unique_filename = f"{complaint.id}_{timestamp}_{filename}"
 
             # Ensure upload directory exists
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            upload_folder = tenant_folder('UPLOAD_FOLDER')
+            os.makedirs(upload_folder, exist_ok=True)
 
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+            file_path = os.path.join(upload_folder, unique_filename)
+            save_started = time.perf_counter()
             file.save(file_path)
+            file_size = os.path.getsize(file_path)
+            record_upload(file_size, time.perf_counter() - save_started)
+            # Hash the bytes as uploaded, before any processing stage rewrites the file
+            original_sha256 = sha256_file(file_path)
 
             # Create document record
             document = Document(
@@ -365,23 +541,36 @@ def upload_document(complaint_id):
                 original_filename=filename,
                 file_path=file_path,
                 file_type=request.form.get('file_type'),
-                file_size=os.path.getsize(file_path),
+                file_size=file_size,
+                original_file_size=file_size,
+                original_sha256=original_sha256,
                 description=request.form.get('description')
             )
 
-            db.session.add(document)
+            try:
+                db.session.add(document)
+                db.session.flush()
 
-            # Add note
-            note = Note(
-                complaint_id=complaint.id,
-                content=f'Document uploaded: {filename}',
-                note_type='system'
-            )
-            db.session.add(note)
+                # Text extraction, thumbnails and type validation run in the job worker
+                enqueue_document_processing(document)
+                record_event(DOCUMENT_UPLOADED, document_payload(document))
 
-            db.session.commit()
+                # Add note
+                note = Note(
+                    complaint_id=complaint.id,
+                    content=f'Document uploaded: {filename}',
+                    note_type='system'
+                )
+                db.session.add(note)
+
+                db.session.commit()
+            except Exception:
+                # Don't leave the saved file behind for the storage GC to find
+                db.session.rollback()
+                os.remove(file_path)
+                raise
 
-            flash('Document uploaded successfully!', 'success')
+            flash('Document uploaded successfully! It will be processed in the background.', 'success')
             return redirect(url_for('view_complaint', complaint_id=complaint.id))
         else:
             flash('File type not allowed', 'danger')
@@ -389,6 +578,22 @@ def upload_document(complaint_id):
     return render_template('document_upload.html', complaint=complaint)
 
 
+@app.route('/document/<int:document_id>/thumbnail')
+@login_required
+@replica_reads
+def document_thumbnail(document_id):
+    """Serve the preview thumbnail for a processed document"""
+    # Joined through the tenant-filtered complaint: documents carry no tenant of their own
+    document = Document.query.join(Complaint, Complaint.id == Document.complaint_id) \
+        .filter(Document.id == document_id, Complaint.user_id == current_user.id).first_or_404()
+
+    if not document.thumbnail_path:
+        abort(404)
+
+    return send_from_directory(os.path.dirname(document.thumbnail_path),
+                               os.path.basename(document.thumbnail_path))
+
+
 @app.route('/complaint/<int:complaint_id>/note', methods=['POST'])
 @login_required
 def add_note(complaint_id):
@@ -407,13 +612,38 @@ def add_note(complaint_id):
             note_type='user'
         )
         db.session.add(note)
+        db.session.flush()
+        record_event(NOTE_ADDED, note_payload(note))
         db.session.commit()
         flash('Note added successfully!', 'success')
 
     return redirect(url_for('view_complaint', complaint_id=complaint.id))
 
 
+@app.route('/complaint/<int:complaint_id>/status', methods=['POST'])
+@login_required
+def change_status(complaint_id):
+    """Submit or close one of the current user's complaints"""
+    new_status = request.form.get('status')
+    try:
+        result = transition_complaints([complaint_id], new_status,
+                                       comment=request.form.get('comment') or None,
+                                       user_id=current_user.id,
+                                       transitions=OWNER_TRANSITIONS)
+    except (ValueError, TransitionConflict) as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('view_complaint', complaint_id=complaint_id))
+
+    if result['updated']:
+        db.session.commit()
+        flash(f'Complaint marked as {new_status.replace("_", " ")}.', 'success')
+    else:
+        flash(f'Status not changed: {result["skipped"][complaint_id]}.', 'danger')
+    return redirect(url_for('view_complaint', complaint_id=complaint_id))
+
+
 @app.route('/education')
+@replica_reads
 def education():
     """Educational resources page"""
     nar_articles = get_all_articles()
@@ -421,6 +651,7 @@ def education():
 
 
 @app.route('/api/nar-articles')
+@rate_limit('public_api')
 def api_nar_articles():
     """API endpoint for NAR articles"""
     search_term = request.args.get('q', '')
@@ -430,7 +661,48 @@ def api_nar_articles():
     return jsonify(get_all_articles())
 
 
+@app.route('/api/nar-articles/counts')
+@login_required
+@replica_reads
+def api_nar_article_counts():
+    """API endpoint for complaint counts per cited article (all complaints for admins)"""
+    counts = article_counts(user_id=None if current_user.is_admin else current_user.id)
+    return jsonify(counts)
+
+
+@app.route('/api/nar-articles/<article_number>/complaints')
+@login_required
+@replica_reads
+def api_complaints_by_article(article_number):
+    """API endpoint for complaints citing an article (all complaints for admins)"""
+    article_number = normalize_article_number(article_number)
+    if not article_number:
+        abort(404)
+
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    complaints = complaints_citing(article_number,
+                                   user_id=None if current_user.is_admin else current_user.id,
+                                   before_id=request.args.get('before', type=int),
+                                   limit=limit)
+    return jsonify({
+        'article': article_number,
+        'complaints': [
+            {
+                'id': complaint.id,
+                'title': complaint.title,
+                'status': complaint.status,
+                'state': complaint.state,
+                'jurisdiction_type': complaint.jurisdiction_type,
+                'created_at': complaint.created_at.isoformat()
+            }
+            for complaint in complaints
+        ],
+        'next_before': complaints[-1].id if len(complaints) == limit else None
+    })
+
+
 @app.route('/api/deadline-calculator', methods=['POST'])
+@rate_limit('public_api')
 def api_deadline_calculator():
     """API endpoint for deadline calculation"""
     data = request.json
@@ -449,9 +721,657 @@ def api_deadline_calculator():
     })
 
 
+@app.route('/api/screen', methods=['POST'])
+@rate_limit('public_api')
+def api_screen():
+    """Batch jurisdiction screening of intake records"""
+    data = request.get_json(silent=True) or {}
+    records = data.get('records') if isinstance(data, dict) else None
+    if not isinstance(records, list):
+        return jsonify({'error': 'records must be a list of screening objects'}), 400
+    if len(records) > app.config['SCREEN_BATCH_MAX']:
+        return jsonify({'error': f"At most {app.config['SCREEN_BATCH_MAX']} records per request"}), 400
+
+    return jsonify({'results': screen_batch(records)})
+
+
+# ==================== REVIEW QUEUE ====================
+
+@app.route('/review')
+@reviewer_required
+def review_queue_view():
+    """Submitted complaints awaiting review, most urgent filing deadline first"""
+    try:
+        after = decode_cursor(request.args.get('after'))
+    except ValueError:
+        abort(400)
+    rows, next_cursor = review_queue(after=after, limit=app.config['REVIEW_QUEUE_PAGE_SIZE'])
+    return render_template('review_queue.html',
+                           rows=rows,
+                           next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+                           first_page=after is None,
+                           total=queue_size(),
+                           my_claims=claims_held_by(current_user.id),
+                           now=datetime.utcnow())
+
+
+@app.route('/review/claim-next', methods=['POST'])
+@reviewer_required
+def review_claim_next():
+    """Claim the most urgent unclaimed complaint"""
+    complaint_id = claim_next(current_user.id)
+    if complaint_id is None:
+        flash('No unclaimed complaints are waiting for review.', 'info')
+        return redirect(url_for('review_queue_view'))
+    return redirect(url_for('review_complaint', complaint_id=complaint_id))
+
+
+@app.route('/review/<int:complaint_id>')
+@reviewer_required
+def review_complaint(complaint_id):
+    """A complaint as seen by a reviewer, with claim and decision controls"""
+    complaint = Complaint.query.get_or_404(complaint_id)
+    reviewer = db.session.get(User, complaint.review_claimed_by) if complaint.review_claimed_by else None
+    now = datetime.utcnow()
+    claim_active = complaint.review_lease_expires_at is not None and complaint.review_lease_expires_at > now
+    if complaint.cited_articles:
+        article_numbers = [cited.article_number for cited in complaint.cited_articles]
+    elif complaint.alleged_violations:
+        article_numbers = json.loads(complaint.alleged_violations)
+    else:
+        article_numbers = []
+    return render_template('review_complaint.html',
+                           complaint=complaint,
+                           reviewer=reviewer,
+                           claim_active=claim_active,
+                           held_by_me=claim_active and complaint.review_claimed_by == current_user.id,
+                           alleged_violations=[(number, get_article(number)) for number in article_numbers],
+                           deadline_info=get_deadline_status(complaint.filing_deadline) if complaint.filing_deadline else None,
+                           decisions=DECISIONS)
+
+
+@app.route('/review/<int:complaint_id>/claim', methods=['POST'])
+@reviewer_required
+def review_claim(complaint_id):
+    """Claim a specific complaint, or renew your claim on it"""
+    try:
+        claim_complaint(complaint_id, current_user.id)
+    except LookupError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('review_queue_view'))
+    except ClaimLost as e:
+        flash(str(e), 'warning')
+    return redirect(url_for('review_complaint', complaint_id=complaint_id))
+
+
+@app.route('/review/<int:complaint_id>/release', methods=['POST'])
+@reviewer_required
+def review_release(complaint_id):
+    """Return a claimed complaint to the queue"""
+    if release_claim(complaint_id, current_user.id):
+        flash('Complaint returned to the review queue.', 'info')
+    return redirect(url_for('review_queue_view'))
+
+
+@app.route('/review/<int:complaint_id>/decide', methods=['POST'])
+@reviewer_required
+def review_decide(complaint_id):
+    """Accept a claimed complaint for investigation or close it"""
+    decision = request.form.get('decision')
+    try:
+        result = decide(complaint_id, current_user.id, decision, comment=request.form.get('comment') or None)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('review_complaint', complaint_id=complaint_id))
+    except (ClaimLost, TransitionConflict) as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('review_complaint', complaint_id=complaint_id))
+
+    if not result['updated']:
+        db.session.rollback()
+        flash(f'Status not changed: {result["skipped"][complaint_id]}.', 'danger')
+        return redirect(url_for('review_complaint', complaint_id=complaint_id))
+    db.session.commit()
+    flash(f'Complaint marked as {decision.replace("_", " ")}.', 'success')
+    return redirect(url_for('review_queue_view'))
+
+
+# ==================== ADMIN ====================
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """List captured request profiles grouped by endpoint"""
+    profiles = list_profiles(app.config['PROFILER_DIR'])
+    return render_template('admin_profiles.html',
+                         profiles=profiles,
+                         profiler_enabled=app.config['PROFILER_ENABLED'])
+
+
+@app.route('/admin/profiles/<filename>')
+@admin_required
+def download_profile(filename):
+    """Download a single collapsed-stack profile"""
+    if not filename.endswith(PROFILE_EXTENSION):
+        abort(404)
+    return send_from_directory(app.config['PROFILER_DIR'], filename, as_attachment=True)
+
+
+@app.route('/api/admin/expiring-complaints')
+@admin_required
+@replica_reads
+def api_expiring_complaints():
+    """API endpoint listing complaints whose filing deadline is within N days"""
+    days = request.args.get('days', 7, type=int)
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    statuses = request.args.getlist('status')
+    complaints = get_expiring_complaints(days, statuses=statuses, limit=limit)
+    return jsonify([
+        {
+            'id': complaint.id,
+            'user_id': complaint.user_id,
+            'title': complaint.title,
+            'status': complaint.status,
+            'state': complaint.state,
+            'jurisdiction_type': complaint.jurisdiction_type,
+            'filing_deadline': complaint.filing_deadline.isoformat(),
+            'days_remaining': days_until_deadline(complaint.filing_deadline),
+            'deadline_status': complaint.deadline_status
+        }
+        for complaint in complaints
+    ])
+
+
+@app.route('/api/admin/reports/complaints')
+@admin_required
+@replica_reads
+def api_complaint_report():
+    """Filed complaint counts by state, jurisdiction type, transaction type, article or month, from the rollups"""
+    group_by = request.args.get('by', 'month')
+    start_month = request.args.get('from') or None
+    end_month = request.args.get('to') or None
+    try:
+        report = complaint_report(group_by, start_month=start_month, end_month=end_month,
+                                  statuses=request.args.getlist('status'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'by': group_by, 'from': start_month, 'to': end_month, **report})
+
+
+@app.route('/api/admin/complaints/transition', methods=['POST'])
+@admin_required
+def api_transition_complaints():
+    """Move many complaints to a new status in one set-based update"""
+    data = request.get_json(silent=True) or {}
+    complaint_ids = data.get('complaint_ids')
+    if not isinstance(complaint_ids, list) or not all(isinstance(i, int) for i in complaint_ids):
+        return jsonify({'error': 'complaint_ids must be a list of integers'}), 400
+    if len(complaint_ids) > app.config['BULK_TRANSITION_MAX']:
+        return jsonify({'error': f'At most {app.config["BULK_TRANSITION_MAX"]} complaints per request'}), 400
+
+    try:
+        result = transition_complaints(complaint_ids, data.get('status'), comment=data.get('comment'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except TransitionConflict as e:
+        return jsonify({'error': str(e)}), 409
+
+    db.session.commit()
+    return jsonify({
+        'updated': result['updated'],
+        'skipped': {str(complaint_id): reason for complaint_id, reason in result['skipped'].items()}
+    })
+
+
+# ==================== CLI ====================
+
+@app.cli.command('profile-token')
+def profile_token_command():
+    """Print a signed X-Profile-Request header value"""
+    click.echo(generate_profile_token(app))
+
+
+@app.cli.command('refresh-deadlines')
+@tenant_option
+@click.option('--full', is_flag=True, help='Recompute every complaint instead of boundary windows')
+def refresh_deadlines_command(full):
+    """Refresh materialized deadline statuses (normally run nightly by the scheduler)"""
+    updated = refresh_deadline_statuses(full=full)
+    click.echo(f'Updated deadline status on {updated:,} complaints')
+
+
+@app.cli.command('rebuild-rollups')
+@tenant_option
+def rebuild_rollups_command():
+    """Recount the report rollups from all filed complaints (normally maintained as statuses change)"""
+    counted = rebuild_rollups()
+    click.echo(f'Counted {counted:,} filed complaints')
+
+
+@app.cli.command('rebuild-duration-stats')
+@tenant_option
+@click.option('--refresh-open', is_flag=True, help='Then re-estimate completion for submitted and under-review complaints')
+def rebuild_duration_stats_command(refresh_open):
+    """Recount investigation durations from all closed complaints (normally maintained as complaints close)"""
+    try:
+        counted = rebuild_duration_stats()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Counted {counted:,} closed complaints')
+    if refresh_open:
+        click.echo(f'Re-estimated {refresh_open_estimates():,} open complaints')
+
+
+@app.cli.command('vendor-assets')
+@click.option('--force', is_flag=True, help='Download again even if the files exist')
+def vendor_assets_command(force):
+    """Download the pinned Bootstrap and icon files into assets/vendor/ (commit them afterwards)"""
+    fetched = vendor_assets(app.config['ASSETS_SOURCE_DIR'], force=force)
+    click.echo(f'Fetched {len(fetched)} vendor files')
+    for name in fetched:
+        click.echo(f'  {name}')
+
+
+@app.cli.command('build-assets')
+@click.option('--allow-cdn', is_flag=True, help='Link the pinned CDN copies of missing vendor files instead of failing')
+def build_assets_command(allow_cdn):
+    """Minify, fingerprint and precompress static assets into the build directory"""
+    try:
+        manifest = build_assets(app.config['ASSETS_SOURCE_DIR'], app.config['ASSETS_BUILD_DIR'],
+                                allow_cdn=allow_cdn)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    for name, entry in sorted(manifest.items()):
+        click.echo(f"{name} -> {entry['path'] or '(not built)'}")
+        for url in entry['external']:
+            click.echo(f'  from CDN until vendored: {url}')
+
+
+@app.cli.command('send-reminders')
+@tenant_option
+@click.option('--date', 'run_date', default=None, type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Treat this day as today (YYYY-MM-DD)')
+@click.option('--force', is_flag=True, help="Run even if today's reminders were already sent")
+@click.option('--dry-run', is_flag=True, help='Count emails without sending or marking reminders')
+def send_reminders_command(run_date, force, dry_run):
+    """Email due reminders, one digest per user (normally run daily by the scheduler)"""
+    totals = send_due_reminders(today=run_date.date() if run_date else None, force=force, dry_run=dry_run)
+    if totals is None:
+        click.echo("Today's reminders were already sent (use --force to run again)")
+        return
+    click.echo(f"{'Would send' if dry_run else 'Sent'} {totals['emails']:,} emails covering "
+               f"{totals['reminders']:,} reminders for {totals['users']:,} users "
+               f"({totals['retired']:,} reminders on closed complaints retired)")
+
+
+@app.cli.command('archive-complaints')
+@tenant_option
+@click.option('--older-than-days', default=None, type=int, help='Closed for at least this long (default ARCHIVE_AFTER_DAYS)')
+@click.option('--batch-size', default=100, show_default=True, help='Complaints moved per transaction')
+@click.option('--dry-run', is_flag=True, help='Count what would be archived without moving anything')
+def archive_complaints_command(older_than_days, batch_size, dry_run):
+    """Move long-closed complaints and their files into compressed cold storage"""
+    progress = None if dry_run else (lambda totals: click.echo(f"  {totals['complaints']:,} complaints archived..."))
+    totals = archive_closed_complaints(older_than_days=older_than_days, batch_size=batch_size,
+                                       dry_run=dry_run, progress=progress)
+    click.echo(f"{'Would archive' if dry_run else 'Archived'} {totals['complaints']:,} complaints with "
+               f"{totals.get('notes', 0):,} notes, {totals.get('documents', 0):,} documents and "
+               f"{totals.get('reminders', 0):,} reminders")
+    if totals['files']:
+        click.echo(f"Compressed {totals['files']:,} files from {totals['bytes_before']:,} to {totals['bytes_after']:,} bytes")
+
+
+@app.cli.command('gc-uploads')
+@click.option('--delete', 'action', flag_value='delete', help='Delete orphans instead of quarantining them')
+@click.option('--quarantine', 'action', flag_value='quarantine', default=True, help='Move orphans to QUARANTINE_FOLDER (default)')
+@click.option('--min-age-hours', default=None, type=float, help='Skip files newer than this (default STORAGE_GC_MIN_AGE_SECONDS)')
+@click.option('--dry-run', is_flag=True, help='List orphans without touching them')
+def gc_uploads_command(action, min_age_hours, dry_run):
+    """Quarantine or delete uploaded files and thumbnails that no document refers to"""
+    report = (lambda store, path, size: click.echo(f'  {store}: {path} ({size:,} bytes)')) if dry_run else None
+    totals = collect_orphaned_files(action=action,
+                                    min_age_seconds=None if min_age_hours is None else min_age_hours * 3600,
+                                    dry_run=dry_run, report=report)
+    verb = 'deleted' if action == 'delete' else 'quarantined'
+    if dry_run:
+        verb = 'would ' + ('delete' if action == 'delete' else 'quarantine')
+    click.echo(f"Scanned {totals['scanned']:,} files; {verb} {totals['orphans']:,} orphans ({totals['bytes']:,} bytes)")
+    if totals['skipped_recent']:
+        click.echo(f"Skipped {totals['skipped_recent']:,} unreferenced files newer than the grace period")
+
+
+@app.cli.command('restore-complaint')
+@tenant_option
+@click.argument('complaint_id', type=int)
+def restore_complaint_command(complaint_id):
+    """Move an archived complaint back into the live tables"""
+    try:
+        restore_complaint(complaint_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Restored complaint {complaint_id}')
+
+
+@app.cli.command('backup-db')
+@click.option('--database', 'names', multiple=True, help="Only this database: 'primary' or tenant_<slug> (repeatable)")
+@click.option('--keep', default=None, type=int, help='Snapshots to keep per database (default BACKUP_KEEP)')
+def backup_db_command(names, keep):
+    """Take compressed, checksummed online snapshots of the SQLite databases"""
+    def report(manifest):
+        click.echo(f"{manifest['database']}: {manifest['path']} ({manifest['raw_size'] / 1e6:,.1f} MB -> "
+                   f"{manifest['size'] / 1e6:,.1f} MB, copied in {manifest['copy_seconds']:.1f}s)")
+
+    try:
+        manifests, failures = snapshot_databases(names=list(names) or None, keep=keep, report=report)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    if not manifests and not failures:
+        click.echo('No SQLite databases configured; back up PostgreSQL with pg_dump')
+    for name, error in failures.items():
+        click.echo(f'{name}: backup failed: {error}', err=True)
+    if failures:
+        raise click.exceptions.Exit(1)
+
+
+@app.cli.command('list-backups')
+@click.option('--database', 'name', default=None, help="Only this database: 'primary' or tenant_<slug>")
+def list_backups_command(name):
+    """List database snapshots, newest first"""
+    snapshots = list_snapshots(name)
+    if not snapshots:
+        click.echo('No snapshots')
+    for manifest in snapshots:
+        click.echo(f"{manifest['created_at']}  {manifest['database']}  {manifest['size'] / 1e6:,.1f} MB  {manifest['path']}")
+
+
+@app.cli.command('restore-db')
+@click.argument('snapshot', type=click.Path(exists=True, dir_okay=False))
+@click.option('--to', 'target', default=None, type=click.Path(dir_okay=False),
+              help="Restore into this file instead of the database the snapshot was taken from")
+@click.option('--verify-only', is_flag=True, help='Check checksums and integrity without restoring')
+@click.option('--yes', is_flag=True, help='Replace a live database without asking')
+def restore_db_command(snapshot, target, verify_only, yes):
+    """Verify a database snapshot, then restore it (stop the application first when replacing a live database)"""
+    try:
+        if verify_only:
+            manifest = verify_snapshot(snapshot)
+            click.echo(f"{snapshot}: OK ({manifest['database']}, taken {manifest['created_at']}, "
+                       f"{manifest['page_count']:,} pages)")
+            return
+        if target is None:
+            name = snapshot_manifest(snapshot)['database']
+            target = sqlite_databases().get(name)
+            if target is None:
+                raise click.ClickException(f'{name} is not a configured SQLite database; use --to')
+            if not yes:
+                click.confirm(f'Replace {target} with this snapshot? The application must be stopped', abort=True)
+        # Nothing in this process may hold the file being replaced
+        for engine in db.engines.values():
+            engine.dispose()
+        manifest, kept_path = restore_snapshot(snapshot, target)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored {manifest['database']} as of {manifest['created_at']} to {target}")
+    if kept_path:
+        click.echo(f'The previous database was kept as {kept_path}')
+
+
+@app.cli.command('replica-status')
+def replica_status_command():
+    """Show the replication lag of each configured read replica"""
+    if not replica_bind_keys():
+        click.echo('No replicas configured (set DATABASE_REPLICA_URLS)')
+        return
+    max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+    for bind_key, lag in measure_lags().items():
+        if lag is None:
+            state = 'unavailable (unreachable or no heartbeat yet)'
+        else:
+            state = f"{lag:.1f}s behind ({'in use' if lag <= max_lag else 'too far behind, reads use the primary'})"
+        click.echo(f"{bind_key}: {state}")
+
+
+@app.cli.command('process-documents')
+@tenant_option
+@click.option('--processes', default=None, type=int, help='Worker pool size (default JOB_WORKER_PROCESSES)')
+@click.option('--batch-size', default=20, show_default=True, help='Jobs claimed per batch')
+@click.option('--once', is_flag=True, help='Exit when the queue is empty')
+@click.option('--backfill', is_flag=True, help='First queue documents uploaded before processing existed')
+def process_documents_command(processes, batch_size, once, backfill):
+    """Run the background worker that processes uploaded documents"""
+    if backfill:
+        click.echo(f'Queued {enqueue_unprocessed_documents():,} existing documents')
+    processed = run_worker(processes=processes or app.config['JOB_WORKER_PROCESSES'],
+                           batch_size=batch_size,
+                           lease_seconds=app.config['JOB_LEASE_SECONDS'],
+                           once=once)
+    click.echo(f'Processed {processed:,} jobs')
+
+
+@app.cli.command('optimize-uploads')
+@tenant_option
+@click.option('--workers', default=None, type=int, help='Worker pool size (default JOB_WORKER_PROCESSES)')
+@click.option('--batch-size', default=200, show_default=True, help='Documents per batch')
+@click.option('--dry-run', is_flag=True, help='Report savings without rewriting any file')
+def optimize_uploads_command(workers, batch_size, dry_run):
+    """Strip metadata from, downsample and recompress existing image uploads"""
+    def progress(totals):
+        click.echo(f"  {totals['documents']:,} images, "
+                   f"{totals['bytes_before'] / 1e6:,.1f} MB -> {totals['bytes_after'] / 1e6:,.1f} MB")
+
+    totals = optimize_existing_documents(workers=workers or app.config['JOB_WORKER_PROCESSES'],
+                                         batch_size=batch_size,
+                                         dry_run=dry_run,
+                                         progress=progress)
+    saved = totals['bytes_before'] - totals['bytes_after']
+    verb = 'Would save' if dry_run else 'Saved'
+    click.echo(f"{verb} {saved / 1e6:,.1f} MB across {totals['documents']:,} images "
+               f"({totals['missing']:,} files missing)")
+
+
+@app.cli.command('relocate-thumbnails')
+@click.option('--batch-size', default=500, show_default=True, help='Documents per batch')
+def relocate_thumbnails_command(batch_size):
+    """Move thumbnails written under static/ before THUMBNAIL_FOLDER moved out of it"""
+    results = run_per_database(relocate_thumbnails, batch_size=batch_size)
+    moved = sum(totals['moved'] for totals in results)
+    missing = sum(totals['missing'] for totals in results)
+    click.echo(f'Moved {moved:,} thumbnails to THUMBNAIL_FOLDER ({missing:,} files missing)')
+
+
+@app.cli.command('backfill-articles')
+@tenant_option
+@click.option('--batch-size', default=1000, show_default=True, help='Complaints per batch')
+def backfill_articles_command(batch_size):
+    """Copy legacy alleged_violations JSON into the complaint_articles index"""
+    count = backfill_complaint_articles(batch_size=batch_size,
+                                        progress=lambda done: click.echo(f'  {done:,} complaints'))
+    click.echo(f'Backfilled cited articles for {count:,} complaints')
+
+
+@app.cli.command('seed')
+@tenant_option
+@click.option('--users', default=1000, show_default=True, help='Number of synthetic users')
+@click.option('--complaints-per-user', default=5, show_default=True)
+@click.option('--notes-per-complaint', default=3, show_default=True)
+@click.option('--documents-per-complaint', default=2, show_default=True)
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Generator processes')
+@click.option('--chunk-size', default=500, show_default=True, help='Users generated per chunk')
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Random seed')
+def seed_command(users, complaints_per_user, notes_per_complaint, documents_per_complaint,
+                 workers, chunk_size, random_seed):
+    """Bulk-insert synthetic users, complaints, notes, documents and reminders"""
+    started = time.perf_counter()
+
+    def progress(counts):
+        click.echo(f"  {counts['users']:,} users, {counts['complaints']:,} complaints "
+                   f"({time.perf_counter() - started:.1f}s)")
+
+    counts = seed_database(users=users,
+                           complaints_per_user=complaints_per_user,
+                           notes_per_complaint=notes_per_complaint,
+                           documents_per_complaint=documents_per_complaint,
+                           seed=random_seed,
+                           workers=workers,
+                           chunk_size=chunk_size,
+                           progress=progress)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    click.echo(f'Inserted {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)')
+    for table, count in counts.items():
+        click.echo(f'  {table}: {count:,}')
+
+    # Seeded rows bypass the status transitions that keep the report rollups and duration stats current
+    click.echo(f'Recounted report rollups from {rebuild_rollups():,} filed complaints')
+    try:
+        click.echo(f'Recounted investigation durations from {rebuild_duration_stats():,} closed complaints')
+    except ValueError as e:
+        click.echo(f'Duration stats not recounted: {e}')
+
+
+@app.cli.command('loadtest')
+@click.option('--url', default='http://127.0.0.1:3000', show_default=True, help='Base URL of a running server')
+@click.option('--sessions', default=100, show_default=True, help='User flows to run')
+@click.option('--concurrency', default=10, show_default=True, help='Concurrent user sessions')
+@click.option('--upload-kb', default=64, show_default=True, help='Size of each uploaded document')
+@click.option('--timeout', default=30, show_default=True, help='Per-request timeout in seconds')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def loadtest_command(url, sessions, concurrency, upload_kb, timeout, as_json):
+    """Drive concurrent screening -> complaint -> upload -> detail flows against a server"""
+    report = run_load_test(url, sessions=sessions, concurrency=concurrency,
+                           timeout=timeout, upload_bytes=upload_kb * 1024)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+
+    click.echo(f"{report['requests']:,} requests in {report['elapsed_seconds']:.1f}s "
+               f"({report['throughput_per_sec']:.1f} req/s), "
+               f"error rate {report['error_rate']:.2%}")
+    for step, stats in report['steps'].items():
+        click.echo(f"  {step:<18} p50 {stats['p50_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                   f"errors {stats['errors']}/{stats['requests']}")
+
+
+@app.cli.command('add-webhook')
+@tenant_option
+@click.argument('url')
+@click.option('--events', default='', help=f'Comma-separated event types (default all: {", ".join(EVENT_TYPES)})')
+@click.option('--secret', default=None, help='Signing secret (generated if omitted)')
+@click.option('--from-start', is_flag=True, help='Also deliver events already in the outbox')
+def add_webhook_command(url, events, secret, from_start):
+    """Subscribe a partner URL to complaint events"""
+    event_types = [t.strip() for t in events.split(',') if t.strip()]
+    unknown = [t for t in event_types if t not in EVENT_TYPES]
+    if unknown:
+        raise click.BadParameter(f'Unknown event type(s): {", ".join(unknown)}', param_hint='--events')
+
+    last_event_id = 0 if from_start else db.session.query(db.func.max(OutboxEvent.id)).scalar() or 0
+    subscription = WebhookSubscription(url=url, secret=secret or generate_secret(),
+                                       event_types=','.join(event_types) or None,
+                                       last_event_id=last_event_id)
+    db.session.add(subscription)
+    db.session.commit()
+    click.echo(f'Webhook {subscription.id} -> {url}')
+    click.echo(f'Signing secret: {subscription.secret}')
+
+
+@app.cli.command('list-webhooks')
+@tenant_option
+def list_webhooks_command():
+    """Show webhook subscriptions and their delivery state"""
+    latest = db.session.query(db.func.max(OutboxEvent.id)).scalar() or 0
+    for subscription in WebhookSubscription.query.order_by(WebhookSubscription.id):
+        state = 'active' if subscription.is_active else 'disabled'
+        click.echo(f'{subscription.id}: {subscription.url} [{state}] '
+                   f'events={subscription.event_types or "all"} '
+                   f'cursor={subscription.last_event_id}/{latest} failures={subscription.failure_count}')
+        if subscription.last_error:
+            click.echo(f'    last error: {subscription.last_error}')
+
+
+@app.cli.command('remove-webhook')
+@tenant_option
+@click.argument('subscription_id', type=int)
+def remove_webhook_command(subscription_id):
+    """Delete a webhook subscription"""
+    subscription = db.session.get(WebhookSubscription, subscription_id)
+    if subscription is None:
+        raise click.ClickException(f'No webhook {subscription_id}')
+    db.session.delete(subscription)
+    db.session.commit()
+    click.echo(f'Removed webhook {subscription_id}')
+
+
+@app.cli.command('dispatch-webhooks')
+@tenant_option
+@click.option('--once', is_flag=True, help='Drain the outbox once and exit')
+@click.option('--interval', default=None, type=int, help='Seconds between polls when idle')
+def dispatch_webhooks_command(once, interval):
+    """Deliver outbox events to webhook subscribers"""
+    stats = run_dispatcher(interval=interval, once=once)
+    click.echo(f"Delivered {stats['events']:,} events in {stats['batches']:,} batches "
+               f"({stats['failures']} failed)")
+    click.echo(f'Pruned {prune_outbox():,} acknowledged events')
+
+
+@app.cli.command('webhook-sink')
+@click.option('--port', default=9000, show_default=True)
+@click.option('--secret', default=None, help='Verify signatures with this secret')
+@click.option('--fail-rate', default=0.0, show_default=True, help='Fraction of requests answered with 503')
+def webhook_sink_command(port, secret, fail_rate):
+    """Run a local stand-in partner endpoint that logs received batches"""
+    sink = WebhookSink(port=port, secret=secret, fail_rate=fail_rate, log=click.echo)
+    click.echo(f'Listening on {sink.url}')
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    click.echo(f'{len(sink.event_ids):,} events in {sink.requests:,} requests over '
+               f'{sink.connections} connections ({sink.failures} failed, {sink.duplicates} duplicates)')
+
+
+@app.cli.command('rate-limit-server')
+@click.option('--port', default=6390, show_default=True)
+def rate_limit_server_command(port):
+    """Run a local stand-in for the Redis store that shares rate-limit buckets"""
+    server = RateLimitServer(port=port)
+    click.echo(f'Listening on {server.url} (set RATE_LIMIT_STORAGE_URL to this)')
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    click.echo(f'{server.commands:,} commands over {server.connections} connections')
+
+
+@app.cli.command('add-tenant')
+@click.argument('slug')
+@click.argument('name')
+@click.option('--hostname', default=None, help='Requests for this host belong to the tenant')
+def add_tenant_command(slug, name, hostname):
+    """Add an association or state office; give it its own database by adding SLUG to TENANT_DATABASES"""
+    try:
+        tenant = create_tenant(slug, name, hostname)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Added tenant {tenant.id}: {tenant.slug}')
+
+
+@app.cli.command('list-tenants')
+def list_tenants_command():
+    """List tenants with their hostnames and where their data is stored"""
+    dedicated = set(tenant_database_slugs())
+    for tenant in Tenant.query.order_by(Tenant.id):
+        storage = 'own database' if tenant.slug in dedicated else 'primary database'
+        click.echo(f'{tenant.id:>4}  {tenant.slug:<20} {tenant.hostname or "-":<30} {storage:<16} {tenant.name}')
+
+
 # Initialize database
 with app.app_context():
     db.create_all()
+    upgrade_schema()
+    init_tenant_databases(app)
+
+init_scheduler(app)
 
 
 if __name__ == '__main__':
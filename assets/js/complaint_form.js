@@ -0,0 +1,119 @@
+// Complaint form: NAR article section toggle and draft autosave
+// Show/hide NAR articles section based on jurisdiction type
+document.getElementById('jurisdiction_type').addEventListener('change', function() {
+    const narSection = document.getElementById('nar_articles_section');
+    if (this.value === 'nar_association') {
+        narSection.style.display = 'block';
+    } else {
+        narSection.style.display = 'none';
+    }
+});
+
+// Trigger on page load if jurisdiction is pre-selected
+window.addEventListener('DOMContentLoaded', function() {
+    const jurisdictionType = document.getElementById('jurisdiction_type').value;
+    if (jurisdictionType === 'nar_association') {
+        document.getElementById('nar_articles_section').style.display = 'block';
+    }
+});
+
+// Autosave: the first save creates a draft, later saves send only changed fields and narrative edits
+(function() {
+    const form = document.getElementById('complaint_form');
+    const statusLabel = document.getElementById('autosave_status');
+    const fields = ['title', 'jurisdiction_type', 'state', 'respondent_name', 'respondent_license_number',
+                    'respondent_brokerage', 'respondent_is_realtor', 'incident_date', 'incident_location',
+                    'transaction_type', 'complaint_narrative'];
+    const IDLE_MS = 1500, MAX_WAIT_MS = 10000;
+    let draftId = form.dataset.draftId ? parseInt(form.dataset.draftId, 10) : null;
+    let version = parseInt(form.dataset.version, 10);
+    let saved = draftId ? snapshot() : null;
+    let timer = null, firstChangeAt = null, saving = false, stopped = false;
+
+    function snapshot() {
+        const values = {};
+        fields.forEach(function(name) { values[name] = form.elements[name].value; });
+        return values;
+    }
+
+    // One edit turning before into after (common prefix and suffix kept), in characters not UTF-16 units
+    function textEdit(before, after) {
+        const a = Array.from(before), b = Array.from(after);
+        let start = 0;
+        while (start < a.length && start < b.length && a[start] === b[start]) start++;
+        let endA = a.length, endB = b.length;
+        while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) { endA--; endB--; }
+        return {at: start, delete: endA - start, insert: b.slice(start, endB).join('')};
+    }
+
+    function buildRequest(current) {
+        if (draftId === null) {
+            if (!current.title && !current.complaint_narrative) return null;
+            return {url: form.dataset.draftsUrl, method: 'POST', body: {fields: current}};
+        }
+        const changed = {};
+        fields.forEach(function(name) {
+            if (name !== 'complaint_narrative' && current[name] !== saved[name]) changed[name] = current[name];
+        });
+        const body = {version: version, fields: changed};
+        if (current.complaint_narrative !== saved.complaint_narrative) {
+            body.edits = [textEdit(saved.complaint_narrative, current.complaint_narrative)];
+            body.narrative_length = Array.from(saved.complaint_narrative).length;
+        } else if (Object.keys(changed).length === 0) {
+            return null;
+        }
+        return {url: form.dataset.draftsUrl + '/' + draftId, method: 'PATCH', body: body};
+    }
+
+    function save() {
+        clearTimeout(timer);
+        timer = null;
+        firstChangeAt = null;
+        if (saving || stopped) return;
+        const current = snapshot();
+        const req = buildRequest(current);
+        if (!req) return;
+        saving = true;
+        statusLabel.textContent = 'Saving…';
+        fetch(req.url, {
+            method: req.method,
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(req.body)
+        }).then(function(response) {
+            return response.json().then(function(data) { return {response: response, data: data}; });
+        }).then(function(result) {
+            if (result.response.ok) {
+                if (draftId === null) {
+                    draftId = result.data.id;
+                    document.getElementById('draft_id').value = draftId;
+                    history.replaceState(null, '', '?draft=' + draftId);
+                }
+                version = result.data.version;
+                saved = current;
+                statusLabel.textContent = 'Draft saved ' + new Date().toLocaleTimeString();
+            } else if (result.response.status === 409) {
+                stopped = true;
+                statusLabel.textContent = 'This draft was changed in another window. Reload to continue editing.';
+            } else {
+                statusLabel.textContent = 'Autosave failed: ' + (result.data.error || result.response.status);
+            }
+        }).catch(function() {
+            statusLabel.textContent = 'Autosave failed; will retry';
+        }).finally(function() {
+            saving = false;
+            if (!stopped && buildRequest(snapshot())) schedule();
+        });
+    }
+
+    function schedule() {
+        if (stopped) return;
+        const now = Date.now();
+        firstChangeAt = firstChangeAt || now;
+        clearTimeout(timer);
+        timer = setTimeout(save, Math.max(0, Math.min(IDLE_MS, firstChangeAt + MAX_WAIT_MS - now)));
+    }
+
+    form.addEventListener('input', schedule);
+    form.addEventListener('change', schedule);
+    form.addEventListener('submit', function() { stopped = true; clearTimeout(timer); });
+})();
@@ -0,0 +1,214 @@
+"""
+Benchmark suite for routes and utility hot paths
+
+Seeds a throwaway SQLite database with synthetic data, drives the main routes
+through the Flask test client and micro-benchmarks the utils modules.
+
+Usage:
+    python benchmarks/run_benchmarks.py --users 50 --complaints-per-user 20 \\
+        --output results.json --compare previous.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import date, datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    """Summarize a list of per-call durations (seconds)"""
+    timings = sorted(timings)
+    total = sum(timings)
+    return {
+        'iterations': len(timings),
+        'throughput_per_sec': len(timings) / total if total else None,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+    }
+
+
+def time_requests(client, iterations, make_request, expected_status=(200, 302)):
+    """Time make_request(i) calls, failing loudly on unexpected status codes"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        response = make_request(i)
+        timings.append(time.perf_counter() - started)
+        if response.status_code not in expected_status:
+            raise RuntimeError(f'Unexpected status {response.status_code}')
+    return summarize(timings)
+
+
+def benchmark_routes(app, iterations, warmup):
+    """Benchmark the main routes as a logged-in synthetic user"""
+    from models import db, User, Complaint
+    from utils.synthetic_data import SYNTHETIC_PASSWORD
+
+    with app.app_context():
+        # Pick the user with the most complaints to exercise the heaviest dashboard
+        user, = db.session.query(User).join(Complaint).group_by(User.id) \
+            .order_by(db.func.count(Complaint.id).desc()).limit(1).all()
+        email = user.email
+        complaint_ids = [row.id for row in Complaint.query.filter_by(user_id=user.id).all()]
+
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': SYNTHETIC_PASSWORD})
+
+    complaint_form = {
+        'title': 'Benchmark complaint',
+        'jurisdiction_type': 'nar_association',
+        'state': 'FL',
+        'respondent_name': 'Bench Mark',
+        'incident_date': date.today().isoformat(),
+        'transaction_type': 'buyer',
+        'complaint_narrative': 'Synthetic narrative for benchmarking. ' * 20,
+        'nar_articles': ['Article 1', 'Article 2'],
+    }
+    upload_payload = b'%PDF-1.4\n' + b'0' * 64 * 1024
+    screen_records = [
+        {'id': n, 'is_realtor': n % 2 == 0, 'violation_type': ('ethics_violation', 'license_violation')[n % 2],
+         'state': ('FL', 'KY', 'CO')[n % 3], 'has_contract': True, 'seeks_damages': n % 7 == 0}
+        for n in range(500)
+    ]
+
+    cases = {
+        'dashboard': lambda i: client.get('/dashboard'),
+        'view_complaint': lambda i: client.get(f'/complaint/{complaint_ids[i % len(complaint_ids)]}'),
+        'new_complaint': lambda i: client.post('/complaint/new', data=complaint_form),
+        'upload_document': lambda i: client.post(
+            f'/complaint/{complaint_ids[i % len(complaint_ids)]}/upload',
+            data={'file': (io.BytesIO(upload_payload), 'evidence.pdf'), 'file_type': 'contract'},
+            content_type='multipart/form-data'),
+        'api_nar_articles': lambda i: client.get('/api/nar-articles?q=disclos'),
+        'api_deadline_calculator': lambda i: client.post('/api/deadline-calculator', json={
+            'incident_date': date.today().isoformat(), 'jurisdiction_type': 'state_board', 'state': 'CO'}),
+        'api_screen': lambda i: client.post('/api/screen', json={'records': screen_records}),
+    }
+
+    results = {}
+    for name, make_request in cases.items():
+        time_requests(client, warmup, make_request)
+        results[name] = time_requests(client, iterations, make_request)
+        print(f"  {name:<26} p50 {results[name]['p50_ms']:8.3f} ms   p99 {results[name]['p99_ms']:8.3f} ms")
+    return results
+
+
+def benchmark_utils(number):
+    """Micro-benchmark the utils hot paths"""
+    from datetime import timedelta
+    from utils.nar_code_articles import search_articles
+    from utils.deadline_calculator import calculate_filing_deadline, get_deadline_status
+    from utils.jurisdiction import determine_jurisdiction
+
+    today = date.today()
+    cases = {
+        'search_articles': lambda: search_articles('disclos'),
+        'calculate_filing_deadline': lambda: calculate_filing_deadline(today, 'state_board', 'KY'),
+        'get_deadline_status': lambda: get_deadline_status(today + timedelta(days=20)),
+        'determine_jurisdiction': lambda: determine_jurisdiction({
+            'is_realtor': True, 'violation_type': 'license_violation', 'state': 'FL',
+            'has_contract': True, 'seeks_damages': False}),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        runs = timeit.repeat(func, number=number, repeat=5)
+        per_call = [run / number for run in runs]
+        results[name] = {
+            'calls_per_run': number,
+            'best_us': min(per_call) * 1e6,
+            'median_us': statistics.median(per_call) * 1e6,
+        }
+        print(f"  {name:<26} best {results[name]['best_us']:8.3f} us")
+    return results
+
+
+def compare(current, previous):
+    """Print relative change against a previous results file"""
+    print('\nComparison with previous run (positive = slower):')
+    for section, key in (('routes', 'p50_ms'), ('utils', 'best_us')):
+        for name, stats in current[section].items():
+            before = previous.get(section, {}).get(name)
+            if not before or not before.get(key):
+                continue
+            change = (stats[key] - before[key]) / before[key] * 100
+            print(f'  {section}/{name:<26} {key} {before[key]:10.3f} -> {stats[key]:10.3f} ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--complaints-per-user', type=int, default=10)
+    parser.add_argument('--notes-per-complaint', type=int, default=3)
+    parser.add_argument('--documents-per-complaint', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--micro-number', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results JSON to this path')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='grievance-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from app import app
+    from utils.synthetic_data import seed_database
+
+    app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    app.config['RATE_LIMIT_ENABLED'] = False  # benchmarks hammer the public APIs from one client
+
+    print(f'Seeding synthetic database in {workdir}...')
+    with app.app_context():
+        counts = seed_database(users=args.users,
+                               complaints_per_user=args.complaints_per_user,
+                               notes_per_complaint=args.notes_per_complaint,
+                               documents_per_complaint=args.documents_per_complaint,
+                               seed=args.seed)
+    print('  ' + ', '.join(f'{table}: {count}' for table, count in counts.items()))
+
+    print('Routes:')
+    routes = benchmark_routes(app, args.iterations, args.warmup)
+    print('Utils:')
+    utils = benchmark_utils(args.micro_number)
+
+    results = {
+        'recorded_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'seeded_rows': counts,
+        'routes': routes,
+        'utils': utils,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
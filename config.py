@@ -4,6 +4,17 @@ Configuration settings for Grievance Filing Service
 import os
 from datetime import timedelta
 
+
+def tenant_emails(value):
+    """{tenant slug: emails} from 'email,slug:email,...'; a bare email belongs to the default tenant"""
+    emails = {}
+    for entry in (value or '').split(','):
+        slug, _, email = entry.rpartition(':')
+        if email.strip():
+            emails.setdefault(slug.strip() or 'default', set()).add(email.strip().lower())
+    return emails
+
+
 class Config:
     """Base configuration"""
 
@@ -16,20 +27,139 @@ class Config:
         f'sqlite:///{os.path.join(BASE_DIR, "database.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Tenants given a database of their own, as slug=URL pairs separated by commas
+    # (e.g. "bigassoc=postgresql://.../bigassoc"); see utils/tenants.py
+    TENANT_DATABASES = {
+        slug.strip(): url.strip()
+        for slug, _, url in (item.partition('=') for item in (os.environ.get('TENANT_DATABASES') or '').split(','))
+        if slug.strip() and url.strip()
+    }
+    TENANT_DEFAULT_NAME = os.environ.get('TENANT_DEFAULT_NAME', 'Grievance Filing Service')
+
+    # Read replicas (comma-separated URLs) serve read-only views; see utils/replicas.py
+    SQLALCHEMY_BINDS = {
+        **{
+            f'replica_{i}': url.strip()
+            for i, url in enumerate((os.environ.get('DATABASE_REPLICA_URLS') or '').split(','))
+            if url.strip()
+        },
+        **{f'tenant_{slug}': url for slug, url in TENANT_DATABASES.items()}
+    }
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = 2  # how often each process re-measures lag
+    REPLICA_HEARTBEAT_SECONDS = 1  # how often the primary stamps its heartbeat
+    REPLICA_STICKY_SECONDS = 15  # reads stay on the primary this long after a user writes
+
     # Upload settings
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'doc', 'docx', 'txt'}
+    # Outside static/ so thumbnails are only served by the owner-checked document_thumbnail route
+    THUMBNAIL_FOLDER = os.environ.get('THUMBNAIL_FOLDER') or os.path.join(BASE_DIR, 'thumbnails')
+
+    # Cold storage for closed complaints (flask archive-complaints)
+    ARCHIVE_FOLDER = os.environ.get('ARCHIVE_FOLDER') or os.path.join(BASE_DIR, 'archive')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+
+    # Orphaned upload garbage collection (utils/storage_gc.py); quarantine stays outside static/
+    QUARANTINE_FOLDER = os.environ.get('QUARANTINE_FOLDER') or os.path.join(BASE_DIR, 'quarantine')
+    STORAGE_GC_MIN_AGE_SECONDS = int(os.environ.get('STORAGE_GC_MIN_AGE_SECONDS', 3600))
+
+    # Online SQLite backups (see utils/backup.py)
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER') or os.path.join(BASE_DIR, 'backups')
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))  # snapshots kept per database
+    BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', 1024))  # 4 MB with 4 KB pages
+    BACKUP_STEP_SLEEP_SECONDS = float(os.environ.get('BACKUP_STEP_SLEEP_SECONDS', 0.05))
+    BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', 20))  # rollback-journal databases only
+    BACKUP_HOUR = int(os.environ['BACKUP_HOUR']) if os.environ.get('BACKUP_HOUR') else None  # nightly backup off unless set
+
+    # Image evidence storage optimization (strip metadata, downsample, recompress)
+    IMAGE_OPTIMIZATION_ENABLED = os.environ.get('IMAGE_OPTIMIZATION_ENABLED', 'false').lower() in ['true', 'on', '1']
+    IMAGE_TARGET_DPI = int(os.environ.get('IMAGE_TARGET_DPI') or 200)
+    IMAGE_PAGE_LONG_EDGE_INCHES = 11.0  # letter-size page
+
+    # Background job worker (flask process-documents)
+    JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES') or os.cpu_count() or 1)
+    JOB_LEASE_SECONDS = 600  # running jobs older than this are assumed abandoned
 
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
 
-    # Email settings (for future notification system)
+    # Email settings (reminder emails are only logged when MAIL_SERVER is unset)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'reminders@grievancefiling.local'
+
+    # Daily reminder emails (scheduler hour, local time)
+    REMINDER_SEND_HOUR = int(os.environ.get('REMINDER_SEND_HOUR', 7))
+
+    # Performance metrics (Prometheus /metrics endpoint)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # optional bearer token for /metrics
+    METRICS_DEBUG_HEADERS = os.environ.get('METRICS_DEBUG_HEADERS', 'false').lower() in ['true', 'on', '1']
+
+    # Request profiler (opt-in; see utils/profiler.py)
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() in ['true', 'on', '1']
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE') or 0.0)  # fraction of requests
+    PROFILER_INTERVAL = 0.005  # seconds between stack samples
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or os.path.join(BASE_DIR, 'profiles')
+    PROFILER_MAX_FILES = int(os.environ.get('PROFILER_MAX_FILES') or 200)
+    PROFILER_TOKEN_MAX_AGE = 3600  # seconds a signed X-Profile-Request token stays valid
+
+    # Background scheduler for nightly jobs (deadline status refresh, ...)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() in ['true', 'on', '1']
+
+    # Administrators per tenant: comma-separated emails, 'slug:email' for a tenant other than the default
+    ADMIN_EMAILS = tenant_emails(os.environ.get('ADMIN_EMAILS'))
+
+    # Agency staff working the review queue, listed like ADMIN_EMAILS (administrators are reviewers too)
+    REVIEWER_EMAILS = tenant_emails(os.environ.get('REVIEWER_EMAILS'))
+    REVIEW_LEASE_SECONDS = int(os.environ.get('REVIEW_LEASE_SECONDS', 30 * 60))  # claims lapse unless renewed
+    REVIEW_QUEUE_PAGE_SIZE = 50
+
+    # Largest batch accepted by the bulk status transition endpoint
+    BULK_TRANSITION_MAX = int(os.environ.get('BULK_TRANSITION_MAX', 5000))
+
+    # Investigation duration estimates learned from closed complaints (utils/investigation_estimates.py)
+    INVESTIGATION_ESTIMATE_MIN_SAMPLES = int(os.environ.get('INVESTIGATION_ESTIMATE_MIN_SAMPLES', 20))
+    INVESTIGATION_ESTIMATE_CACHE_SECONDS = int(os.environ.get('INVESTIGATION_ESTIMATE_CACHE_SECONDS', 300))
+
+    # In-process cache of rendered template fragments (utils/fragment_cache.py)
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    FRAGMENT_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRY_BYTES', 256 * 1024))
+
+    # Static asset pipeline (utils/assets.py): sources, build output, rebuild at startup when stale
+    ASSETS_SOURCE_DIR = os.path.join(BASE_DIR, 'assets')
+    ASSETS_BUILD_DIR = os.environ.get('ASSETS_BUILD_DIR') or os.path.join(BASE_DIR, 'static', 'dist')
+    ASSETS_AUTO_BUILD = os.environ.get('ASSETS_AUTO_BUILD', 'true').lower() in ['true', 'on', '1']
+
+    # Largest batch accepted by POST /api/screen
+    SCREEN_BATCH_MAX = int(os.environ.get('SCREEN_BATCH_MAX', 1000))
+
+    # Rate limiting (token buckets); memory:// is per process, sqlite:///path is shared by the
+    # processes of one host and redis://host:6379/0 across nodes
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+    RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))  # trusted X-Forwarded-For hops
+    RATE_LIMITS = {
+        'login': {'ip': '20/minute', 'account': '10/minute', 'route': '600/minute'},
+        'register': {'ip': '5/minute', 'route': '120/minute'},
+        'public_api': {'ip': '120/minute', 'route': '3000/minute'},
+    }
+
+    # Webhook delivery of outbox events
+    WEBHOOK_DISPATCH_INTERVAL = int(os.environ.get('WEBHOOK_DISPATCH_INTERVAL', 10))  # seconds between polls
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 100))
+    WEBHOOK_MAX_WORKERS = int(os.environ.get('WEBHOOK_MAX_WORKERS', 8))  # concurrent subscriber deliveries
+    WEBHOOK_TIMEOUT = 10  # seconds per HTTP request
+    WEBHOOK_MAX_BACKOFF = 3600  # longest wait between retries of a failing subscriber
+    WEBHOOK_LEASE_SECONDS = 120  # subscription lease held by a dispatcher during delivery
+    WEBHOOK_SETTLE_SECONDS = int(os.environ.get('WEBHOOK_SETTLE_SECONDS', 2))
+    OUTBOX_RETENTION_DAYS = 7  # acknowledged events are kept this long
 
     # Jurisdiction-specific deadline settings (in days)
     DEADLINE_SETTINGS = {
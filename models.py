@@ -2,14 +2,41 @@
 Database models for Grievance Filing Service
 """
 from datetime import datetime
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from utils.db_routing import RoutingSession, current_tenant_id
+from utils.deadline_calculator import days_until_deadline, get_deadline_bucket
 
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-class User(UserMixin, db.Model):
+
+class Tenant(db.Model):
+    """Association or state office served by this deployment; lives in the primary database"""
+    __tablename__ = 'tenants'
+    __table_args__ = {'info': {'shared': True}}  # never routed to a tenant's own database
+
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)  # also names its TENANT_DATABASES entry
+    name = db.Column(db.String(200), nullable=False)
+    hostname = db.Column(db.String(255), unique=True)  # requests for this host belong to the tenant
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Tenant {self.slug}>'
+
+
+class TenantScoped:
+    """Rows owned by one tenant; ORM queries only see the current tenant's (see utils/tenants.py)"""
+
+    # No FK: a tenant with its own database has no tenants table there
+    tenant_id = db.Column(db.Integer, nullable=False, default=current_tenant_id, index=True)
+
+
+class User(TenantScoped, UserMixin, db.Model):
     """User account model"""
     __tablename__ = 'users'
 
@@ -20,11 +47,28 @@ class User(UserMixin, db.Model):
     last_name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
     user_type = db.Column(db.String(20), nullable=False)  # 'consumer' or 'realtor'
+    reminder_digest = db.Column(db.Boolean, default=True)  # one daily email instead of one per reminder
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     complaints = db.relationship('Complaint', backref='user', lazy=True, cascade='all, delete-orphan')
 
+    def _listed_in(self, config_key):
+        # Listings are per tenant, so registering a listed address on another tenant's host grants nothing
+        if not has_app_context() or g.get('tenant_id') != self.tenant_id:
+            return False
+        return self.email.lower() in current_app.config.get(config_key, {}).get(g.get('tenant_slug'), ())
+
+    @property
+    def is_admin(self):
+        """Whether this user is listed in ADMIN_EMAILS for their tenant"""
+        return self._listed_in('ADMIN_EMAILS')
+
+    @property
+    def is_reviewer(self):
+        """Whether this user works the staff review queue (REVIEWER_EMAILS for their tenant, or an administrator)"""
+        return self.is_admin or self._listed_in('REVIEWER_EMAILS')
+
     def set_password(self, password):
         """Hash and set password"""
         self.password_hash = generate_password_hash(password)
@@ -37,7 +81,7 @@ class User(UserMixin, db.Model):
         return f'<User {self.email}>'
 
 
-class Complaint(db.Model):
+class Complaint(TenantScoped, db.Model):
     """Complaint/grievance model"""
     __tablename__ = 'complaints'
 
@@ -63,25 +107,76 @@ class Complaint(db.Model):
 
     # Complaint narrative
     complaint_narrative = db.Column(db.Text)
-    alleged_violations = db.Column(db.Text)  # JSON string of Article numbers and descriptions
+    alleged_violations = db.Column(db.Text)  # legacy JSON list of Article numbers; see cited_articles
 
     # Timeline tracking
-    filing_deadline = db.Column(db.Date)
+    filing_deadline = db.Column(db.Date, index=True)
     submitted_date = db.Column(db.Date)
-    investigation_expected_completion = db.Column(db.Date)
+    investigation_expected_completion = db.Column(db.Date)  # median of historical durations
+    investigation_completion_earliest = db.Column(db.Date)  # typical range (see utils/investigation_estimates.py)
+    investigation_completion_latest = db.Column(db.Date)
+    closed_at = db.Column(db.DateTime)  # when status became closed; drives archival
+
+    # Materialized deadline status, refreshed at day rollover (see utils/deadline_status.py)
+    deadline_status = db.Column(db.String(20), index=True)  # expired, urgent, approaching, upcoming, sufficient_time, unknown
+    urgency_rank = db.Column(db.Integer, index=True)  # 0 = most urgent
 
     # Administrative
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=1)  # bumped by every draft save; see utils/drafts.py
+
+    # Staff review queue claim (see utils/review_queue.py); no FK, as users.id already backs Complaint.user
+    review_claimed_by = db.Column(db.Integer)  # reviewer's user id; kept as the reviewer of record after a decision
+    review_lease_expires_at = db.Column(db.DateTime)  # claim lapses after this; None once decided
 
     # Relationships
     documents = db.relationship('Document', backref='complaint', lazy=True, cascade='all, delete-orphan')
     notes = db.relationship('Note', backref='complaint', lazy=True, cascade='all, delete-orphan')
+    reminders = db.relationship('Reminder', backref='complaint', lazy=True, cascade='all, delete-orphan')
+    cited_articles = db.relationship('ComplaintArticle', backref='complaint', lazy=True,
+                                     cascade='all, delete-orphan', order_by='ComplaintArticle.position')
+
+    __table_args__ = (
+        db.Index('ix_complaints_user_urgency', 'user_id', 'urgency_rank', 'filing_deadline'),
+        db.Index('ix_complaints_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_complaints_review_queue', 'tenant_id', 'status', 'filing_deadline', 'id'),
+    )
+
+    def refresh_deadline_status(self):
+        """Recompute the materialized deadline status from filing_deadline"""
+        status, _, _, rank = get_deadline_bucket(days_until_deadline(self.filing_deadline))
+        self.deadline_status = status
+        self.urgency_rank = rank
 
     def __repr__(self):
         return f'<Complaint {self.id}: {self.title}>'
 
 
+@event.listens_for(Complaint, 'before_insert')
+@event.listens_for(Complaint, 'before_update')
+def _refresh_deadline_on_write(mapper, connection, complaint):
+    """Keep the materialized deadline status in step with deadline edits"""
+    if complaint.deadline_status is None or inspect(complaint).attrs.filing_deadline.history.has_changes():
+        complaint.refresh_deadline_status()
+
+
+class ComplaintArticle(db.Model):
+    """NAR Code article cited by a complaint"""
+    __tablename__ = 'complaint_articles'
+
+    complaint_id = db.Column(db.Integer, db.ForeignKey('complaints.id'), primary_key=True)
+    article_number = db.Column(db.String(20), primary_key=True)  # e.g. 'Article 12'
+    position = db.Column(db.Integer, default=0, nullable=False)  # order cited in the complaint
+
+    __table_args__ = (
+        db.Index('ix_complaint_articles_article', 'article_number', 'complaint_id'),
+    )
+
+    def __repr__(self):
+        return f'<ComplaintArticle {self.article_number} for Complaint {self.complaint_id}>'
+
+
 class Document(db.Model):
     """Document upload model"""
     __tablename__ = 'documents'
@@ -93,11 +188,23 @@ class Document(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_type = db.Column(db.String(50))  # contract, correspondence, check, listing_agreement, etc.
-    file_size = db.Column(db.Integer)  # in bytes
+    file_size = db.Column(db.Integer)  # in bytes, as currently stored
+    original_file_size = db.Column(db.Integer)  # in bytes, as uploaded
+    original_sha256 = db.Column(db.String(64))  # hash of the file as uploaded, kept for evidentiary integrity
 
     description = db.Column(db.Text)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Background processing results (see utils/document_jobs.py)
+    processing_status = db.Column(db.String(20), default='pending', index=True)  # pending, processed, rejected, failed
+    detected_type = db.Column(db.String(20))  # content type sniffed from magic bytes
+    extracted_text = db.Column(db.Text)
+    page_count = db.Column(db.Integer)
+    thumbnail_path = db.Column(db.String(500))
+    processing_error = db.Column(db.Text)
+    processed_at = db.Column(db.DateTime)
+    optimized_at = db.Column(db.DateTime)  # when image storage optimization ran
+
     def __repr__(self):
         return f'<Document {self.original_filename}>'
 
@@ -129,7 +236,177 @@ class Reminder(db.Model):
     reminder_type = db.Column(db.String(50))  # filing_deadline, document_request, follow_up
     message = db.Column(db.Text)
     is_sent = db.Column(db.Boolean, default=False)
+    sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_reminders_user_date', 'user_id', 'reminder_date', 'id'),
+        db.Index('ix_reminders_due', 'is_sent', 'reminder_date'),
+    )
+
     def __repr__(self):
         return f'<Reminder {self.id} for User {self.user_id}>'
+
+
+class Job(db.Model):
+    """Durable background job queue entry"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)  # JSON string of job arguments
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_available', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+
+class JobRun(db.Model):
+    """Last successful run of a scheduled maintenance job"""
+    __tablename__ = 'job_runs'
+
+    job_name = db.Column(db.String(100), primary_key=True)
+    last_run_on = db.Column(db.Date)  # business date the job last covered
+    last_run_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<JobRun {self.job_name} {self.last_run_on}>'
+
+
+class InvestigationDurationBucket(db.Model):
+    """Histogram of submitted-to-closed durations, maintained as complaints close"""
+    __tablename__ = 'investigation_duration_buckets'
+
+    state = db.Column(db.String(2), primary_key=True)  # '' when the complaint had no state
+    jurisdiction_type = db.Column(db.String(50), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)  # duration in days // DURATION_BUCKET_DAYS
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<InvestigationDurationBucket {self.state}/{self.jurisdiction_type} {self.bucket}: {self.count}>'
+
+
+class ComplaintRollup(TenantScoped, db.Model):
+    """Filed complaints counted by report dimension, month submitted and status; see utils/rollups.py"""
+    __tablename__ = 'complaint_rollups'
+
+    tenant_id = db.Column(db.Integer, primary_key=True, default=current_tenant_id)
+    dimension = db.Column(db.String(20), primary_key=True)  # total, state, jurisdiction_type, transaction_type, article
+    value = db.Column(db.String(100), primary_key=True)  # '' when the complaint had none (and for total)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM of submitted_date
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<ComplaintRollup {self.dimension}={self.value} {self.month} {self.status}: {self.count}>'
+
+
+class ComplaintArchive(TenantScoped, db.Model):
+    """Closed complaint moved out of the hot tables with its notes, documents and reminders"""
+    __tablename__ = 'complaint_archives'
+
+    complaint_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    title = db.Column(db.String(200), nullable=False)
+    closed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON of all archived rows
+    format_version = db.Column(db.Integer, default=1, nullable=False)
+
+    def __repr__(self):
+        return f'<ComplaintArchive {self.complaint_id}>'
+
+
+class ReplicaHeartbeat(db.Model):
+    """Single row the primary rewrites every few seconds; replicas' copies show their lag"""
+    __tablename__ = 'replica_heartbeat'
+
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ReplicaHeartbeat {self.beat_at}>'
+
+
+class OutboxEvent(TenantScoped, db.Model):
+    """Domain event written in the same transaction as the change it describes"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # complaint.created, document.uploaded, ...
+    complaint_id = db.Column(db.Integer, index=True)  # no FK: events outlive deleted complaints
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.event_type}>'
+
+
+class WebhookSubscription(TenantScoped, db.Model):
+    """Partner endpoint receiving batches of its tenant's outbox events"""
+    __tablename__ = 'webhook_subscriptions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(500), nullable=False)
+    secret = db.Column(db.String(128), nullable=False)  # HMAC key for X-Webhook-Signature
+    event_types = db.Column(db.Text)  # comma-separated; empty means all events
+    is_active = db.Column(db.Boolean, default=True)
+
+    # Delivery cursor: every event up to this id has been acknowledged
+    last_event_id = db.Column(db.Integer, default=0, nullable=False)
+    failure_count = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime)
+    locked_until = db.Column(db.DateTime)  # dispatcher lease
+    last_error = db.Column(db.Text)
+    last_delivered_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def event_type_list(self):
+        return [t.strip() for t in (self.event_types or '').split(',') if t.strip()]
+
+    def __repr__(self):
+        return f'<WebhookSubscription {self.id} {self.url}>'
+
+
+def upgrade_schema(engine=None):
+    """
+    Add columns and indexes introduced after a table was first created
+
+    db.create_all() only creates missing tables, so existing deployments
+    would otherwise never pick up new columns. engine defaults to the
+    primary; tenant databases are upgraded by utils.tenants.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    )
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
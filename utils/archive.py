@@ -0,0 +1,226 @@
+"""
+Cold-storage archival of closed complaints
+
+Complaints closed longer than ARCHIVE_AFTER_DAYS move, with their notes,
+documents, reminders and cited articles, into one zlib-compressed JSON
+row each in complaint_archives. Their upload files are gzipped into
+ARCHIVE_FOLDER/<year closed>/, under a per-tenant subfolder for tenants
+with their own database. view_complaint falls back to
+load_archived_complaint(), so archived complaints stay readable.
+"""
+import gzip
+import json
+import os
+import shutil
+import zlib
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import Date, DateTime, delete, func, insert
+from sqlalchemy.orm import selectinload
+
+from models import db, Complaint, ComplaintArchive, ComplaintArticle, Document, Note, Reminder
+from utils.tenants import tenant_folder
+
+
+FORMAT_VERSION = 1
+
+# Child tables archived with each complaint, keyed by payload section
+CHILD_MODELS = (('notes', Note), ('documents', Document), ('reminders', Reminder), ('cited_articles', ComplaintArticle))
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def row_to_dict(obj):
+    """Column values of a model instance, JSON-ready"""
+    return {column.name: _encode(getattr(obj, column.name)) for column in obj.__table__.columns}
+
+
+def dict_to_row(model, data):
+    """Column values for model from row_to_dict() output, with dates restored"""
+    values = {}
+    for column in model.__table__.columns:
+        value = data.get(column.name)
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+
+def _gzip_file(source, destination):
+    """Compress source to destination atomically; returns compressed size"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = f'{destination}.tmp'
+    with open(source, 'rb') as src, gzip.open(temp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(temp_path, destination)
+    return os.path.getsize(destination)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _archive_complaint(complaint, archive_folder, totals):
+    """Build the archive row for one complaint; returns (row, files to delete after commit)"""
+    closed_at = complaint.closed_at or complaint.updated_at
+    payload = {'complaint': row_to_dict(complaint)}
+    for section, _ in CHILD_MODELS:
+        payload[section] = [row_to_dict(child) for child in getattr(complaint, section)]
+        totals[section] = totals.get(section, 0) + len(payload[section])
+
+    originals = []
+    for document, row in zip(complaint.documents, payload['documents']):
+        if document.file_path and os.path.exists(document.file_path):
+            relative_path = os.path.join(str(closed_at.year), f'{document.filename}.gz')
+            totals['bytes_before'] += os.path.getsize(document.file_path)
+            totals['bytes_after'] += _gzip_file(document.file_path, os.path.join(archive_folder, relative_path))
+            row['archived_file'] = relative_path
+            originals.append(document.file_path)
+            totals['files'] += 1
+        if document.thumbnail_path:
+            originals.append(document.thumbnail_path)
+
+    row = {
+        'complaint_id': complaint.id,
+        'tenant_id': complaint.tenant_id,
+        'user_id': complaint.user_id,
+        'title': complaint.title,
+        'closed_at': closed_at,
+        'archived_at': datetime.utcnow(),
+        'payload': zlib.compress(json.dumps(payload).encode(), 9),
+        'format_version': FORMAT_VERSION
+    }
+    return row, originals
+
+
+def archive_closed_complaints(older_than_days=None, batch_size=100, dry_run=False, progress=None):
+    """
+    Move complaints closed more than older_than_days ago into cold storage
+
+    Files are compressed before the database transaction and the originals
+    deleted only after it commits, so a crash never loses evidence (it can
+    at worst leave a stray copy). Returns dict of totals.
+    """
+    older_than_days = older_than_days if older_than_days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    archive_folder = tenant_folder('ARCHIVE_FOLDER')
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    totals = {'complaints': 0, 'files': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    # SQLite can hand the highest id to the next insert once its row is gone; never archive it
+    max_id = db.session.query(func.max(Complaint.id)).scalar() or 0
+    last_id = 0
+    while True:
+        complaints = Complaint.query.options(*[selectinload(getattr(Complaint, section)) for section, _ in CHILD_MODELS]) \
+            .filter(Complaint.status == 'closed',
+                    func.coalesce(Complaint.closed_at, Complaint.updated_at) < cutoff,
+                    Complaint.id > last_id,
+                    Complaint.id < max_id) \
+            .order_by(Complaint.id).limit(batch_size).all()
+        if not complaints:
+            return totals
+        last_id = complaints[-1].id
+        totals['complaints'] += len(complaints)
+
+        if dry_run:
+            for complaint in complaints:
+                for section, _ in CHILD_MODELS:
+                    totals[section] = totals.get(section, 0) + len(getattr(complaint, section))
+            db.session.expunge_all()
+            continue
+
+        rows = []
+        originals = []
+        for complaint in complaints:
+            row, files = _archive_complaint(complaint, archive_folder, totals)
+            rows.append(row)
+            originals.extend(files)
+
+        ids = [complaint.id for complaint in complaints]
+        db.session.expunge_all()
+        db.session.execute(insert(ComplaintArchive), rows)
+        for _, model in CHILD_MODELS:
+            db.session.execute(delete(model).where(model.complaint_id.in_(ids)))
+        db.session.execute(delete(Complaint).where(Complaint.id.in_(ids)))
+        db.session.commit()
+
+        for path in originals:
+            _remove_quietly(path)
+        if progress:
+            progress(totals)
+
+
+def _load_payload(archive):
+    payload = json.loads(zlib.decompress(archive.payload))
+    # Complaints archived before tenancy carry no tenant_id
+    payload['complaint'].setdefault('tenant_id', archive.tenant_id)
+    return payload
+
+
+def load_archived_complaint(complaint_id):
+    """
+    Rebuild an archived complaint as detached, read-only model instances
+
+    Returns a Complaint (never added to the session) with notes, documents,
+    reminders and cited_articles populated and an archived_at attribute,
+    or None if no archive exists.
+    """
+    archive = db.session.get(ComplaintArchive, complaint_id)
+    if archive is None:
+        return None
+    payload = _load_payload(archive)
+
+    complaint = Complaint(**dict_to_row(Complaint, payload['complaint']))
+    for section, model in CHILD_MODELS:
+        setattr(complaint, section, [model(**dict_to_row(model, row)) for row in payload[section]])
+    for document in complaint.documents:
+        document.thumbnail_path = None  # thumbnails are not archived
+    complaint.archived_at = archive.archived_at
+    return complaint
+
+
+def archived_complaints_for_user(user_id):
+    """(complaint_id, title, closed_at) of a user's archived complaints, most recently closed first"""
+    return db.session.query(ComplaintArchive.complaint_id, ComplaintArchive.title, ComplaintArchive.closed_at) \
+        .filter(ComplaintArchive.user_id == user_id) \
+        .order_by(ComplaintArchive.closed_at.desc()).all()
+
+
+def restore_complaint(complaint_id):
+    """Move an archived complaint and its files back into the hot tables"""
+    archive = db.session.get(ComplaintArchive, complaint_id)
+    if archive is None:
+        raise ValueError(f'Complaint {complaint_id} is not archived')
+    if db.session.get(Complaint, complaint_id) is not None:
+        raise ValueError(f'Complaint id {complaint_id} is in use by another complaint')
+    payload = _load_payload(archive)
+    archive_folder = tenant_folder('ARCHIVE_FOLDER')
+
+    archived_files = []
+    for row in payload['documents']:
+        relative_path = row.pop('archived_file', None)
+        row['thumbnail_path'] = None
+        if relative_path:
+            archived_file = os.path.join(archive_folder, relative_path)
+            os.makedirs(os.path.dirname(row['file_path']), exist_ok=True)
+            with gzip.open(archived_file, 'rb') as src, open(row['file_path'], 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            archived_files.append(archived_file)
+
+    db.session.execute(insert(Complaint), [dict_to_row(Complaint, payload['complaint'])])
+    for section, model in CHILD_MODELS:
+        if payload[section]:
+            db.session.execute(insert(model), [dict_to_row(model, row) for row in payload[section]])
+    db.session.delete(archive)
+    db.session.commit()
+
+    for path in archived_files:
+        _remove_quietly(path)
@@ -0,0 +1,98 @@
+"""
+Indexed lookups of NAR Code articles cited by complaints
+"""
+import json
+from sqlalchemy import func
+
+from models import db, Complaint, ComplaintArticle
+from utils.nar_code_articles import NAR_CODE_ARTICLES
+
+
+def normalize_article_number(value):
+    """Accept 'Article 12', 'article 12' or '12'; return the canonical key or None"""
+    value = (value or '').strip()
+    if value.isdigit():
+        value = f'Article {int(value)}'
+    else:
+        value = value.title()
+    return value if value in NAR_CODE_ARTICLES else None
+
+
+def set_complaint_articles(complaint, article_numbers):
+    """Replace the articles cited by a complaint, keeping citation order"""
+    seen = set()
+    complaint.cited_articles = []
+    for position, number in enumerate(article_numbers):
+        number = normalize_article_number(number)
+        if number and number not in seen:
+            seen.add(number)
+            complaint.cited_articles.append(ComplaintArticle(article_number=number, position=position))
+
+
+def complaints_citing(article_number, user_id=None, before_id=None, limit=50):
+    """
+    Complaints citing an article, newest first, using the article index
+
+    Pass the last id of the previous page as before_id to page through results.
+    """
+    query = Complaint.query.join(ComplaintArticle).filter(ComplaintArticle.article_number == article_number)
+    if user_id is not None:
+        query = query.filter(Complaint.user_id == user_id)
+    if before_id is not None:
+        query = query.filter(ComplaintArticle.complaint_id < before_id)
+    return query.order_by(ComplaintArticle.complaint_id.desc()).limit(limit).all()
+
+
+def article_counts(user_id=None):
+    """Map of article number -> number of the current tenant's complaints citing it"""
+    # Always join Complaint: complaint_articles has no tenant_id, so the tenant filter applies through it
+    query = db.session.query(ComplaintArticle.article_number, func.count(ComplaintArticle.complaint_id)) \
+        .join(Complaint, Complaint.id == ComplaintArticle.complaint_id)
+    if user_id is not None:
+        query = query.filter(Complaint.user_id == user_id)
+    return dict(query.group_by(ComplaintArticle.article_number).all())
+
+
+def backfill_complaint_articles(batch_size=1000, progress=None):
+    """
+    Copy legacy alleged_violations JSON into complaint_articles
+
+    Walks complaints by id and skips any that already have article rows, so
+    it is safe to re-run. Returns the number of complaints backfilled.
+    """
+    backfilled = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Complaint.id, Complaint.alleged_violations) \
+            .filter(Complaint.id > last_id, Complaint.alleged_violations.isnot(None)) \
+            .order_by(Complaint.id).limit(batch_size).all()
+        if not rows:
+            return backfilled
+        last_id = rows[-1].id
+
+        already_done = {
+            complaint_id for complaint_id, in db.session.query(ComplaintArticle.complaint_id)
+            .filter(ComplaintArticle.complaint_id.in_([row.id for row in rows])).distinct()
+        }
+
+        new_rows = []
+        for complaint_id, alleged_violations in rows:
+            if complaint_id in already_done:
+                continue
+            try:
+                numbers = json.loads(alleged_violations)
+            except ValueError:
+                continue
+            seen = set()
+            for position, number in enumerate(numbers):
+                number = normalize_article_number(number)
+                if number and number not in seen:
+                    seen.add(number)
+                    new_rows.append({'complaint_id': complaint_id, 'article_number': number, 'position': position})
+            backfilled += 1
+
+        if new_rows:
+            db.session.execute(ComplaintArticle.__table__.insert(), new_rows)
+        db.session.commit()
+        if progress:
+            progress(backfilled)
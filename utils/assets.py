@@ -0,0 +1,290 @@
+"""
+Static asset pipeline: vendored, bundled, fingerprinted and precompressed
+
+Sources live in assets/: the site's own CSS/JS, and third-party files in
+assets/vendor/ fetched once with `flask vendor-assets` and committed, so
+pages make no third-party requests. `flask build-assets` (also run at
+startup when the sources changed) minifies and concatenates each bundle,
+names the result after its content hash, writes .gz (and .br, with the
+brotli package) variants next to it and records everything in
+manifest.json. /assets/ serves the built files with a year-long immutable
+Cache-Control, picking the precompressed variant the client accepts.
+
+`flask build-assets` fails if a vendor file is missing. The build at
+startup logs the error instead and leaves the file out of its bundle, and
+asset_tags() then links the pinned CDN copy.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.request
+from markupsafe import Markup, escape
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are skipped without it
+    brotli = None
+
+
+# Pinned third-party assets: source path -> upstream URL
+VENDOR_ASSETS = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.13.1/font/bootstrap-icons.min.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.13.1/font/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.13.1/font/fonts/bootstrap-icons.woff',
+}
+
+# Files copied with a hashed name so bundles can reference them (fonts)
+STANDALONE_FILES = (
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff',
+)
+
+# Output name -> sources concatenated in order
+BUNDLES = {
+    'css/site.css': ['vendor/bootstrap/bootstrap.min.css', 'vendor/bootstrap-icons/bootstrap-icons.min.css', 'css/app.css'],
+    'js/site.js': ['vendor/bootstrap/bootstrap.bundle.min.js'],
+    'js/complaint_form.js': ['js/complaint_form.js'],
+}
+
+# Sent as Link: rel=preload on every HTML page
+PRELOAD = (
+    ('css/site.css', 'style'),
+    ('js/site.js', 'script'),
+    ('vendor/bootstrap-icons/fonts/bootstrap-icons.woff2', 'font'),
+)
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CSS_URL = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+
+def minify_css(text):
+    """Drop comments and insignificant whitespace"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """
+    Drop blank lines, indentation and whole-line // comments
+
+    Deliberately conservative: statements stay on their own lines, so
+    automatic semicolon insertion and string contents are unaffected.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def _minify(name, text):
+    if '.min.' in name:
+        return text
+    if name.endswith('.css'):
+        return minify_css(text)
+    if name.endswith('.js'):
+        return minify_js(text)
+    return text
+
+
+def _hashed_name(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_css_urls(css, source, output, hashed):
+    """Point url() references at the hashed copies, relative to the bundle's location"""
+    def replace(match):
+        reference = match.group(2)
+        if reference.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path = re.split(r'[?#]', reference, maxsplit=1)[0]
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        if target not in hashed:
+            return match.group(0)
+        return f'url("{posixpath.relpath(hashed[target], posixpath.dirname(output))}")'
+    return CSS_URL.sub(replace, css)
+
+
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.tmp{os.getpid()}'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _write_output(build_dir, name, content):
+    """Write a built file plus its precompressed variants"""
+    path = os.path.join(build_dir, name)
+    _write_atomic(path, content)
+    if name.endswith(COMPRESSIBLE):
+        _write_atomic(f'{path}.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(f'{path}.br', brotli.compress(content, quality=11))
+
+
+def source_digest(source_dir):
+    """Fingerprint of every source file's path, size and mtime; changes when any source does"""
+    entries = []
+    for root, _, files in os.walk(source_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            stat = os.stat(path)
+            entries.append((os.path.relpath(path, source_dir), stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha256(repr(sorted(entries)).encode()).hexdigest()
+
+
+def build_assets(source_dir, build_dir, allow_cdn=False):
+    """
+    Build every bundle into build_dir and write its manifest
+
+    Returns the manifest: output name -> {'path': hashed name,
+    'external': [CDN URLs of vendor sources not yet fetched]}. Raises
+    FileNotFoundError for a missing source; with allow_cdn, missing vendor
+    sources are linked from their CDN URLs instead.
+    """
+    hashed = {}
+    manifest = {}
+    for name in STANDALONE_FILES:
+        path = os.path.join(source_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                content = f.read()
+            hashed[name] = _hashed_name(name, content)
+            _write_output(build_dir, hashed[name], content)
+            manifest[name] = {'path': hashed[name], 'external': []}
+
+    for output, sources in BUNDLES.items():
+        parts = []
+        external = []
+        for source in sources:
+            path = os.path.join(source_dir, source)
+            if not os.path.exists(path):
+                if source not in VENDOR_ASSETS:
+                    raise FileNotFoundError(f'Asset source missing: {path}')
+                if not allow_cdn:
+                    raise FileNotFoundError(f'Vendor asset missing: {path} (run flask vendor-assets and commit '
+                                            f'assets/vendor/)')
+                external.append(VENDOR_ASSETS[source])
+                continue
+            with open(path, encoding='utf-8') as f:
+                text = _minify(source, f.read())
+            if source.endswith('.css'):
+                text = _rewrite_css_urls(text, source, output, hashed)
+            parts.append(text)
+        entry = {'path': None, 'external': external}
+        if parts:
+            content = '\n'.join(parts).encode('utf-8')
+            entry['path'] = _hashed_name(output, content)
+            _write_output(build_dir, entry['path'], content)
+        manifest[output] = entry
+
+    _write_atomic(os.path.join(build_dir, 'manifest.json'), json.dumps({
+        'source_digest': source_digest(source_dir),
+        'assets': manifest
+    }, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def vendor_assets(source_dir, force=False, timeout=30):
+    """Download the pinned third-party assets into source_dir; returns the paths fetched"""
+    fetched = []
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(source_dir, name)
+        if os.path.exists(path) and not force:
+            continue
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            _write_atomic(path, response.read())
+        fetched.append(name)
+    return fetched
+
+
+def load_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def init_assets(app):
+    """Build stale assets, and register /assets/, asset_tags() and preload headers"""
+    source_dir = app.config['ASSETS_SOURCE_DIR']
+    build_dir = app.config['ASSETS_BUILD_DIR']
+    manifest = load_manifest(build_dir)
+    # A manifest with CDN fallbacks is rebuilt until the vendor files are there
+    uses_cdn = manifest is not None and any(entry['external'] for entry in manifest['assets'].values())
+    if app.config.get('ASSETS_AUTO_BUILD', True) and (
+            manifest is None or manifest['source_digest'] != source_digest(source_dir) or uses_cdn):
+        try:
+            build_assets(source_dir, build_dir)
+        except FileNotFoundError as e:
+            # Serve the pages with CDN links rather than refuse to start
+            app.logger.error('%s; linking the CDN copies instead', e)
+            build_assets(source_dir, build_dir, allow_cdn=True)
+        manifest = load_manifest(build_dir)
+    assets = manifest['assets'] if manifest else {}
+
+    def asset_url(name):
+        entry = assets.get(name)
+        if entry and entry['path']:
+            return url_for('serve_asset', filename=entry['path'])
+        return None
+
+    def asset_tags(name):
+        """<link>/<script> tags for a bundle: CDN fallbacks first, then the built file"""
+        entry = assets.get(name, {'external': []})
+        urls = list(entry['external'])
+        if asset_url(name):
+            urls.append(asset_url(name))
+        if name.endswith('.css'):
+            return Markup(''.join(f'<link rel="stylesheet" href="{escape(url)}">' for url in urls))
+        return Markup(''.join(f'<script src="{escape(url)}"></script>' for url in urls))
+
+    app.jinja_env.globals['asset_tags'] = asset_tags
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        """Built asset, precompressed when the client accepts it; names are content hashes so caching is permanent"""
+        if safe_join(build_dir, filename) is None or filename == 'manifest.json':
+            raise NotFound()
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            compressed = safe_join(build_dir, filename + suffix)
+            if request.accept_encodings[encoding] and os.path.isfile(compressed):
+                response = send_from_directory(build_dir, filename + suffix, mimetype=mimetype,
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(build_dir, filename, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    preload_targets = [(name, kind) for name, kind in PRELOAD if assets.get(name, {}).get('path')]
+
+    @app.after_request
+    def _preload_hints(response):
+        if preload_targets and response.mimetype == 'text/html':
+            hints = []
+            for name, kind in preload_targets:
+                hint = f'<{asset_url(name)}>; rel=preload; as={kind}'
+                if kind == 'font':
+                    hint += '; type="font/woff2"; crossorigin'
+                hints.append(hint)
+            response.headers.add('Link', ', '.join(hints))
+        return response
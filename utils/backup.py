@@ -0,0 +1,400 @@
+"""
+Online backups of the SQLite databases, with verified restore
+
+snapshot_databases() copies the primary database and every tenant database
+that is a SQLite file while the application keeps serving, using SQLite's
+online backup API in steps of BACKUP_PAGES_PER_STEP pages with a pause of
+BACKUP_STEP_SLEEP_SECONDS between steps, so the copy never competes with
+requests for disk bandwidth for long.
+
+In WAL mode the copy reads from one snapshot held open for its duration;
+WAL readers never block writers, so the backup sees a consistent database
+while requests keep writing. In rollback-journal mode a held read would
+lock writers out, so the lock is only taken for each step, and a write
+between steps makes SQLite start the copy over; after BACKUP_MAX_RESTARTS
+restarts the backup gives up rather than lock out writers (switch the
+database to WAL with `PRAGMA journal_mode=WAL` to avoid this).
+
+Each copy is checked with PRAGMA quick_check, gzipped into
+BACKUP_FOLDER/<database>/, and described by a JSON manifest beside it
+(SHA-256 of the compressed and the raw file, page count, timings). Only
+the newest BACKUP_KEEP snapshots of each database are kept.
+verify_snapshot() re-checks checksums and runs a full integrity_check on a
+decompressed copy; restore_snapshot() does the same before it swaps the
+copy into place. PostgreSQL databases are skipped: back them up with
+pg_dump.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from urllib.parse import quote
+from flask import current_app
+from sqlalchemy import or_, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+
+from models import db, JobRun
+from utils.tenants import tenant_bind_key
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+PRIMARY = 'primary'
+JOB_NAME = 'database_backup'
+SNAPSHOT_SUFFIX = '.db.gz'
+MANIFEST_SUFFIX = '.json'
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """A backup could not be taken, or a snapshot failed verification"""
+
+
+def _sqlite_path(url):
+    """Absolute file path of a SQLite URL; None for other databases and in-memory SQLite"""
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return os.path.abspath(url.database)
+
+
+def sqlite_databases(config=None):
+    """{name: file path} of the SQLite databases to back up: 'primary' and tenant_<slug> for tenant databases"""
+    config = config or current_app.config
+    databases = {}
+    path = _sqlite_path(config['SQLALCHEMY_DATABASE_URI'])
+    if path:
+        databases[PRIMARY] = path
+    for slug, url in config.get('TENANT_DATABASES', {}).items():
+        path = _sqlite_path(url)
+        if path:
+            databases[tenant_bind_key(slug)] = path
+    return databases
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _copy_online(source_path, target_path, pages_per_step, step_sleep, max_restarts):
+    """
+    Copy a live SQLite database to target_path with the backup API
+
+    Returns (journal mode, restarts).
+    """
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        journal_mode = source.execute('PRAGMA journal_mode').fetchone()[0].lower()
+        if journal_mode == 'wal':
+            # Pin one snapshot for the whole copy; writers carry on in the WAL
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+
+        state = {'remaining': None, 'restarts': 0}
+
+        def throttle(status, remaining, total):
+            # A write to the source between steps makes SQLite start the copy over
+            if state['remaining'] is not None and remaining >= state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > max_restarts:
+                    raise BackupError(
+                        f'{source_path} changed during the backup {state["restarts"]} times; retry when it is '
+                        f'quieter, or switch it to WAL (PRAGMA journal_mode=WAL) so backups read a snapshot'
+                    )
+            state['remaining'] = remaining
+            if remaining and step_sleep:
+                time.sleep(step_sleep)
+
+        source.backup(target, pages=pages_per_step, progress=throttle)
+        if journal_mode == 'wal':
+            source.execute('COMMIT')
+        # The copy is a standalone file: never leave it expecting a WAL beside it
+        target.execute('PRAGMA journal_mode=DELETE')
+        return journal_mode, state['restarts']
+    finally:
+        target.close()
+        source.close()
+
+
+def _check(path, pragma):
+    """Run quick_check or integrity_check on a database file; raises BackupError unless it reports ok"""
+    connection = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True)
+    try:
+        problems = [row[0] for row in connection.execute(f'PRAGMA {pragma}')]
+        page_count = connection.execute('PRAGMA page_count').fetchone()[0]
+        page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f'{path} is not a usable SQLite database: {e}')
+    finally:
+        connection.close()
+    if problems != ['ok']:
+        raise BackupError(f'{pragma} failed on {path}: {"; ".join(problems[:5])}')
+    return page_count, page_size
+
+
+def _gzip(source, destination):
+    """Compress source to destination atomically; returns the SHA-256 of source"""
+    digest = hashlib.sha256()
+    temp_path = f'{destination}.tmp'
+    with open(source, 'rb') as src, gzip.open(temp_path, 'wb', compresslevel=6) as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    os.replace(temp_path, destination)
+    return digest.hexdigest()
+
+
+def snapshot_database(name, source_path, backup_folder=None, pages_per_step=None, step_sleep=None,
+                      max_restarts=None):
+    """
+    Take one compressed, checksummed snapshot of a live SQLite database
+
+    Returns the snapshot's manifest (with 'path' added). Raises BackupError.
+    """
+    config = current_app.config
+    backup_folder = backup_folder or config['BACKUP_FOLDER']
+    pages_per_step = pages_per_step or config['BACKUP_PAGES_PER_STEP']
+    step_sleep = config['BACKUP_STEP_SLEEP_SECONDS'] if step_sleep is None else step_sleep
+    max_restarts = config['BACKUP_MAX_RESTARTS'] if max_restarts is None else max_restarts
+    if not os.path.exists(source_path):
+        raise BackupError(f'{source_path} does not exist')
+
+    folder = os.path.join(backup_folder, name)
+    os.makedirs(folder, exist_ok=True)
+    created_at = datetime.utcnow()
+    stem = f'{name}-{created_at.strftime("%Y%m%dT%H%M%SZ")}'
+    raw_path = os.path.join(folder, f'.{stem}.db.tmp')
+    snapshot_path = os.path.join(folder, stem + SNAPSHOT_SUFFIX)
+
+    started = time.monotonic()
+    try:
+        journal_mode, restarts = _copy_online(source_path, raw_path, pages_per_step, step_sleep, max_restarts)
+        copied = time.monotonic()
+        page_count, page_size = _check(raw_path, 'quick_check')
+        raw_size = os.path.getsize(raw_path)
+        raw_sha256 = _gzip(raw_path, snapshot_path)
+    except sqlite3.Error as e:
+        raise BackupError(f'Backing up {source_path} failed: {e}')
+    finally:
+        _remove_quietly(raw_path)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'database': name,
+        'source': source_path,
+        'created_at': created_at.isoformat(),
+        'file': os.path.basename(snapshot_path),
+        'sha256': _file_sha256(snapshot_path),
+        'size': os.path.getsize(snapshot_path),
+        'raw_sha256': raw_sha256,
+        'raw_size': raw_size,
+        'page_count': page_count,
+        'page_size': page_size,
+        'journal_mode': journal_mode,
+        'restarts': restarts,
+        'copy_seconds': round(copied - started, 3),
+        'total_seconds': round(time.monotonic() - started, 3),
+        'sqlite_version': sqlite3.sqlite_version,
+    }
+    manifest_path = os.path.join(folder, stem + MANIFEST_SUFFIX)
+    with open(f'{manifest_path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+    return dict(manifest, path=snapshot_path)
+
+
+def list_snapshots(name=None, backup_folder=None):
+    """Manifests (with 'path') of the snapshots of one database, or of all, newest first"""
+    backup_folder = backup_folder or current_app.config['BACKUP_FOLDER']
+    try:
+        names = [name] if name else sorted(os.listdir(backup_folder))
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for database in names:
+        folder = os.path.join(backup_folder, database)
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.listdir(folder):
+            if entry.endswith(MANIFEST_SUFFIX) and not entry.startswith('.'):
+                manifest = _read_manifest(os.path.join(folder, entry))
+                if manifest is not None:
+                    snapshots.append(dict(manifest, path=os.path.join(folder, manifest['file'])))
+    # Timestamps sort lexically; names tie-break across databases
+    snapshots.sort(key=lambda m: (m['created_at'], m['database']), reverse=True)
+    return snapshots
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logger.warning('Skipping unreadable backup manifest %s', path)
+        return None
+
+
+def prune_snapshots(name, keep=None, backup_folder=None):
+    """Delete all but the newest keep snapshots of a database; returns the paths removed"""
+    keep = current_app.config['BACKUP_KEEP'] if keep is None else keep
+    removed = []
+    for manifest in list_snapshots(name, backup_folder)[keep:]:
+        stem = manifest['path'][:-len(SNAPSHOT_SUFFIX)]
+        _remove_quietly(manifest['path'])
+        _remove_quietly(stem + MANIFEST_SUFFIX)
+        removed.append(manifest['path'])
+    return removed
+
+
+def _claim_day(today):
+    """Record today's backup run; False if another process already took it"""
+    now = datetime.utcnow()
+    if db.session.get(JobRun, JOB_NAME) is None:
+        db.session.add(JobRun(job_name=JOB_NAME, last_run_on=today, last_run_at=now))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    result = db.session.execute(
+        update(JobRun)
+        .where(JobRun.job_name == JOB_NAME, or_(JobRun.last_run_on.is_(None), JobRun.last_run_on < today))
+        .values(last_run_on=today, last_run_at=now)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def snapshot_databases(names=None, keep=None, report=None):
+    """
+    Snapshot each SQLite database (or those in names), then prune old snapshots
+
+    report, if given, is called with each manifest. A database that fails
+    is logged and skipped, so one bad tenant database does not cost the
+    others their backup. Returns (manifests, {name: error message}).
+    """
+    databases = sqlite_databases()
+    if names:
+        unknown = set(names) - set(databases)
+        if unknown:
+            raise BackupError(f'No SQLite database named {", ".join(sorted(unknown))}; '
+                              f'known: {", ".join(databases) or "none"}')
+        databases = {name: path for name, path in databases.items() if name in names}
+
+    manifests, failures = [], {}
+    for name, path in databases.items():
+        try:
+            manifest = snapshot_database(name, path)
+        except BackupError as e:
+            logger.error('Backup of %s failed: %s', name, e)
+            failures[name] = str(e)
+            continue
+        manifests.append(manifest)
+        prune_snapshots(name, keep)
+        if report is not None:
+            report(manifest)
+    return manifests, failures
+
+
+def scheduled_backup():
+    """Nightly snapshot of every SQLite database; the first process to claim the day runs it"""
+    if not sqlite_databases() or not _claim_day(date.today()):
+        return None
+    return snapshot_databases()
+
+
+def snapshot_manifest(snapshot_path):
+    """The manifest written beside a snapshot; raises BackupError if it is missing or unreadable"""
+    if not snapshot_path.endswith(SNAPSHOT_SUFFIX):
+        raise BackupError(f'{snapshot_path} is not a {SNAPSHOT_SUFFIX} snapshot')
+    manifest = _read_manifest(snapshot_path[:-len(SNAPSHOT_SUFFIX)] + MANIFEST_SUFFIX)
+    if manifest is None:
+        raise BackupError(f'No readable manifest beside {snapshot_path}')
+    return manifest
+
+
+def _unpack(snapshot_path, manifest, destination):
+    """Check the compressed checksum, decompress to destination and check the raw checksum"""
+    if _file_sha256(snapshot_path) != manifest['sha256']:
+        raise BackupError(f'{snapshot_path} does not match its recorded checksum')
+    digest = hashlib.sha256()
+    try:
+        with gzip.open(snapshot_path, 'rb') as src, open(destination, 'wb') as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+    except (OSError, EOFError) as e:
+        _remove_quietly(destination)
+        raise BackupError(f'{snapshot_path} could not be decompressed: {e}')
+    if digest.hexdigest() != manifest['raw_sha256']:
+        _remove_quietly(destination)
+        raise BackupError(f'{snapshot_path} decompressed to different contents than were backed up')
+
+
+def verify_snapshot(snapshot_path, work_folder=None):
+    """
+    Check a snapshot's checksums and run a full integrity_check on a decompressed copy
+
+    The copy is written to work_folder (default: beside the snapshot) and
+    removed afterwards. Returns the manifest; raises BackupError.
+    """
+    manifest = snapshot_manifest(snapshot_path)
+    work_folder = work_folder or os.path.dirname(snapshot_path)
+    temp_path = os.path.join(work_folder, f'.verify-{os.path.basename(snapshot_path)[:-3]}')
+    try:
+        _unpack(snapshot_path, manifest, temp_path)
+        _check(temp_path, 'integrity_check')
+    finally:
+        _remove_quietly(temp_path)
+    return manifest
+
+
+def restore_snapshot(snapshot_path, target_path):
+    """
+    Verify a snapshot and make it the database file at target_path
+
+    The snapshot is decompressed and integrity-checked next to the target
+    and then renamed over it, so a failed check leaves the target as it
+    was. An existing target (with its -wal and -shm files) is kept as
+    <target>.pre-restore-<timestamp>. Stop the application first: open
+    connections would keep using the replaced file. Returns (manifest,
+    path the old database was moved to or None).
+    """
+    manifest = snapshot_manifest(snapshot_path)
+    target_path = os.path.abspath(target_path)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = f'{target_path}.restore-tmp'
+    try:
+        _unpack(snapshot_path, manifest, temp_path)
+        _check(temp_path, 'integrity_check')
+    except BackupError:
+        _remove_quietly(temp_path)
+        raise
+
+    kept_path = None
+    if os.path.exists(target_path):
+        kept_path = f'{target_path}.pre-restore-{datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")}'
+        for suffix in ('-wal', '-shm', '-journal', ''):
+            if os.path.exists(target_path + suffix):
+                os.replace(target_path + suffix, kept_path + suffix)
+    os.replace(temp_path, target_path)
+    return manifest, kept_path
@@ -0,0 +1,78 @@
+"""
+Session that routes statements to a tenant's database or a read replica
+
+A tenant with a database of its own (see utils/tenants.py) gets every
+statement, reads and writes, except those on shared directory tables.
+Otherwise views opt in to replicas through utils.replicas.replica_reads,
+which picks a replica for the request. Flushes and INSERT/UPDATE/DELETE
+statements always go to the primary, and after the first write every
+later statement in the request does too, so a request reads its own
+writes.
+"""
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+
+DEFAULT_TENANT_ID = 1
+
+
+def current_tenant_id():
+    """Tenant of the current request or CLI scope; the default tenant outside one"""
+    if has_app_context():
+        tenant_id = g.get('tenant_id')
+        if tenant_id is not None:
+            return tenant_id
+    return DEFAULT_TENANT_ID
+
+
+def tenant_job_name(job_name):
+    """JobRun name for job_name run in the current tenant scope; a tenant's run must not mark the day done for all"""
+    tenant_id = g.get('tenant_id') if has_app_context() else None
+    return job_name if tenant_id is None else f'{job_name}:{tenant_id}'
+
+
+def route_to_tenant(tenant_id, slug=None, bind_key=None):
+    """Make tenant_id current; bind_key is its own database's bind, None when it shares the primary"""
+    g.tenant_id = tenant_id
+    g.tenant_slug = slug
+    g._tenant_bind = bind_key
+
+
+def tenant_bind():
+    """Bind key of the current tenant's own database, or None"""
+    return g.get('_tenant_bind') if has_app_context() else None
+
+
+def _is_shared(mapper):
+    return mapper is not None and mapper.local_table.info.get('shared', False)
+
+
+def route_reads_to(bind_key):
+    """Send this request's reads to the engine for bind_key (None = primary)"""
+    g._replica_bind = bind_key
+
+
+def request_wrote():
+    """Whether the current request has written to the primary"""
+    return g.get('_db_wrote', False)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session with per-request tenant database and replica routing"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            tenant_bind_key = g.get('_tenant_bind')
+            if tenant_bind_key is not None and not _is_shared(mapper):
+                return self._db.engines[tenant_bind_key]
+            if self._flushing or isinstance(clause, UpdateBase):
+                g._db_wrote = True
+                g._replica_bind = None
+            else:
+                bind_key = g.get('_replica_bind')
+                # Raw SQL may write, so it stays on the primary
+                if bind_key is not None and not isinstance(clause, TextClause):
+                    return self._db.engines[bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
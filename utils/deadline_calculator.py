@@ -102,36 +102,28 @@ def is_deadline_passed(deadline_date):
     return days_left < 0 if days_left is not None else False
 
 
-def estimate_investigation_completion(submission_date, state=None):
-    """
-    Estimate when investigation might complete
+# Deadline status buckets as (status, urgency, css_class, min_days_left, max_days_left).
+# Ranks follow list order, so a lower rank means more urgent.
+DEADLINE_BUCKETS = [
+    ('expired', 'critical', 'danger', None, -1),
+    ('urgent', 'high', 'danger', 0, 7),
+    ('approaching', 'medium', 'warning', 8, 30),
+    ('upcoming', 'low', 'info', 31, 90),
+    ('sufficient_time', 'none', 'success', 91, None),
+]
 
-    Args:
-        submission_date: date when complaint was submitted
-        state: state abbreviation
+URGENCY_RANKS = {bucket[0]: rank for rank, bucket in enumerate(DEADLINE_BUCKETS)}
+UNKNOWN_URGENCY_RANK = len(DEADLINE_BUCKETS)
 
-    Returns:
-        Estimated completion date
-    """
-    if not submission_date:
-        return None
 
-    if isinstance(submission_date, str):
-        submission_date = datetime.strptime(submission_date, '%Y-%m-%d').date()
+def get_deadline_bucket(days_left):
+    """Return (status, urgency, css_class, rank) for a number of days remaining"""
+    if days_left is None:
+        return 'unknown', 'none', None, UNKNOWN_URGENCY_RANK
 
-    # Investigation timelines in days
-    investigation_timelines = {
-        'CO': 240,    # Colorado aims for 240 days
-        'DEFAULT': 180  # Default estimate
-    }
-
-    days_to_add = investigation_timelines.get(
-        state.upper() if state else 'DEFAULT',
-        investigation_timelines['DEFAULT']
-    )
-
-    completion_date = submission_date + timedelta(days=days_to_add)
-    return completion_date
+    for rank, (status, urgency, css_class, min_days, max_days) in enumerate(DEADLINE_BUCKETS):
+        if (min_days is None or days_left >= min_days) and (max_days is None or days_left <= max_days):
+            return status, urgency, css_class, rank
 
 
 def get_deadline_status(deadline_date):
@@ -148,39 +140,20 @@ def get_deadline_status(deadline_date):
         }
 
     days_left = days_until_deadline(deadline_date)
-
-    if days_left < 0:
-        return {
-            'status': 'expired',
-            'urgency': 'critical',
-            'message': f'Deadline passed {abs(days_left)} days ago',
-            'css_class': 'danger'
-        }
-    elif days_left <= 7:
-        return {
-            'status': 'urgent',
-            'urgency': 'high',
-            'message': f'{days_left} days remaining - File immediately!',
-            'css_class': 'danger'
-        }
-    elif days_left <= 30:
-        return {
-            'status': 'approaching',
-            'urgency': 'medium',
-            'message': f'{days_left} days remaining - Begin preparation',
-            'css_class': 'warning'
-        }
-    elif days_left <= 90:
-        return {
-            'status': 'upcoming',
-            'urgency': 'low',
-            'message': f'{days_left} days remaining',
-            'css_class': 'info'
-        }
+    status, urgency, css_class, _ = get_deadline_bucket(days_left)
+
+    if status == 'expired':
+        message = f'Deadline passed {abs(days_left)} days ago'
+    elif status == 'urgent':
+        message = f'{days_left} days remaining - File immediately!'
+    elif status == 'approaching':
+        message = f'{days_left} days remaining - Begin preparation'
     else:
-        return {
-            'status': 'sufficient_time',
-            'urgency': 'none',
-            'message': f'{days_left} days remaining',
-            'css_class': 'success'
-        }
+        message = f'{days_left} days remaining'
+
+    return {
+        'status': status,
+        'urgency': urgency,
+        'message': message,
+        'css_class': css_class
+    }
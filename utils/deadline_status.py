@@ -0,0 +1,127 @@
+"""
+Materialized deadline status maintenance and urgency queries
+
+Complaint.deadline_status / urgency_rank only change when days remaining
+crosses a bucket boundary (see DEADLINE_BUCKETS). The nightly refresh therefore
+touches just the rows whose filing_deadline sits on a boundary for the days
+elapsed since the last run, using range scans on the filing_deadline index.
+"""
+from datetime import date, datetime, timedelta
+
+from models import db, Complaint, JobRun
+from utils.db_routing import tenant_job_name
+from utils.deadline_calculator import DEADLINE_BUCKETS, UNKNOWN_URGENCY_RANK
+
+
+JOB_NAME = 'deadline_status_refresh'
+
+# Past this many missed days the boundary windows cover most buckets anyway
+FULL_REFRESH_AFTER_DAYS = 90
+
+
+def _bucket_deadline_ranges(today):
+    """Map each bucket to its (first, last) filing_deadline dates for today; None = open-ended"""
+    ranges = []
+    for rank, (status, _, _, min_days, max_days) in enumerate(DEADLINE_BUCKETS):
+        first = today + timedelta(days=min_days) if min_days is not None else None
+        last = today + timedelta(days=max_days) if max_days is not None else None
+        ranges.append((status, rank, first, last))
+    return ranges
+
+
+def _boundary_windows(last_run_on, today):
+    """
+    filing_deadline ranges whose bucket changed between last_run_on and today
+
+    A deadline D enters the bucket ending at max_days on the day D - max_days,
+    so for days last_run_on+1 .. today those are D in [last_run_on+1+max, today+max].
+    """
+    windows = []
+    for _, _, _, _, max_days in DEADLINE_BUCKETS:
+        if max_days is not None:
+            windows.append((last_run_on + timedelta(days=1 + max_days), today + timedelta(days=max_days)))
+    return windows
+
+
+def _intersect(first_a, last_a, first_b, last_b):
+    """Intersect two date ranges where None means open-ended; None if empty"""
+    firsts = [d for d in (first_a, first_b) if d is not None]
+    lasts = [d for d in (last_a, last_b) if d is not None]
+    first = max(firsts) if firsts else None
+    last = min(lasts) if lasts else None
+    if first is not None and last is not None and first > last:
+        return None
+    return first, last
+
+
+def _update_range(status, rank, first, last, extra_filter=None):
+    query = Complaint.query.filter(Complaint.filing_deadline.isnot(None))
+    if first is not None:
+        query = query.filter(Complaint.filing_deadline >= first)
+    if last is not None:
+        query = query.filter(Complaint.filing_deadline <= last)
+    if extra_filter is not None:
+        query = query.filter(extra_filter)
+    # Leave updated_at alone: a status refresh is not a user-visible edit
+    return query.update({Complaint.deadline_status: status,
+                         Complaint.urgency_rank: rank,
+                         Complaint.updated_at: Complaint.updated_at},
+                        synchronize_session=False)
+
+
+def refresh_deadline_statuses(today=None, full=False):
+    """
+    Bring materialized deadline statuses up to date
+
+    Runs set-based UPDATEs only over boundary windows since the last run,
+    plus any rows never materialized (bulk-loaded or pre-upgrade data).
+    Returns number of rows updated.
+    """
+    today = today or date.today()
+    job_name = tenant_job_name(JOB_NAME)
+    job = db.session.get(JobRun, job_name) or JobRun(job_name=job_name)
+    ranges = _bucket_deadline_ranges(today)
+    updated = 0
+
+    if full or job.last_run_on is None or (today - job.last_run_on).days > FULL_REFRESH_AFTER_DAYS:
+        for status, rank, first, last in ranges:
+            updated += _update_range(status, rank, first, last)
+        updated += Complaint.query.filter(Complaint.filing_deadline.is_(None)).update(
+            {Complaint.deadline_status: 'unknown', Complaint.urgency_rank: UNKNOWN_URGENCY_RANK,
+             Complaint.updated_at: Complaint.updated_at},
+            synchronize_session=False)
+    else:
+        if job.last_run_on < today:
+            for window_first, window_last in _boundary_windows(job.last_run_on, today):
+                for status, rank, first, last in ranges:
+                    bounds = _intersect(first, last, window_first, window_last)
+                    if bounds:
+                        updated += _update_range(status, rank, *bounds)
+
+        # Rows inserted in bulk bypass the ORM hook that materializes status
+        for status, rank, first, last in ranges:
+            updated += _update_range(status, rank, first, last, Complaint.deadline_status.is_(None))
+        updated += Complaint.query.filter(Complaint.filing_deadline.is_(None),
+                                          Complaint.deadline_status.is_(None)).update(
+            {Complaint.deadline_status: 'unknown', Complaint.urgency_rank: UNKNOWN_URGENCY_RANK,
+             Complaint.updated_at: Complaint.updated_at},
+            synchronize_session=False)
+
+    job.last_run_on = today
+    job.last_run_at = datetime.utcnow()
+    db.session.add(job)
+    db.session.commit()
+    return updated
+
+
+def get_expiring_complaints(days, today=None, statuses=None, limit=None):
+    """Complaints whose filing deadline falls within the next `days` days, soonest first"""
+    today = today or date.today()
+    query = Complaint.query.filter(Complaint.filing_deadline >= today,
+                                   Complaint.filing_deadline <= today + timedelta(days=days))
+    if statuses:
+        query = query.filter(Complaint.status.in_(statuses))
+    query = query.order_by(Complaint.filing_deadline.asc(), Complaint.id.asc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
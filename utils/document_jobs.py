@@ -0,0 +1,183 @@
+"""
+Background processing jobs for uploaded documents
+"""
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, or_
+
+from models import db, Document
+from utils.document_processing import detect_file_type, process_document_file
+from utils.image_optimization import optimize_stored_file
+from utils.jobs import enqueue_job, register_job_type
+from utils.tenants import tenant_folder
+
+
+PROCESS_DOCUMENT = 'process_document'
+ORIGINAL_COLUMNS = ('original_sha256', 'original_file_size')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def thumbnail_path_for(document):
+    """Where the thumbnail for a document is stored"""
+    return os.path.join(tenant_folder('THUMBNAIL_FOLDER'), f'{document.id}.jpg')
+
+
+def image_options():
+    """optimize_image() settings, or None when the optimization stage is disabled"""
+    if not current_app.config.get('IMAGE_OPTIMIZATION_ENABLED'):
+        return None
+    return {
+        'target_dpi': current_app.config['IMAGE_TARGET_DPI'],
+        'page_long_edge_inches': current_app.config['IMAGE_PAGE_LONG_EDGE_INCHES']
+    }
+
+
+def enqueue_document_processing(document):
+    """Queue processing for a document in the caller's transaction"""
+    document.processing_status = 'pending'
+    return enqueue_job(PROCESS_DOCUMENT, {'document_id': document.id})
+
+
+def _prepare(payload):
+    document = db.session.get(Document, payload['document_id'])
+    if document is None:
+        return None  # deleted before we got to it
+    return (document.file_path, document.original_filename, thumbnail_path_for(document), image_options(),
+            document.original_sha256)
+
+
+def _apply(payload, result):
+    document = db.session.get(Document, payload['document_id'])
+    if document is None:
+        return
+    for column, value in result.items():
+        # A retried job sees already-optimized bytes; never overwrite the as-uploaded record
+        if column in ORIGINAL_COLUMNS and getattr(document, column) is not None:
+            continue
+        setattr(document, column, value)
+    document.processed_at = datetime.utcnow()
+
+
+def _on_failure(payload, error):
+    document = db.session.get(Document, payload['document_id'])
+    if document is not None:
+        document.processing_status = 'failed'
+        document.processing_error = error
+
+
+register_job_type(PROCESS_DOCUMENT, _prepare, process_document_file, _apply, _on_failure)
+
+
+def enqueue_unprocessed_documents(batch_size=1000):
+    """Queue processing for documents uploaded before the pipeline existed"""
+    queued = 0
+    while True:
+        documents = Document.query.filter(Document.processing_status.is_(None)) \
+            .order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            return queued
+        for document in documents:
+            enqueue_document_processing(document)
+        db.session.commit()
+        queued += len(documents)
+
+
+def relocate_thumbnails(batch_size=500):
+    """
+    Move thumbnails stored outside THUMBNAIL_FOLDER (such as the old
+    static/uploads/thumbnails/) into it, walking documents by id
+
+    Returns dict of totals (moved, missing); a document whose thumbnail
+    file is gone has its thumbnail_path cleared.
+    """
+    folder = os.path.abspath(tenant_folder('THUMBNAIL_FOLDER'))
+    totals = {'moved': 0, 'missing': 0}
+    last_id = 0
+    while True:
+        documents = Document.query.filter(Document.id > last_id, Document.thumbnail_path.isnot(None)) \
+            .order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            return totals
+        last_id = documents[-1].id
+        for document in documents:
+            if os.path.dirname(os.path.abspath(document.thumbnail_path)) == folder:
+                continue
+            destination = thumbnail_path_for(document)
+            try:
+                os.makedirs(folder, exist_ok=True)
+                shutil.move(document.thumbnail_path, destination)
+            except FileNotFoundError:
+                document.thumbnail_path = None
+                totals['missing'] += 1
+                continue
+            document.thumbnail_path = destination
+            totals['moved'] += 1
+        db.session.commit()
+
+
+def _backfill_args(document, options, dry_run):
+    detected_type = document.detected_type
+    if detected_type is None and os.path.exists(document.file_path):
+        detected_type = detect_file_type(document.file_path)
+    if detected_type not in ('png', 'jpeg'):
+        return None
+    return document.file_path, detected_type, document.original_sha256, options, dry_run
+
+
+def optimize_existing_documents(workers=None, batch_size=200, dry_run=False, progress=None):
+    """
+    Run the image optimization stage over documents uploaded before it was enabled
+
+    Walks image documents by id in batches and optimizes each batch in a
+    process pool. Returns dict of totals (documents, bytes before/after, missing).
+    """
+    options = {
+        'target_dpi': current_app.config['IMAGE_TARGET_DPI'],
+        'page_long_edge_inches': current_app.config['IMAGE_PAGE_LONG_EDGE_INCHES']
+    }
+    totals = {'documents': 0, 'bytes_before': 0, 'bytes_after': 0, 'missing': 0}
+    last_id = 0
+    image_filter = or_(*[func.lower(Document.filename).like(f'%{ext}') for ext in IMAGE_EXTENSIONS])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            documents = Document.query.filter(Document.id > last_id,
+                                              Document.optimized_at.is_(None),
+                                              image_filter) \
+                .order_by(Document.id).limit(batch_size).all()
+            if not documents:
+                return totals
+            last_id = documents[-1].id
+
+            pending = {}
+            for document in documents:
+                args = _backfill_args(document, options, dry_run)
+                if args:
+                    pending[document.id] = executor.submit(optimize_stored_file, *args)
+
+            for document in documents:
+                future = pending.get(document.id)
+                if future is None:
+                    continue
+                result = future.result()
+                if result.get('missing'):
+                    totals['missing'] += 1
+                    continue
+                totals['documents'] += 1
+                totals['bytes_before'] += result['original_file_size']
+                totals['bytes_after'] += result['file_size']
+                if not dry_run:
+                    for column, value in result.items():
+                        if column in ORIGINAL_COLUMNS and getattr(document, column) is not None:
+                            continue
+                        setattr(document, column, value)
+
+            if not dry_run:
+                db.session.commit()
+            else:
+                db.session.rollback()
+            if progress:
+                progress(totals)
@@ -0,0 +1,185 @@
+"""
+CPU-bound document processing: type sniffing, text extraction, thumbnails
+
+Everything here is a pure function of a file on disk so it can run in a
+worker process pool without database or app access.
+"""
+import io
+import os
+import re
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+from PIL import Image
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+
+from utils.image_optimization import optimize_image, sha256_file
+
+
+THUMBNAIL_SIZE = (320, 320)
+MAX_EXTRACTED_CHARS = 200_000  # keep Document rows bounded for very long files
+
+# Extensions accepted by allowed_file() mapped to the content types they may contain
+EXTENSION_TYPES = {
+    'pdf': {'pdf'},
+    'png': {'png'},
+    'jpg': {'jpeg'},
+    'jpeg': {'jpeg'},
+    'doc': {'doc'},
+    'docx': {'docx'},
+    'txt': {'txt'},
+}
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def detect_file_type(path):
+    """Identify a file by its magic bytes; returns 'pdf', 'png', 'jpeg', 'doc', 'docx', 'txt' or None"""
+    with open(path, 'rb') as f:
+        header = f.read(8192)
+
+    if header.startswith(b'%PDF-'):
+        return 'pdf'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'doc'  # OLE2 compound document (legacy Word)
+    if header.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                if 'word/document.xml' in archive.namelist():
+                    return 'docx'
+        except zipfile.BadZipFile:
+            return None
+        return None
+    if b'\x00' not in header:
+        try:
+            header.decode('utf-8')
+            return 'txt'
+        except UnicodeDecodeError as e:
+            # A multi-byte character may be cut off at the end of the sniffed block
+            if e.start >= len(header) - 3:
+                return 'txt'
+    return None
+
+
+def extension_matches(extension, detected_type):
+    """Whether the detected content type is acceptable for the file's extension"""
+    return detected_type in EXTENSION_TYPES.get((extension or '').lower(), set())
+
+
+def extract_text(path, detected_type):
+    """Return (text, page_count) for text-bearing formats, (None, None) otherwise"""
+    if detected_type == 'pdf':
+        reader = PdfReader(path)
+        parts = []
+        length = 0
+        for page in reader.pages:
+            text = page.extract_text() or ''
+            parts.append(text)
+            length += len(text)
+            if length >= MAX_EXTRACTED_CHARS:
+                break
+        return '\n'.join(parts)[:MAX_EXTRACTED_CHARS], len(reader.pages)
+
+    if detected_type == 'docx':
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read('word/document.xml'))
+        paragraphs = [
+            ''.join(node.text or '' for node in paragraph.iter(f'{WORD_NAMESPACE}t'))
+            for paragraph in root.iter(f'{WORD_NAMESPACE}p')
+        ]
+        return '\n'.join(paragraphs)[:MAX_EXTRACTED_CHARS], None
+
+    if detected_type == 'txt':
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read(MAX_EXTRACTED_CHARS), None
+
+    return None, None
+
+
+def _first_pdf_image(path):
+    """Scanned evidence PDFs embed each page as an image; use the first one"""
+    reader = PdfReader(path)
+    if not reader.pages:
+        return None
+    for image in reader.pages[0].images:
+        return Image.open(io.BytesIO(image.data))
+    return None
+
+
+def make_thumbnail(path, detected_type, thumbnail_path):
+    """Write a JPEG thumbnail for images and scanned PDFs; returns the path or None"""
+    if detected_type in ('png', 'jpeg'):
+        image = Image.open(path)
+    elif detected_type == 'pdf':
+        image = _first_pdf_image(path)
+    else:
+        image = None
+
+    if image is None:
+        return None
+
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    image.save(thumbnail_path, 'JPEG', quality=80, optimize=True)
+    return thumbnail_path
+
+
+def process_document_file(path, original_filename, thumbnail_path, image_options=None, original_sha256=None):
+    """
+    Validate, extract text from and thumbnail one uploaded file
+
+    image_options, when given, is a dict of optimize_image() keyword arguments
+    and enables the image storage optimization stage. original_sha256 is the
+    hash recorded at upload; the file is only hashed here when there is none.
+    Returns a dict of Document column values to store.
+    """
+    extension = original_filename.rsplit('.', 1)[1] if '.' in original_filename else ''
+    original_sha256 = original_sha256 or sha256_file(path)
+    detected_type = detect_file_type(path)
+
+    if not extension_matches(extension, detected_type):
+        return {
+            'processing_status': 'rejected',
+            'detected_type': detected_type,
+            'original_sha256': original_sha256,
+            'processing_error': f'File content ({detected_type or "unknown"}) does not match .{extension} extension'
+        }
+
+    try:
+        text, page_count = extract_text(path, detected_type)
+    except (PdfReadError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        return {
+            'processing_status': 'rejected',
+            'detected_type': detected_type,
+            'original_sha256': original_sha256,
+            'processing_error': f'Could not read {detected_type} file: {e}'
+        }
+
+    try:
+        thumbnail = make_thumbnail(path, detected_type, thumbnail_path)
+    except (OSError, PdfReadError):
+        thumbnail = None  # a missing preview should not fail the document
+
+    sizes = {}
+    if image_options is not None and detected_type in ('png', 'jpeg'):
+        size_before, size_after = optimize_image(path, detected_type, **image_options)
+        sizes = {'original_file_size': size_before, 'file_size': size_after, 'optimized_at': datetime.utcnow()}
+
+    return {
+        **sizes,
+        'processing_status': 'processed',
+        'detected_type': detected_type,
+        'original_sha256': original_sha256,
+        'extracted_text': re.sub(r'[ \t]+', ' ', text).strip() if text else None,
+        'page_count': page_count,
+        'thumbnail_path': thumbnail,
+        'processing_error': None
+    }
@@ -0,0 +1,142 @@
+"""
+Incremental autosave of draft complaints
+
+The complaint form creates a draft on its first autosave and then sends
+only what changed: the fields edited since the last save, and the
+narrative as text edits against the last saved version. Each autosave is
+one UPDATE that splices the edits in SQL, so a long narrative is never
+re-sent or re-read. Every save bumps Complaint.version; a save based on an
+older version (another tab saved in between) is rejected with
+DraftConflict instead of overwriting.
+"""
+from datetime import datetime
+from sqlalchemy import Text, func, literal, update
+
+from models import db, Complaint
+
+
+# Fields autosave may write, with their parsers
+DRAFT_FIELDS = {
+    'title': lambda value: (value or '').strip()[:200] or 'Untitled draft',
+    'jurisdiction_type': lambda value: value or None,
+    'state': lambda value: value or None,
+    'respondent_name': lambda value: value,
+    'respondent_license_number': lambda value: value,
+    'respondent_brokerage': lambda value: value,
+    'respondent_is_realtor': lambda value: value in (True, 'yes'),
+    'incident_date': lambda value: datetime.strptime(value, '%Y-%m-%d').date() if value else None,
+    'incident_location': lambda value: value,
+    'transaction_type': lambda value: value or None,
+    'complaint_narrative': lambda value: value,
+}
+
+MAX_EDITS = 50
+
+
+class DraftConflict(Exception):
+    """The draft was saved from elsewhere since the version the client edited"""
+
+    def __init__(self, version):
+        super().__init__(f'Draft is now at version {version}')
+        self.version = version
+
+
+def parse_draft_fields(data):
+    """Column values from a {field: value} dict; raises ValueError for unknown fields or bad values"""
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError('fields must be an object')
+    values = {}
+    for field, value in data.items():
+        if field not in DRAFT_FIELDS:
+            raise ValueError(f'Unknown field: {field}')
+        if value is not None and not isinstance(value, (str, bool)):
+            raise ValueError(f'{field} must be a string')
+        values[field] = DRAFT_FIELDS[field](value)
+    return values
+
+
+def narrative_splice(edits, base_length):
+    """
+    SQL expression applying text edits to the stored narrative
+
+    edits are {'at': int, 'delete': int, 'insert': str} against the saved
+    text (positions in characters), non-overlapping. The expression
+    concatenates the kept slices of the old text with the inserts, so its
+    size grows linearly with the number of edits.
+    """
+    if not isinstance(edits, list) or not 0 < len(edits) <= MAX_EDITS:
+        raise ValueError(f'edits must be a list of 1 to {MAX_EDITS} edits')
+    parsed = []
+    for edit in edits:
+        try:
+            at, delete, insert = int(edit['at']), int(edit.get('delete', 0)), edit.get('insert', '')
+        except (TypeError, KeyError, ValueError):
+            raise ValueError('Each edit needs an integer at, and optional delete count and insert text')
+        if at < 0 or delete < 0 or not isinstance(insert, str):
+            raise ValueError('Edit positions and delete counts must not be negative')
+        parsed.append((at, delete, insert))
+    parsed.sort(key=lambda edit: edit[0])
+
+    base = func.coalesce(Complaint.complaint_narrative, '')
+    pieces = []
+    position = 0
+    for at, delete, insert in parsed:
+        if at < position or at + delete > base_length:
+            raise ValueError('Edits overlap or run past the end of the narrative')
+        if at > position:
+            pieces.append(func.substr(base, position + 1, at - position, type_=Text))
+        if insert:
+            pieces.append(literal(insert, Text))
+        position = at + delete
+    if position < base_length:
+        pieces.append(func.substr(base, position + 1, type_=Text))
+
+    if not pieces:
+        return literal('', Text)
+    expression = pieces[0]
+    for piece in pieces[1:]:
+        expression = expression + piece
+    return expression
+
+
+def autosave_draft(complaint_id, user_id, version, fields=None, edits=None, narrative_length=None):
+    """
+    Apply changed fields and narrative edits to a draft in one UPDATE
+
+    version is the version the client's changes are based on. Narrative
+    edits need narrative_length, the length of the text they were computed
+    against, which the UPDATE also checks. Returns the new version. Raises
+    LookupError if the draft does not exist (or is not the user's or no
+    longer a draft), DraftConflict if it was saved since version, and
+    ValueError for a malformed patch. The caller commits.
+    """
+    values = parse_draft_fields(fields)
+    conditions = [
+        Complaint.id == complaint_id,
+        Complaint.user_id == user_id,
+        Complaint.status == 'draft',
+        func.coalesce(Complaint.version, 1) == version,
+    ]
+    if edits:
+        if 'complaint_narrative' in values:
+            raise ValueError('Send either narrative edits or the whole complaint_narrative, not both')
+        if not isinstance(narrative_length, int):
+            raise ValueError('narrative_length is required with edits')
+        values['complaint_narrative'] = narrative_splice(edits, narrative_length)
+        conditions.append(func.length(func.coalesce(Complaint.complaint_narrative, '')) == narrative_length)
+
+    values['version'] = version + 1
+    result = db.session.execute(
+        update(Complaint).where(*conditions).values(**values).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        return version + 1
+
+    current = db.session.query(Complaint.status, Complaint.version) \
+        .filter(Complaint.id == complaint_id, Complaint.user_id == user_id).first()
+    if current is None or current.status != 'draft':
+        raise LookupError(f'No draft complaint {complaint_id}')
+    # Same version but a different length means the client's copy of the text is out of step
+    raise DraftConflict(current.version or 1)
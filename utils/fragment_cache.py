@@ -0,0 +1,170 @@
+"""
+Jinja fragment caching backed by an in-process, byte-limited LRU
+
+Templates wrap expensive blocks in
+
+    {% cache 'complaint', complaint.id, 'row', complaint.updated_at, today %}
+        ...
+    {% endcache %}
+
+The key is every value after the tag; the first two name the entity the
+fragment belongs to. Keys carry a version (updated_at, or
+REFERENCE_DATA_VERSION for the static state and NAR data), so edits made
+by any process produce a new key and the old fragment ages out of the
+LRU. On top of that, committing ORM changes to a complaint or its child
+rows drops that complaint's fragments in this process, for writes that do
+not move updated_at.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import event
+
+from models import Complaint
+from utils.db_routing import current_tenant_id
+from utils.metrics import registry
+from utils.nar_code_articles import NAR_CODE_ARTICLES
+from utils.state_forms import NAR_REQUIREMENTS, STATE_REQUIREMENTS
+
+
+# Changes whenever the bundled reference data does, so fragments built from it re-render
+REFERENCE_DATA_VERSION = hashlib.sha1(
+    json.dumps([STATE_REQUIREMENTS, NAR_REQUIREMENTS, NAR_CODE_ARTICLES], sort_keys=True, default=str).encode()
+).hexdigest()[:12]
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, bounded by total UTF-8 size"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entry_bytes=256 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (markup, size)
+        self._by_entity = {}  # key[:2] -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, markup):
+        size = len(markup.encode('utf-8'))
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (markup, size)
+            self._by_entity.setdefault(key[:2], set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        keys = self._by_entity.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_entity[key[:2]]
+
+    def invalidate(self, namespace, entity_id):
+        """Drop every fragment whose key starts with (namespace, entity_id)"""
+        with self._lock:
+            for key in list(self._by_entity.get((namespace, entity_id), ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_entity.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _hashable(value):
+    if isinstance(value, (list, set, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache key, ... %}...{% endcache %}; caching is skipped when no cache is configured"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(key_parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        # Tenants with their own database reuse complaint ids, so the tenant is part of every key
+        key = _hashable(key_parts) + (current_tenant_id(),)
+        markup = cache.get(key)
+        if markup is not None:
+            registry.inc('fragment_cache_total', labels=(('result', 'hit'),))
+            return markup
+        registry.inc('fragment_cache_total', labels=(('result', 'miss'),))
+        markup = caller()
+        cache.set(key, markup)
+        return markup
+
+
+def _complaint_ids(objects):
+    ids = set()
+    for obj in objects:
+        if isinstance(obj, Complaint):
+            ids.add(obj.id)
+        elif getattr(obj, 'complaint_id', None) is not None:
+            ids.add(obj.complaint_id)
+    return ids
+
+
+def init_fragment_cache(app, session):
+    """
+    Enable {% cache %} in app's templates and drop a complaint's fragments
+    when session commits changes to it (changes rolled back are dropped too,
+    which is harmless)
+    """
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['reference_data_version'] = REFERENCE_DATA_VERSION
+    if not app.config.get('FRAGMENT_CACHE_ENABLED', True):
+        return
+    cache = FragmentCache(app.config['FRAGMENT_CACHE_MAX_BYTES'], app.config['FRAGMENT_CACHE_MAX_ENTRY_BYTES'])
+    app.jinja_env.fragment_cache = cache
+    app.extensions['fragment_cache'] = cache
+
+    @event.listens_for(session, 'after_flush')
+    def _collect_changed_complaints(session, flush_context):
+        changed = _complaint_ids(session.new) | _complaint_ids(session.dirty) | _complaint_ids(session.deleted)
+        if changed:
+            session.info.setdefault('fragment_cache_changed', set()).update(changed)
+
+    @event.listens_for(session, 'after_commit')
+    def _invalidate_changed_complaints(session):
+        for complaint_id in session.info.pop('fragment_cache_changed', ()):
+            cache.invalidate('complaint', complaint_id)
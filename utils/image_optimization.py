@@ -0,0 +1,142 @@
+"""
+Storage optimization for uploaded image evidence
+
+Phone photos of checks and contracts arrive as multi-megabyte JPG/PNG files
+with EXIF metadata. This pass strips metadata, downsamples images beyond a
+target DPI for a letter-size page and recompresses them, keeping the result
+only when it is actually smaller.
+"""
+import hashlib
+import os
+from datetime import datetime
+
+from PIL import Image, ImageOps
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+EXIF_ORIENTATION_TAG = 0x0112
+# APPn segments kept when stripping a JPEG: JFIF (APP0) and Adobe (APP14, which says how to decode the colours)
+JPEG_KEPT_APP_MARKERS = {0xE0, 0xEE}
+JPEG_COMMENT_MARKER = 0xFE
+JPEG_START_OF_SCAN = 0xDA
+
+
+def sha256_file(path):
+    """Hex SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def max_long_edge(target_dpi, page_long_edge_inches):
+    """Largest pixel dimension worth keeping for a scanned page at target_dpi"""
+    return int(target_dpi * page_long_edge_inches)
+
+
+def strip_jpeg_metadata(source, destination):
+    """
+    Copy a JPEG without its EXIF, XMP, ICC, IPTC and comment segments
+
+    Only header segments are dropped; the compressed image data is copied
+    byte for byte, so no pixel changes. Raises ValueError for a malformed
+    header.
+    """
+    with open(source, 'rb') as f:
+        data = f.read()
+    if data[:2] != b'\xff\xd8':
+        raise ValueError('Not a JPEG file')
+
+    kept = [data[:2]]
+    position = 2
+    while True:
+        if position + 4 > len(data) or data[position] != 0xFF:
+            raise ValueError('Malformed JPEG header')
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1  # fill byte before a marker
+            continue
+        if marker == JPEG_START_OF_SCAN:
+            kept.append(data[position:])  # entropy-coded data through EOI, untouched
+            break
+        end = position + 2 + int.from_bytes(data[position + 2:position + 4], 'big')
+        metadata = (0xE0 <= marker <= 0xEF and marker not in JPEG_KEPT_APP_MARKERS) or marker == JPEG_COMMENT_MARKER
+        if not metadata:
+            kept.append(data[position:end])
+        position = end
+
+    with open(destination, 'wb') as f:
+        for segment in kept:
+            f.write(segment)
+
+
+def optimize_image(path, detected_type, target_dpi=200, page_long_edge_inches=11.0, dry_run=False):
+    """
+    Strip metadata, downsample and recompress an image in place
+
+    PNGs are re-encoded losslessly. JPEGs that need neither rotating nor
+    resizing are not re-encoded at all: only their metadata segments are
+    dropped (strip_jpeg_metadata), so the image data stays exactly as
+    uploaded. Rotated or resized JPEGs are re-encoded at quality 85. The file
+    is replaced atomically and only if the result is smaller. With dry_run
+    the original is never touched.
+
+    Returns (size_before, size_after).
+    """
+    size_before = os.path.getsize(path)
+    image = Image.open(path)
+    image.load()
+
+    # Bake EXIF orientation into the pixels before the EXIF block is dropped
+    rotated = image.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1
+    working = ImageOps.exif_transpose(image) if rotated else image
+    limit = max_long_edge(target_dpi, page_long_edge_inches)
+    resized = max(working.size) > limit
+    if resized:
+        working = working.copy() if working is image else working
+        working.thumbnail((limit, limit), Image.LANCZOS)
+
+    # Pillow only writes EXIF/ICC blocks when passed explicitly, so saves below drop them
+    temp_path = f'{path}.optimizing'
+    if detected_type == 'png':
+        working.save(temp_path, 'PNG', optimize=True)
+    elif working is image:
+        try:
+            strip_jpeg_metadata(path, temp_path)
+        except ValueError:
+            return size_before, size_before  # Pillow could read it, but leave an odd header alone
+    else:
+        if working.mode not in ('RGB', 'L'):
+            working = working.convert('RGB')
+        working.save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+
+    size_after = os.path.getsize(temp_path)
+    if size_after < size_before and not dry_run:
+        os.replace(temp_path, path)
+        return size_before, size_after
+
+    os.remove(temp_path)
+    return size_before, min(size_before, size_after) if dry_run else size_before
+
+
+def optimize_stored_file(path, detected_type, original_sha256, options, dry_run=False):
+    """
+    Pool worker for the backfill pass over existing uploads
+
+    Hashes the file first if it has no recorded original hash, so the hash
+    always describes the bytes as uploaded. Returns Document column values.
+    """
+    if not os.path.exists(path):
+        return {'missing': True}
+
+    result = {}
+    if original_sha256 is None:
+        result['original_sha256'] = sha256_file(path)
+    size_before, size_after = optimize_image(path, detected_type, dry_run=dry_run, **options)
+    result.update({
+        'original_file_size': size_before,
+        'file_size': size_after,
+        'optimized_at': datetime.utcnow()
+    })
+    return result
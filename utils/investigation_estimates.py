@@ -0,0 +1,225 @@
+"""
+Investigation duration estimates learned from closed complaints
+
+Every complaint that closes after being submitted adds its duration to a
+weekly histogram keyed by (state, jurisdiction type) in
+investigation_duration_buckets, one per database: tenants that share the
+primary share its estimates. Each process loads the histograms (at most
+a few thousand rows however many complaints exist), turns them into
+percentiles per scope and caches the result for
+INVESTIGATION_ESTIMATE_CACHE_SECONDS, so an estimate is a dict lookup.
+
+Estimates use the narrowest scope with INVESTIGATION_ESTIMATE_MIN_SAMPLES
+closed complaints: state and jurisdiction type, then state, then
+jurisdiction type, then all complaints, then the fixed timelines in
+FALLBACK_DAYS.
+"""
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, timedelta
+from flask import current_app, g
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Complaint, ComplaintArchive, InvestigationDurationBucket
+from utils.db_routing import tenant_bind
+
+
+DURATION_BUCKET_DAYS = 7
+MAX_BUCKET = 156  # three years; longer investigations count in the last bucket
+
+# Days to completion before a scope has enough closed complaints (Colorado aims for 240)
+FALLBACK_DAYS = {'CO': 240}
+DEFAULT_FALLBACK_DAYS = 180
+
+# Percentiles reported as (earliest, expected, latest)
+ESTIMATE_PERCENTILES = (0.2, 0.5, 0.8)
+
+_model_lock = threading.Lock()
+_model_states = {}  # tenant database bind (None for the primary) -> {'loaded_at', 'estimates'}
+
+
+def duration_bucket(days):
+    return min(max(days, 0) // DURATION_BUCKET_DAYS, MAX_BUCKET)
+
+
+def _bucket_key(state, jurisdiction_type, days):
+    return (state or '', jurisdiction_type or '', duration_bucket(days))
+
+
+def _add_counts(counts):
+    """Add {(state, jurisdiction_type, bucket): n} to the histogram; the caller commits"""
+    table = InvestigationDurationBucket
+    for (state, jurisdiction_type, bucket), n in counts.items():
+        match = (table.state == state, table.jurisdiction_type == jurisdiction_type, table.bucket == bucket)
+        result = db.session.execute(update(table).where(*match).values(count=table.count + n))
+        if result.rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(state=state, jurisdiction_type=jurisdiction_type,
+                                                        bucket=bucket, count=n))
+        except IntegrityError:
+            # Another process created the bucket first
+            db.session.execute(update(table).where(*match).values(count=table.count + n))
+
+
+def record_closures(rows, closed_on=None):
+    """
+    Count closing complaints into the duration histogram
+
+    rows are (state, jurisdiction_type, submitted_date); complaints that were
+    never submitted are ignored. The caller commits.
+    """
+    closed_on = closed_on or date.today()
+    counts = Counter(
+        _bucket_key(state, jurisdiction_type, (closed_on - submitted_date).days)
+        for state, jurisdiction_type, submitted_date in rows if submitted_date
+    )
+    if counts:
+        _add_counts(counts)
+        invalidate_estimates()
+
+
+def _historical_durations(batch_size=1000):
+    """(state, jurisdiction_type, days) for every submitted complaint that has closed, including archived ones"""
+    closed_on = func.coalesce(Complaint.closed_at, Complaint.updated_at)
+    query = db.session.query(Complaint.state, Complaint.jurisdiction_type, Complaint.submitted_date, closed_on) \
+        .filter(Complaint.status == 'closed', Complaint.submitted_date.isnot(None)) \
+        .execution_options(yield_per=batch_size)
+    for state, jurisdiction_type, submitted_date, closed_at in query:
+        yield state, jurisdiction_type, (closed_at.date() - submitted_date).days
+
+    for payload, in db.session.query(ComplaintArchive.payload).execution_options(yield_per=100):
+        complaint = json.loads(zlib.decompress(payload))['complaint']
+        if complaint.get('submitted_date'):
+            closed_at = complaint.get('closed_at') or complaint['updated_at']
+            days = (date.fromisoformat(closed_at[:10]) - date.fromisoformat(complaint['submitted_date'])).days
+            yield complaint.get('state'), complaint.get('jurisdiction_type'), days
+
+
+def rebuild_duration_stats():
+    """
+    Recount the histogram from all closed complaints; returns the number counted
+
+    The histogram covers a whole database, so tenants sharing the primary
+    are rebuilt together outside any tenant; raises ValueError inside one.
+    """
+    if g.get('tenant_id') is not None and tenant_bind() is None:
+        raise ValueError(f'Tenant {g.tenant_slug!r} shares the primary database, whose duration stats '
+                         'cover every tenant in it; rebuild them without --tenant')
+    counts = Counter(_bucket_key(*row) for row in _historical_durations())
+    db.session.execute(delete(InvestigationDurationBucket))
+    if counts:
+        db.session.execute(insert(InvestigationDurationBucket), [
+            {'state': state, 'jurisdiction_type': jurisdiction_type, 'bucket': bucket, 'count': n}
+            for (state, jurisdiction_type, bucket), n in counts.items()
+        ])
+    db.session.commit()
+    invalidate_estimates()
+    return sum(counts.values())
+
+
+def _percentile_days(histogram, total, q):
+    """Days at quantile q of a bucket histogram, interpolating within the bucket"""
+    target = q * total
+    seen = 0
+    for bucket, n in enumerate(histogram):
+        if n and seen + n >= target:
+            return round((bucket + (target - seen) / n) * DURATION_BUCKET_DAYS)
+        seen += n
+    return MAX_BUCKET * DURATION_BUCKET_DAYS
+
+
+def build_estimates(rows, min_samples):
+    """
+    Percentile durations per scope from histogram rows
+
+    rows are (state, jurisdiction_type, bucket, count). Returns
+    {(state or None, jurisdiction_type or None): (earliest, expected, latest, samples)}
+    in days, for scopes with at least min_samples complaints.
+    """
+    histograms = {}
+    for state, jurisdiction_type, bucket, count in rows:
+        state, jurisdiction_type = state or None, jurisdiction_type or None
+        for scope in ((state, jurisdiction_type), (state, None), (None, jurisdiction_type), (None, None)):
+            histogram = histograms.setdefault(scope, [0] * (MAX_BUCKET + 1))
+            histogram[bucket] += count
+
+    estimates = {}
+    for scope, histogram in histograms.items():
+        total = sum(histogram)
+        if total >= min_samples:
+            estimates[scope] = tuple(_percentile_days(histogram, total, q) for q in ESTIMATE_PERCENTILES) + (total,)
+    return estimates
+
+
+def invalidate_estimates():
+    """Reload the histograms on the next estimate in this process"""
+    _model_states.pop(tenant_bind(), None)
+
+
+def _current_estimates():
+    model_state = _model_states.setdefault(tenant_bind(), {'loaded_at': None, 'estimates': {}})
+    loaded_at = model_state['loaded_at']
+    if loaded_at is not None and time.monotonic() - loaded_at < current_app.config['INVESTIGATION_ESTIMATE_CACHE_SECONDS']:
+        return model_state['estimates']
+    with _model_lock:
+        if model_state['loaded_at'] is None or model_state['loaded_at'] == loaded_at:
+            table = InvestigationDurationBucket
+            rows = db.session.query(table.state, table.jurisdiction_type, table.bucket, table.count).all()
+            model_state['estimates'] = build_estimates(rows, current_app.config['INVESTIGATION_ESTIMATE_MIN_SAMPLES'])
+            model_state['loaded_at'] = time.monotonic()
+    return model_state['estimates']
+
+
+def estimate_duration(state=None, jurisdiction_type=None):
+    """(earliest, expected, latest, samples) in days for a complaint; samples is 0 for the fixed fallback"""
+    estimates = _current_estimates()
+    state = state.upper() if state else None
+    for scope in ((state, jurisdiction_type), (state, None), (None, jurisdiction_type), (None, None)):
+        if scope in estimates:
+            return estimates[scope]
+    days = FALLBACK_DAYS.get(state, DEFAULT_FALLBACK_DAYS)
+    return days, days, days, 0
+
+
+def estimate_completion_window(submission_date, state=None, jurisdiction_type=None):
+    """Dict of earliest, expected and latest completion dates plus the number of complaints behind them"""
+    earliest, expected, latest, samples = estimate_duration(state, jurisdiction_type)
+    return {
+        'earliest': submission_date + timedelta(days=earliest),
+        'expected': submission_date + timedelta(days=expected),
+        'latest': submission_date + timedelta(days=latest),
+        'samples': samples
+    }
+
+
+def refresh_open_estimates(batch_size=1000):
+    """Re-estimate submitted and under-review complaints from the current histograms; returns the number updated"""
+    invalidate_estimates()
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Complaint.id, Complaint.state, Complaint.jurisdiction_type, Complaint.submitted_date) \
+            .filter(Complaint.status.in_(('submitted', 'under_review')), Complaint.submitted_date.isnot(None),
+                    Complaint.id > last_id) \
+            .order_by(Complaint.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+        changes = []
+        for row in rows:
+            window = estimate_completion_window(row.submitted_date, row.state, row.jurisdiction_type)
+            changes.append({
+                'id': row.id,
+                'investigation_completion_earliest': window['earliest'],
+                'investigation_expected_completion': window['expected'],
+                'investigation_completion_latest': window['latest']
+            })
+        db.session.execute(update(Complaint), changes)
+        db.session.commit()
+        updated += len(changes)
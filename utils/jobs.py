@@ -0,0 +1,155 @@
+"""
+Durable background job queue backed by the jobs table
+
+Jobs are enqueued in the same transaction as the request that creates them.
+A worker process claims batches from the table, runs the CPU-heavy part of
+each job in a process pool and writes results back from the parent, so pool
+processes never touch the database.
+"""
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+# job_type -> (prepare, work, apply, on_failure)
+#   prepare(payload) -> args tuple for work, or None to finish without work (runs in the worker)
+#   work(*args) -> picklable result (runs in the process pool)
+#   apply(payload, result) -> None, persists the result (runs in the worker)
+#   on_failure(payload, error) -> None, optional, called once retries are exhausted
+JOB_HANDLERS = {}
+
+RETRY_BASE_SECONDS = 30
+
+
+def register_job_type(job_type, prepare, work, apply, on_failure=None):
+    """Register the handlers for a job type"""
+    JOB_HANDLERS[job_type] = (prepare, work, apply, on_failure)
+
+
+def enqueue_job(job_type, payload, delay_seconds=0):
+    """Add a job to the current session; it becomes visible when the caller commits"""
+    job = Job(
+        job_type=job_type,
+        payload=json.dumps(payload),
+        available_at=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.session.add(job)
+    return job
+
+
+def release_stale_jobs(lease_seconds):
+    """Return jobs whose worker died mid-run to the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    released = Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).update(
+        {Job.status: 'pending', Job.locked_by: None, Job.locked_at: None},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return released
+
+
+def claim_jobs(worker_id, limit, job_types=None):
+    """Atomically claim up to `limit` due jobs for this worker"""
+    now = datetime.utcnow()
+    candidates = db.session.query(Job.id).filter(Job.status == 'pending', Job.available_at <= now)
+    if job_types:
+        candidates = candidates.filter(Job.job_type.in_(job_types))
+    candidates = candidates.order_by(Job.available_at, Job.id).limit(limit)
+
+    # The status guard makes the UPDATE a compare-and-set, so concurrent workers never share a job
+    Job.query.filter(Job.id.in_(candidates.scalar_subquery()), Job.status == 'pending').update(
+        {Job.status: 'running', Job.locked_by: worker_id, Job.locked_at: now,
+         Job.attempts: Job.attempts + 1},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return Job.query.filter_by(status='running', locked_by=worker_id).order_by(Job.id).all()
+
+
+def _finish(job):
+    job.status = 'done'
+    job.finished_at = datetime.utcnow()
+    job.locked_by = None
+    job.last_error = None
+
+
+def _fail(job, error):
+    db.session.rollback()
+    job = db.session.get(Job, job.id)
+    job.last_error = error
+    job.locked_by = None
+    if job.attempts >= job.max_attempts:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        on_failure = JOB_HANDLERS.get(job.job_type, (None,) * 4)[3]
+        if on_failure:
+            on_failure(json.loads(job.payload or '{}'), error)
+    else:
+        job.status = 'pending'
+        job.available_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+    db.session.commit()
+    logger.warning('Job %s (%s) failed on attempt %s: %s', job.id, job.job_type, job.attempts, error)
+
+
+def run_jobs_once(executor, worker_id, batch_size, job_types=None):
+    """Claim and process one batch; returns the number of jobs claimed"""
+    jobs = claim_jobs(worker_id, batch_size, job_types)
+    futures = {}
+
+    for job in jobs:
+        handlers = JOB_HANDLERS.get(job.job_type)
+        if handlers is None:
+            _fail(job, f'No handler registered for job type {job.job_type}')
+            continue
+        prepare, work, apply, _ = handlers
+        payload = json.loads(job.payload or '{}')
+        try:
+            args = prepare(payload)
+            if args is None:
+                _finish(job)
+                db.session.commit()
+                continue
+            futures[executor.submit(work, *args)] = (job.id, payload, apply)
+        except Exception as e:
+            _fail(job, repr(e))
+
+    for future in as_completed(futures):
+        job_id, payload, apply = futures[future]
+        job = db.session.get(Job, job_id)
+        try:
+            apply(payload, future.result())
+            _finish(job)
+            db.session.commit()
+        except Exception as e:
+            _fail(job, repr(e))
+
+    return len(jobs)
+
+
+def run_worker(processes=None, batch_size=20, poll_interval=2.0, lease_seconds=600,
+               once=False, job_types=None):
+    """Process jobs until interrupted (or until the queue is drained when once=True)"""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+    processed = 0
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        last_release = 0.0
+        while True:
+            if time.monotonic() - last_release > lease_seconds / 4:
+                release_stale_jobs(lease_seconds)
+                last_release = time.monotonic()
+
+            claimed = run_jobs_once(executor, worker_id, batch_size, job_types)
+            processed += claimed
+            if claimed == 0:
+                if once:
+                    return processed
+                time.sleep(poll_interval)
@@ -0,0 +1,128 @@
+"""
+Jurisdiction screening decision table
+
+DECISION_RULES lists the screening rules in priority order; the first rule
+whose conditions all match decides where a complaint should be filed. At
+import the rules are compiled into a dict holding the outcome for every
+combination of (is_realtor, violation_type, state, has_contract,
+seeks_damages), so screening a record is one normalization and one dict
+lookup.
+"""
+from itertools import product
+
+from utils.state_forms import STATE_REQUIREMENTS
+
+
+VIOLATION_TYPES = ('ethics_violation', 'license_violation', 'contract_dispute')
+
+# (conditions, outcome) in priority order; a rule with no conditions always matches
+DECISION_RULES = (
+    ({'seeks_damages': True}, 'civil_court'),
+    ({'violation_type': 'contract_dispute'}, 'civil_court'),
+    ({'is_realtor': True, 'violation_type': 'ethics_violation'}, 'nar_association'),
+    ({}, 'state_board'),
+)
+
+CIVIL_COURT = {
+    'type': 'civil_court',
+    'agency': 'Civil Court / Attorney',
+    'message': 'This appears to be a contract dispute. You may need to consult an attorney or file in civil court.'
+}
+
+NAR_ASSOCIATION = {
+    'type': 'nar_association',
+    'agency': 'Local REALTOR® Association',
+    'message': 'This is an ethics complaint against a NAR member. File with your local REALTOR® association.'
+}
+
+
+def _state_board(state):
+    """Outcome for a license law complaint in state (None if not one we have requirements for)"""
+    requirements = STATE_REQUIREMENTS.get(state)
+    if requirements is None:
+        return {
+            'type': 'state_board',
+            'agency': 'State Real Estate Commission',
+            'message': "This is a license law complaint. File with your state's real estate licensing board."
+        }
+    return {
+        'type': 'state_board',
+        'agency': requirements['agency'],
+        'message': 'This is a license law complaint. File with your state licensing board.',
+        'state': state,
+        'form_name': requirements.get('form_name'),
+        'website': requirements.get('website'),
+        'filing_deadline_days': requirements.get('filing_deadline_days')
+    }
+
+
+def _outcome(name, state):
+    if name == 'civil_court':
+        return CIVIL_COURT
+    if name == 'nar_association':
+        return NAR_ASSOCIATION
+    return _state_board(state)
+
+
+def compile_decision_table():
+    """Map every normalized screening key to its outcome by evaluating DECISION_RULES once"""
+    state_boards = {state: _outcome('state_board', state) for state in (*STATE_REQUIREMENTS, None)}
+    table = {}
+    for key in product((False, True), (*VIOLATION_TYPES, None), (*STATE_REQUIREMENTS, None), (False, True), (False, True)):
+        answers = dict(zip(('is_realtor', 'violation_type', 'state', 'has_contract', 'seeks_damages'), key))
+        for conditions, name in DECISION_RULES:
+            if all(answers[field] == value for field, value in conditions.items()):
+                break
+        table[key] = state_boards[answers['state']] if name == 'state_board' else _outcome(name, None)
+    return table
+
+
+_DECISIONS = compile_decision_table()
+_VIOLATION_TYPES = frozenset(VIOLATION_TYPES)
+
+
+def _flag(value):
+    """Screening answer as a bool; accepts booleans and the form's 'yes'/'no'"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('yes', 'true', 'on', '1')
+    return bool(value)
+
+
+def screening_key(screening):
+    """Normalized decision-table key for a screening dict; unknown states and violation types become None"""
+    violation_type = screening.get('violation_type')
+    state = screening.get('state')
+    state = state.strip().upper() if isinstance(state, str) else None
+    return (
+        _flag(screening.get('is_realtor')),
+        violation_type if isinstance(violation_type, str) and violation_type in _VIOLATION_TYPES else None,
+        state if state in STATE_REQUIREMENTS else None,
+        _flag(screening.get('has_contract')),
+        _flag(screening.get('seeks_damages'))
+    )
+
+
+def determine_jurisdiction(screening):
+    """
+    Where a complaint with these screening answers should be filed
+
+    Returns a dict with type, agency and message (plus the state board's
+    details when the state is known). The dict is shared between calls;
+    copy it before modifying.
+    """
+    return _DECISIONS[screening_key(screening)]
+
+
+def screen_batch(records):
+    """Outcomes for a list of screening dicts, echoing each record's 'id' when given"""
+    decisions = _DECISIONS
+    results = []
+    for record in records:
+        if not isinstance(record, dict):
+            results.append({'error': 'Each record must be an object'})
+            continue
+        outcome = decisions[screening_key(record)]
+        if 'id' in record:
+            outcome = {'id': record['id'], **outcome}
+        results.append(outcome)
+    return results
@@ -0,0 +1,169 @@
+"""
+Synthetic load generator for a running Grievance Filing Service instance
+
+Each virtual user registers, logs in and walks the screening -> new complaint
+-> upload -> detail flow over real HTTP, using only the standard library.
+"""
+import http.cookiejar
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from utils.synthetic_data import NARRATIVE_SENTENCES
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface 302s so the flow can read Location headers itself"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class LoadTestSession:
+    """One virtual user with its own cookie jar"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect()
+        )
+
+    def request(self, method, path, data=None, files=None):
+        """Send a request; returns (status, location header, body)"""
+        headers = {}
+        body = None
+        if files:
+            body, content_type = _encode_multipart(data or {}, files)
+            headers['Content-Type'] = content_type
+        elif data is not None:
+            body = urllib.parse.urlencode(data, doseq=True).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.headers.get('Location'), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location'), e.read()
+
+
+def _encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class LoadTestStats:
+    """Thread-safe per-step latency and error tracking"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, step, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(step, []).append(seconds)
+            if not ok:
+                self.errors[step] = self.errors.get(step, 0) + 1
+
+    def report(self, elapsed):
+        total_requests = sum(len(values) for values in self.latencies.values())
+        total_errors = sum(self.errors.values())
+        steps = {}
+        for step, values in self.latencies.items():
+            values = sorted(values)
+            steps[step] = {
+                'requests': len(values),
+                'errors': self.errors.get(step, 0),
+                'error_rate': self.errors.get(step, 0) / len(values),
+                'p50_ms': values[len(values) // 2] * 1000,
+                'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+                'mean_ms': statistics.mean(values) * 1000,
+            }
+        return {
+            'elapsed_seconds': elapsed,
+            'requests': total_requests,
+            'errors': total_errors,
+            'error_rate': total_errors / total_requests if total_requests else 0.0,
+            'throughput_per_sec': total_requests / elapsed if elapsed else 0.0,
+            'steps': steps,
+        }
+
+
+def _step(stats, name, expected, func):
+    started = time.perf_counter()
+    try:
+        status, location, _ = func()
+        ok = status in expected
+    except Exception:
+        status, location, ok = None, None, False
+    stats.record(name, time.perf_counter() - started, ok)
+    return ok, location
+
+
+def run_session(base_url, stats, timeout, upload_bytes, state='FL'):
+    """Drive one user through the full filing flow"""
+    session = LoadTestSession(base_url, timeout)
+    email = f'load-{uuid.uuid4().hex[:12]}@loadtest.example.com'
+    password = 'load-test-password'
+
+    ok, _ = _step(stats, 'register', (302,), lambda: session.request('POST', '/register', {
+        'email': email, 'password': password, 'first_name': 'Load', 'last_name': 'Test',
+        'phone': '555-000-0000', 'user_type': 'consumer'}))
+    if not ok:
+        return
+    ok, _ = _step(stats, 'login', (302,), lambda: session.request('POST', '/login', {
+        'email': email, 'password': password}))
+    if not ok:
+        return
+
+    _step(stats, 'screening_form', (200,), lambda: session.request('GET', '/jurisdiction-screening'))
+    _step(stats, 'screening_submit', (302,), lambda: session.request('POST', '/jurisdiction-screening', {
+        'is_realtor': 'yes', 'violation_type': 'ethics_violation', 'state': state,
+        'has_contract': 'yes', 'seeks_damages': 'no'}))
+    _step(stats, 'complaint_form', (200,), lambda: session.request('GET', '/complaint/new'))
+
+    ok, location = _step(stats, 'complaint_create', (302,), lambda: session.request('POST', '/complaint/new', {
+        'title': 'Load test complaint', 'jurisdiction_type': 'nar_association', 'state': state,
+        'respondent_name': 'Load Respondent', 'respondent_is_realtor': 'yes',
+        'incident_date': (date.today() - timedelta(days=30)).isoformat(),
+        'transaction_type': 'buyer', 'complaint_narrative': ' '.join(NARRATIVE_SENTENCES),
+        'nar_articles': ['Article 1', 'Article 2']}))
+    match = re.search(r'/complaint/(\d+)$', location or '')
+    if not ok or not match:
+        return
+    complaint_path = f'/complaint/{match.group(1)}'
+
+    _step(stats, 'upload', (302,), lambda: session.request('POST', f'{complaint_path}/upload',
+                                                           {'file_type': 'contract', 'description': 'load test'},
+                                                           {'file': ('evidence.pdf', b'%PDF-1.4\n' + b'0' * upload_bytes)}))
+    _step(stats, 'complaint_detail', (200,), lambda: session.request('GET', complaint_path))
+    _step(stats, 'dashboard', (200,), lambda: session.request('GET', '/dashboard'))
+
+
+def run_load_test(base_url, sessions=100, concurrency=10, timeout=30, upload_bytes=64 * 1024):
+    """Run `sessions` user flows with `concurrency` threads and return a report dict"""
+    stats = LoadTestStats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(sessions):
+            executor.submit(run_session, base_url, stats, timeout, upload_bytes)
+    return stats.report(time.perf_counter() - started)
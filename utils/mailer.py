@@ -0,0 +1,45 @@
+"""
+Outgoing email over SMTP
+"""
+import logging
+import smtplib
+from email.message import EmailMessage
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(to, subject, text_body, html_body=None):
+    message = EmailMessage()
+    message['From'] = current_app.config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(text_body)
+    if html_body:
+        message.add_alternative(html_body, subtype='html')
+    return message
+
+
+def send_messages(messages):
+    """
+    Send messages over a single SMTP connection
+
+    Without MAIL_SERVER (development) messages are only logged. Returns the
+    number of messages handed to the server.
+    """
+    config = current_app.config
+    if not messages:
+        return 0
+    if not config.get('MAIL_SERVER'):
+        for message in messages:
+            logger.info('Email to %s not sent (MAIL_SERVER unset): %s', message['To'], message['Subject'])
+        return len(messages)
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as smtp:
+        if config.get('MAIL_USE_TLS'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        for message in messages:
+            smtp.send_message(message)
+    return len(messages)
@@ -0,0 +1,254 @@
+"""
+Request-level performance instrumentation and Prometheus metrics export
+"""
+import threading
+import time
+import weakref
+from flask import g, request, Response
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Latency buckets (seconds) shared by request, SQL and template histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Query-count buckets for spotting N+1 regressions
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+METRIC_HELP = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'http_requests_total': ('counter', 'Requests by endpoint and status code'),
+    'sql_queries_per_request': ('histogram', 'SQL statements executed per request'),
+    'sql_query_duration_seconds_total': ('counter', 'Time spent in SQL per endpoint'),
+    'template_render_duration_seconds': ('histogram', 'Template render time by template'),
+    'upload_bytes_total': ('counter', 'Bytes received by document uploads'),
+    'upload_duration_seconds_total': ('counter', 'Time spent writing document uploads'),
+    'db_read_routing_total': ('counter', 'Read-only requests by database they read from'),
+    'rate_limited_total': ('counter', 'Requests rejected by rate limiting, by scope and bucket'),
+    'fragment_cache_total': ('counter', 'Template fragment cache lookups by result'),
+    'review_claims_total': ('counter', 'Review queue claim attempts by result'),
+}
+
+
+class _Shard:
+    """Per-thread metric storage; only its owning thread ever writes to it"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        """Add other's counts into this shard"""
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, (buckets, bucket_counts, count, total) in list(other.histograms.items()):
+            merged = self.histograms.get(key)
+            if merged is None:
+                merged = self.histograms[key] = [buckets, [0] * len(buckets), 0, 0.0]
+            merged[1] = [a + b for a, b in zip(merged[1], bucket_counts)]
+            merged[2] += count
+            merged[3] += total
+
+
+class MetricsRegistry:
+    """
+    Thread-sharded metrics registry
+
+    Each worker thread records into its own shard, so the hot path is a plain
+    dict update with no lock. Shards are merged only when /metrics is scraped.
+    When a thread is gone its shard is folded into a retired shard, so the
+    number of shards tracks live threads however many threads come and go.
+
+    Values are per process: each gunicorn worker keeps and serves its own
+    counts, and they start from zero when the process restarts.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()  # totals of shards whose threads have exited
+        self._shards_lock = threading.Lock()  # taken once per thread and per scrape, never per request
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+            weakref.finalize(threading.current_thread(), self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        # Runs once the owning thread object is collected, so nothing writes to shard any more
+        with self._shards_lock:
+            self._shards.remove(shard)
+            self._retired.merge(shard)
+
+    def inc(self, name, labels=(), value=1):
+        """Increment a counter"""
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        """Record an observation in a histogram"""
+        histograms = self._shard().histograms
+        key = (name, labels)
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = [buckets, [0] * len(buckets), 0, 0.0]
+        bucket_counts = hist[1]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                bucket_counts[i] += 1
+                break
+        hist[2] += 1
+        hist[3] += value
+
+    def snapshot(self):
+        """Merge all shards into (counters, histograms) dicts"""
+        merged = _Shard()
+        # Held while merging so a shard cannot be retired mid-scrape and counted twice
+        with self._shards_lock:
+            merged.merge(self._retired)
+            for shard in self._shards:
+                merged.merge(shard)
+        return merged.counters, merged.histograms
+
+    def reset(self):
+        """Drop all recorded values"""
+        with self._shards_lock:
+            for shard in self._shards + [self._retired]:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in pairs
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus():
+    """Render the registry in Prometheus text exposition format"""
+    counters, histograms = registry.snapshot()
+    lines = []
+    seen = set()
+
+    def header(name):
+        if name not in seen and name in METRIC_HELP:
+            metric_type, help_text = METRIC_HELP[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+        seen.add(name)
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), (buckets, bucket_counts, count, total) in sorted(histograms.items()):
+        header(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", bound))} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {count}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def record_upload(num_bytes, seconds):
+    """Record bytes written by a document upload and the time it took"""
+    registry.inc('upload_bytes_total', value=num_bytes)
+    registry.inc('upload_duration_seconds_total', value=seconds)
+
+
+def _endpoint_label():
+    return request.endpoint or 'unmatched'
+
+
+# ==================== HOOKS ====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if g:
+        g._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if g and hasattr(g, '_query_count'):
+        g._query_count += 1
+        g._query_time += time.perf_counter() - g.pop('_query_started', time.perf_counter())
+
+
+def _before_render(sender, template, context, **extra):
+    if g:
+        g._template_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    started = g.pop('_template_started', None) if g else None
+    if started is not None:
+        registry.observe('template_render_duration_seconds',
+                         time.perf_counter() - started,
+                         labels=(('template', template.name or 'inline'),))
+
+
+def init_metrics(app):
+    """Attach request, SQL and template instrumentation and the /metrics route"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    # Listen on the Engine class so every engine (primary or replica) is counted
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+        g._query_count = 0
+        g._query_time = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('_request_started')
+        if started is None:
+            return response
+
+        endpoint = _endpoint_label()
+        labels = (('endpoint', endpoint),)
+        registry.observe('http_request_duration_seconds', time.perf_counter() - started, labels=labels)
+        registry.inc('http_requests_total', labels=labels + (('status', response.status_code),))
+        registry.observe('sql_queries_per_request', g._query_count, labels=labels,
+                         buckets=QUERY_COUNT_BUCKETS)
+        registry.inc('sql_query_duration_seconds_total', labels=labels, value=g._query_time)
+
+        if app.config.get('METRICS_DEBUG_HEADERS'):
+            response.headers['X-Query-Count'] = str(g._query_count)
+            response.headers['X-Query-Time-Ms'] = f'{g._query_time * 1000:.2f}'
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
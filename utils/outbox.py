@@ -0,0 +1,82 @@
+"""
+Transactional outbox for complaint events
+
+Events are added to the caller's session, so they commit (or roll back)
+together with the change they describe. The webhook dispatcher delivers
+them afterwards.
+"""
+import json
+from datetime import datetime
+from sqlalchemy import insert
+
+from models import db, OutboxEvent
+
+
+COMPLAINT_CREATED = 'complaint.created'
+COMPLAINT_STATUS_CHANGED = 'complaint.status_changed'
+DOCUMENT_UPLOADED = 'document.uploaded'
+NOTE_ADDED = 'note.added'
+
+EVENT_TYPES = (COMPLAINT_CREATED, COMPLAINT_STATUS_CHANGED, DOCUMENT_UPLOADED, NOTE_ADDED)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def complaint_payload(complaint):
+    return {
+        'complaint_id': complaint.id,
+        'status': complaint.status,
+        'jurisdiction_type': complaint.jurisdiction_type,
+        'state': complaint.state,
+        'filing_deadline': _iso(complaint.filing_deadline)
+    }
+
+
+def document_payload(document):
+    return {
+        'complaint_id': document.complaint_id,
+        'document_id': document.id,
+        'file_type': document.file_type,
+        'file_size': document.file_size
+    }
+
+
+def note_payload(note):
+    return {
+        'complaint_id': note.complaint_id,
+        'note_id': note.id,
+        'note_type': note.note_type
+    }
+
+
+def record_event(event_type, payload):
+    """Add one event to the current transaction"""
+    event = OutboxEvent(event_type=event_type,
+                        complaint_id=payload.get('complaint_id'),
+                        payload=json.dumps(payload))
+    db.session.add(event)
+    return event
+
+
+def record_events(event_type, events):
+    """
+    Add many events of one type with a single multi-row insert
+
+    events are (tenant_id, payload) pairs: callers outside a request may
+    touch several tenants' complaints, so each event names its own.
+    """
+    if not events:
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(OutboxEvent), [
+        {
+            'tenant_id': tenant_id,
+            'event_type': event_type,
+            'complaint_id': payload.get('complaint_id'),
+            'payload': json.dumps(payload),
+            'created_at': now
+        }
+        for tenant_id, payload in events
+    ])
@@ -0,0 +1,145 @@
+"""
+Opt-in sampling profiler for production requests
+
+Profiled requests are sampled by a helper thread that walks the request
+thread's stack at a fixed interval. Samples are written as collapsed stacks
+(one "frame;frame;frame count" line per unique stack), which flamegraph.pl and
+speedscope both import directly.
+"""
+import os
+import random
+import re
+import sys
+import threading
+from datetime import datetime
+from flask import g, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_EXTENSION = '.collapsed'
+TOKEN_SALT = 'request-profiler'
+
+
+class StackSampler:
+    """Samples one thread's call stack on a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def collapsed(self):
+        """Return samples in collapsed-stack format"""
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.samples.items()))
+
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+
+def generate_profile_token(app):
+    """Create a signed token that forces profiling of the request carrying it"""
+    return _serializer(app).dumps('profile')
+
+
+def _has_valid_token(app):
+    token = request.headers.get(PROFILE_HEADER)
+    if not token:
+        return False
+    try:
+        _serializer(app).loads(token, max_age=app.config['PROFILER_TOKEN_MAX_AGE'])
+    except (BadSignature, SignatureExpired):
+        return False
+    return True
+
+
+def _should_profile(app):
+    if _has_valid_token(app):
+        return True
+    rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _safe_endpoint(endpoint):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint or 'unmatched')
+
+
+def write_profile(profile_dir, endpoint, collapsed, max_files):
+    """Write a profile into the ring buffer, evicting the oldest beyond max_files"""
+    os.makedirs(profile_dir, exist_ok=True)
+    timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    filename = f'{timestamp}_{_safe_endpoint(endpoint)}{PROFILE_EXTENSION}'
+    with open(os.path.join(profile_dir, filename), 'w') as f:
+        f.write(collapsed)
+
+    profiles = sorted(name for name in os.listdir(profile_dir) if name.endswith(PROFILE_EXTENSION))
+    for stale in profiles[:max(0, len(profiles) - max_files)]:
+        try:
+            os.remove(os.path.join(profile_dir, stale))
+        except FileNotFoundError:
+            pass
+    return filename
+
+
+def list_profiles(profile_dir):
+    """List stored profiles grouped by endpoint, newest first"""
+    if not os.path.isdir(profile_dir):
+        return {}
+
+    grouped = {}
+    for name in sorted(os.listdir(profile_dir), reverse=True):
+        if not name.endswith(PROFILE_EXTENSION):
+            continue
+        timestamp, _, endpoint = name[:-len(PROFILE_EXTENSION)].partition('_')
+        grouped.setdefault(endpoint, []).append({
+            'filename': name,
+            'recorded_at': datetime.strptime(timestamp, '%Y%m%dT%H%M%S%f'),
+            'size': os.path.getsize(os.path.join(profile_dir, name))
+        })
+    return grouped
+
+
+def init_profiler(app):
+    """Register profiling hooks; no hooks are installed unless PROFILER_ENABLED"""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    @app.before_request
+    def _start_profiler():
+        if _should_profile(app):
+            sampler = StackSampler(threading.get_ident(), app.config['PROFILER_INTERVAL'])
+            sampler.start()
+            g._profiler = sampler
+
+    @app.teardown_request
+    def _stop_profiler(exc=None):
+        sampler = g.pop('_profiler', None)
+        if sampler is None:
+            return
+        sampler.stop()
+        if sampler.samples:
+            write_profile(app.config['PROFILER_DIR'], request.endpoint,
+                          sampler.collapsed(), app.config['PROFILER_MAX_FILES'])
@@ -0,0 +1,287 @@
+"""
+Token-bucket rate limiting per client IP, per account and per route
+
+Each limited view names a scope in RATE_LIMITS, e.g.
+
+    'login': {'ip': '20/minute', 'account': '10/minute', 'route': '300/minute'}
+
+A request takes one token from every bucket of its scope: one per client IP,
+one per account identifier (when the view supplies one) and one shared by
+the whole route. Buckets refill continuously, so '20/minute' allows a burst
+of 20 and then one request every three seconds.
+
+Buckets live in process memory by default. Set RATE_LIMIT_STORAGE_URL to a
+sqlite:/// file to share them between the worker processes of one host, or
+to a redis:// URL to share them between nodes (flask rate-limit-server runs
+a local stand-in).
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import TooManyRequests
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(spec):
+    """'10/minute' -> (capacity, tokens refilled per second)"""
+    count, _, period = spec.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().rstrip('s')]
+
+
+def refill(tokens, elapsed, capacity, rate, cost):
+    """Refill a bucket and take cost -> (tokens left, allowed, retry_after, seconds until full)"""
+    tokens = capacity if tokens is None else min(capacity, tokens + max(0.0, elapsed) * rate)
+    if tokens >= cost:
+        tokens -= cost
+        allowed, retry_after = True, 0.0
+    else:
+        allowed, retry_after = False, (cost - tokens) / rate
+    return tokens, allowed, retry_after, (capacity - tokens) / rate
+
+
+class MemoryBackend:
+    """
+    Thread-safe in-process buckets
+
+    Keys are spread over striped locks so concurrent requests rarely contend.
+    When the table grows past max_keys, buckets that have refilled to
+    capacity (idle clients) are dropped; they would start full anyway. If
+    most buckets are still active the next sweep waits until the table
+    doubles, keeping sweeps amortized O(1) per request.
+    """
+
+    def __init__(self, max_keys=100_000, stripes=64):
+        self.max_keys = max_keys
+        self._sweep_at = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at, full_at)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def take(self, key, capacity, rate, cost=1):
+        """Take cost tokens; returns (allowed, seconds until they would be available)"""
+        now = time.monotonic()
+        with self._locks[hash(key) % len(self._locks)]:
+            state = self._buckets.get(key)
+            tokens, allowed, retry_after, full_in = refill(
+                state and state[0], state and now - state[1], capacity, rate, cost)
+            self._buckets[key] = (tokens, now, now + full_in)
+
+        if len(self._buckets) > self._sweep_at:
+            self._sweep(now)
+        return allowed, retry_after
+
+    def _sweep(self, now):
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            for key in [key for key, state in self._buckets.items() if state[2] <= now]:
+                del self._buckets[key]
+            self._sweep_at = max(self.max_keys, 2 * len(self._buckets))
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def reset(self):
+        self._buckets.clear()
+
+
+class SqliteBackend:
+    """
+    Buckets in a SQLite file shared by every worker process on one host
+
+    Each take is a single BEGIN IMMEDIATE transaction, so processes
+    serialize on the file lock for a few microseconds; WAL keeps readers
+    of the file unblocked. Times are wall-clock because monotonic clocks
+    are not comparable between processes. Every sweep_every takes a
+    process deletes the buckets that have refilled to capacity.
+    """
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path, timeout=0.25, sweep_every=1000):
+        self.path = path
+        self.timeout = timeout
+        self.sweep_every = sweep_every
+        self._takes = 0
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                       'key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL, '
+                       'full_at REAL NOT NULL) WITHOUT ROWID')
+            db.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at '
+                       'ON rate_limit_buckets (full_at)')
+        finally:
+            db.close()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        db = self._connection()
+        self._takes += 1
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            state = db.execute('SELECT tokens, ts FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, allowed, retry_after, full_in = refill(
+                state and state[0], state and now - state[1], capacity, rate, cost)
+            db.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, ts, full_at) '
+                       'VALUES (?, ?, ?, ?)', (key, tokens, now, now + full_in))
+            if self._takes % self.sweep_every == 0:
+                db.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+    def reset(self):
+        self._connection().execute('DELETE FROM rate_limit_buckets')
+
+
+# Same algorithm as MemoryBackend, run atomically inside Redis with the server clock
+REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBackend:
+    """Buckets shared by every node through Redis; one round trip per bucket"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL=redis://... requires the redis package')
+        self.errors = (redis.RedisError, OSError)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._script = self._client.register_script(REDIS_TOKEN_BUCKET)
+
+    def take(self, key, capacity, rate, cost=1):
+        allowed, retry_after = self._script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        return bool(allowed), float(retry_after)
+
+
+def create_backend(url):
+    """Backend for a RATE_LIMIT_STORAGE_URL"""
+    if not url or url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SqliteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported RATE_LIMIT_STORAGE_URL: {url}')
+
+
+def client_ip():
+    """Client address, honouring RATE_LIMIT_PROXY_HOPS trusted reverse proxies"""
+    hops = current_app.config.get('RATE_LIMIT_PROXY_HOPS', 0)
+    route = request.access_route
+    if hops and len(route) >= hops:
+        return route[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def check_rate_limit(scope, account=None):
+    """Take a token from each bucket of scope; raises TooManyRequests when one is empty"""
+    limiter = current_app.extensions['rate_limit']
+    rules = limiter['rules'].get(scope, {})
+    identities = {'ip': client_ip(), 'account': (account or '').strip().lower() or None, 'route': '*'}
+
+    for kind, (capacity, rate) in rules.items():
+        identity = identities[kind]
+        if identity is None:
+            continue
+        try:
+            allowed, retry_after = limiter['backend'].take(f'{scope}:{kind}:{identity}', capacity, rate)
+        except getattr(limiter['backend'], 'errors', ()) as e:
+            # A limiter outage must not take the site down with it
+            logger.warning('Rate limit backend unavailable, allowing request: %s', e)
+            return
+        if not allowed:
+            registry.inc('rate_limited_total', labels=(('scope', scope), ('bucket', kind)))
+            raise TooManyRequests('Too many requests. Please wait before trying again.',
+                                  retry_after=max(1, math.ceil(retry_after)))
+
+
+def rate_limit(scope, methods=('GET', 'POST'), account=None):
+    """
+    Limit a view by the buckets configured for scope
+
+    account, if given, is called to get the account identifier (e.g. the
+    submitted email) for per-account buckets.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if current_app.config.get('RATE_LIMIT_ENABLED') and request.method in methods:
+                check_rate_limit(scope, account() if account else None)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def init_rate_limit(app, backend=None):
+    """Create the bucket backend and the 429 handler; pass backend to share one between apps"""
+    app.extensions['rate_limit'] = {
+        'backend': backend or create_backend(app.config.get('RATE_LIMIT_STORAGE_URL')),
+        'rules': {
+            scope: {kind: parse_limit(spec) for kind, spec in rules.items()}
+            for scope, rules in app.config.get('RATE_LIMITS', {}).items()
+        }
+    }
+
+    @app.errorhandler(TooManyRequests)
+    def _too_many_requests(error):
+        if request.path.startswith('/api/'):
+            response = jsonify({'error': error.description})
+            response.status_code = 429
+        else:
+            response = error.get_response()
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
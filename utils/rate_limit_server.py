@@ -0,0 +1,100 @@
+"""
+Local stand-in for the Redis rate-limit store (flask rate-limit-server)
+
+Speaks just enough of the Redis protocol for RedisBackend: the token-bucket
+script is recognised by its SHA1 and run over a MemoryBackend, so several
+app processes or nodes can share buckets without installing Redis.
+"""
+import hashlib
+import socketserver
+import threading
+
+from utils.rate_limit import REDIS_TOKEN_BUCKET, MemoryBackend
+
+SCRIPT_SHA = hashlib.sha1(REDIS_TOKEN_BUCKET.encode()).hexdigest()
+
+
+def read_command(rfile):
+    """Next command as a list of bytes arguments; None when the client hangs up"""
+    line = rfile.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.split()  # inline command, e.g. typed into telnet
+    args = []
+    for _ in range(int(line[1:])):
+        length = int(rfile.readline()[1:])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+
+def bulk(value):
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class RateLimitServer:
+    """Shared token buckets behind a Redis-compatible socket; start() serves in a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.backend = MemoryBackend()
+        self.commands = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                while True:
+                    command = read_command(self.rfile)
+                    if command is None:
+                        return
+                    if command:
+                        self.wfile.write(server.execute(command))
+
+        return Handler
+
+    def execute(self, command):
+        with self._lock:
+            self.commands += 1
+        name = command[0].upper()
+        try:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name in (b'CLIENT', b'SELECT'):
+                return b'+OK\r\n'
+            if name == b'SCRIPT' and command[1].upper() == b'LOAD':
+                sha = hashlib.sha1(command[2]).hexdigest()
+                if sha != SCRIPT_SHA:
+                    return b'-ERR only the rate-limit script is supported\r\n'
+                return bulk(sha.encode())
+            if name in (b'EVAL', b'EVALSHA'):
+                sha = command[1].decode() if name == b'EVALSHA' else hashlib.sha1(command[1]).hexdigest()
+                if sha != SCRIPT_SHA:
+                    return b'-NOSCRIPT No matching script. Please use EVAL.\r\n'
+                numkeys = int(command[2])
+                key = command[3].decode()
+                capacity, rate, cost = (float(arg) for arg in command[3 + numkeys:6 + numkeys])
+                allowed, retry_after = self.backend.take(key, capacity, rate, cost)
+                return b'*2\r\n:%d\r\n%s' % (allowed, bulk(repr(retry_after).encode()))
+        except (IndexError, ValueError, UnicodeDecodeError) as e:
+            return b'-ERR %s\r\n' % str(e).encode()
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,140 @@
+"""
+Daily reminder emails, grouped into one digest per user
+
+Due reminders are read with one joined query per chunk of users, rendered
+with templates loaded once per run and sent over a single SMTP connection,
+so a run costs one email per user rather than one per reminder (users who
+turned digests off still get one email per reminder).
+"""
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from operator import attrgetter
+from flask import current_app
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Complaint, Reminder, JobRun
+from utils.db_routing import tenant_job_name
+from utils.mailer import build_message, send_messages
+
+
+JOB_NAME = 'reminder_digest'
+TEXT_TEMPLATE = 'email/reminder_digest.txt'
+HTML_TEMPLATE = 'email/reminder_digest.html'
+
+
+def _claim_day(today):
+    """Record today's run for the current tenant (or the whole database); False if another process already ran it"""
+    now = datetime.utcnow()
+    job_name = tenant_job_name(JOB_NAME)
+    if db.session.get(JobRun, job_name) is None:
+        db.session.add(JobRun(job_name=job_name, last_run_on=today, last_run_at=now))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    result = db.session.execute(
+        update(JobRun)
+        .where(JobRun.job_name == job_name, or_(JobRun.last_run_on.is_(None), JobRun.last_run_on < today))
+        .values(last_run_on=today, last_run_at=now)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _group_by_complaint(rows, today):
+    complaints = []
+    for complaint_id, complaint_rows in groupby(rows, key=attrgetter('complaint_id')):
+        complaint_rows = list(complaint_rows)
+        title = complaint_rows[0].title
+        deadline = complaint_rows[0].filing_deadline
+        # Deadline reminder messages repeat the complaint title as a prefix
+        prefix = f'{title}: ' if title else None
+        complaints.append({
+            'id': complaint_id,
+            'title': title or 'General reminder',
+            'filing_deadline': deadline,
+            'days_remaining': (deadline - today).days if deadline else None,
+            'messages': [row.message[len(prefix):] if prefix and row.message and row.message.startswith(prefix)
+                         else row.message for row in complaint_rows]
+        })
+    return complaints
+
+
+def _render(templates, user, rows, today):
+    """One email covering rows (already sorted by complaint)"""
+    text_template, html_template = templates
+    complaints = _group_by_complaint(rows, today)
+    context = {'first_name': user.first_name, 'today': today, 'complaints': complaints}
+    if len(complaints) == 1:
+        subject = f'Reminder: {complaints[0]["title"]}'
+    else:
+        subject = f'{len(complaints)} complaints need your attention'
+    return build_message(user.email, subject, text_template.render(context), html_template.render(context))
+
+
+def send_due_reminders(today=None, force=False, dry_run=False, chunk_size=500):
+    """
+    Email every unsent reminder due on or before today
+
+    Runs once per day unless force is set. Reminders for closed complaints
+    are retired without an email. Returns dict of totals, or None when
+    today's run already happened.
+    """
+    today = today or date.today()
+    if not dry_run and not force and not _claim_day(today):
+        return None
+
+    end_of_today = datetime.combine(today + timedelta(days=1), time.min)
+    due = (Reminder.is_sent.is_(False), Reminder.reminder_date < end_of_today)
+    user_ids = [user_id for user_id, in db.session.query(Reminder.user_id).filter(*due)
+                .distinct().order_by(Reminder.user_id)]
+
+    # Jinja compiles each template once; the same objects render every email in the run
+    jinja_env = current_app.jinja_env
+    templates = (jinja_env.get_template(TEXT_TEMPLATE), jinja_env.get_template(HTML_TEMPLATE))
+    totals = {'users': 0, 'emails': 0, 'reminders': 0, 'retired': 0}
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = db.session.query(
+            Reminder.id, Reminder.user_id, Reminder.message,
+            Complaint.id.label('complaint_id'), Complaint.title, Complaint.filing_deadline, Complaint.status,
+            User.email, User.first_name, User.reminder_digest
+        ).join(User, User.id == Reminder.user_id) \
+            .outerjoin(Complaint, Complaint.id == Reminder.complaint_id) \
+            .filter(Reminder.user_id.in_(chunk), *due) \
+            .order_by(Reminder.user_id, Reminder.complaint_id, Reminder.reminder_date, Reminder.id).all()
+
+        messages = []
+        handled_ids = []
+        for _, user_rows in groupby(rows, key=attrgetter('user_id')):
+            user_rows = list(user_rows)
+            handled_ids.extend(row.id for row in user_rows)
+            active = [row for row in user_rows if row.status != 'closed']
+            totals['retired'] += len(user_rows) - len(active)
+            if not active:
+                continue
+            user = user_rows[0]
+            if user.reminder_digest is False:
+                messages.extend(_render(templates, user, [row], today) for row in active)
+            else:
+                messages.append(_render(templates, user, active, today))
+            totals['users'] += 1
+            totals['reminders'] += len(active)
+
+        totals['emails'] += len(messages)
+        if dry_run:
+            continue
+        send_messages(messages)
+        db.session.execute(
+            update(Reminder).where(Reminder.id.in_(handled_ids))
+            .values(is_sent=True, sent_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    return totals
@@ -0,0 +1,135 @@
+"""
+Read-replica selection with lag tracking
+
+The primary rewrites a heartbeat row every REPLICA_HEARTBEAT_SECONDS.
+Comparing each replica's copy of that row with the primary's gives its
+replication lag, checked at most every REPLICA_LAG_CHECK_SECONDS per
+process. Read-only views decorated with replica_reads use a replica whose
+lag is within REPLICA_MAX_LAG_SECONDS, falling back to the primary when
+none is. After a request writes, the user's reads stay on the primary for
+REPLICA_STICKY_SECONDS so they see their own changes on the next page.
+"""
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, session
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, ReplicaHeartbeat
+from utils.db_routing import route_reads_to, request_wrote
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_ID = 1
+STICKY_SESSION_KEY = '_primary_reads_until'
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': 0.0, 'lags': {}}
+_round_robin = itertools.count()
+
+
+def replica_bind_keys(config=None):
+    """Bind keys of the configured replicas (replica_0, replica_1, ...)"""
+    config = config or current_app.config
+    return [key for key in config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_')]
+
+
+def write_heartbeat():
+    """Stamp the primary's heartbeat row"""
+    heartbeat = db.session.get(ReplicaHeartbeat, HEARTBEAT_ID) or ReplicaHeartbeat(id=HEARTBEAT_ID)
+    heartbeat.beat_at = datetime.utcnow()
+    db.session.add(heartbeat)
+    db.session.commit()
+
+
+def _read_heartbeat(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == HEARTBEAT_ID)
+        ).scalar()
+
+
+def measure_lags():
+    """
+    Map of replica bind key -> lag in seconds, or None if unreachable or unknown
+
+    Lag is the primary's heartbeat minus the replica's copy, so it stays
+    meaningful even if the heartbeat writer stops.
+    """
+    engines = db.engines
+    primary_beat = _read_heartbeat(engines[None])
+    lags = {}
+    for key in replica_bind_keys():
+        try:
+            replica_beat = _read_heartbeat(engines[key])
+        except SQLAlchemyError as e:
+            logger.warning('Replica %s unreachable: %s', key, e)
+            lags[key] = None
+            continue
+        if primary_beat is None or replica_beat is None:
+            lags[key] = None  # no heartbeat yet, so the lag is unknown
+        else:
+            lags[key] = max(0.0, (primary_beat - replica_beat).total_seconds())
+    return lags
+
+
+def current_lags():
+    """Replica lags, re-measured when older than REPLICA_LAG_CHECK_SECONDS"""
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < current_app.config['REPLICA_LAG_CHECK_SECONDS']:
+        return _lag_state['lags']
+    # One request re-measures; concurrent ones keep using the previous values
+    if not _lag_lock.acquire(blocking=False):
+        return _lag_state['lags']
+    try:
+        _lag_state['lags'] = measure_lags()
+        _lag_state['checked_at'] = now
+    finally:
+        _lag_lock.release()
+    return _lag_state['lags']
+
+
+def choose_replica():
+    """Bind key of a healthy replica for this request, or None to use the primary"""
+    if session.get(STICKY_SESSION_KEY, 0) > time.time():
+        return None
+    max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+    healthy = [key for key, lag in current_lags().items() if lag is not None and lag <= max_lag]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+def replica_reads(view):
+    """Serve a read-only view from a replica when one is healthy"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        use_replica()
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def use_replica():
+    """Route the rest of this request's reads to a replica, if one is healthy"""
+    if not replica_bind_keys():
+        return
+    bind_key = choose_replica()
+    route_reads_to(bind_key)
+    registry.inc('db_read_routing_total', labels=(('target', bind_key or 'primary'),))
+
+
+def init_replicas(app):
+    """Keep users who just wrote on the primary for REPLICA_STICKY_SECONDS"""
+    if not replica_bind_keys(app.config):
+        return
+
+    @app.after_request
+    def _stick_to_primary_after_write(response):
+        if request_wrote():
+            session[STICKY_SESSION_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,218 @@
+"""
+Agency staff review queue over submitted complaints
+
+Reviewers work submitted complaints most urgent filing deadline first.
+Claiming one gives the reviewer a lease (review_claimed_by and
+review_lease_expires_at) for REVIEW_LEASE_SECONDS; a lapsed lease makes the
+complaint claimable again, so nothing stays stuck when a reviewer walks
+away. On PostgreSQL claim_next() picks its row with SELECT ... FOR UPDATE
+SKIP LOCKED, so concurrent reviewers each lock a different row without
+waiting on one another. Elsewhere (SQLite) the claim is a compare-and-set
+UPDATE on the lease columns, moving to the next candidate when another
+reviewer got there first. Claiming and the queue page by keyset on
+(filing_deadline, id) within the tenant over ix_complaints_review_queue, so
+both cost the same however many complaints are waiting.
+"""
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import aliased, load_only
+
+from models import db, Complaint, User
+from utils.metrics import registry
+from utils.status_transitions import transition_complaints
+
+
+QUEUE_STATUS = 'submitted'
+DECISIONS = ('under_review', 'closed')
+CLAIM_CANDIDATES = 5  # rows tried per compare-and-set round where SKIP LOCKED is unavailable
+
+# Deadlines first, soonest first; complaints without a deadline after them, oldest first.
+# Two index-ordered scans rather than one ORDER BY over a NULL-sorting expression.
+_PHASES = (
+    (Complaint.filing_deadline.isnot(None), (Complaint.filing_deadline, Complaint.id)),
+    (Complaint.filing_deadline.is_(None), (Complaint.id,)),
+)
+
+
+class ClaimLost(Exception):
+    """The reviewer does not hold the complaint's claim (never had it, released it, or it lapsed)"""
+
+
+def _claimable(now):
+    return and_(Complaint.status == QUEUE_STATUS,
+                or_(Complaint.review_lease_expires_at.is_(None), Complaint.review_lease_expires_at <= now))
+
+
+def _held_by(reviewer_id, now):
+    return and_(Complaint.status == QUEUE_STATUS, Complaint.review_claimed_by == reviewer_id,
+                Complaint.review_lease_expires_at > now)
+
+
+def _lease(reviewer_id, now):
+    return {
+        'review_claimed_by': reviewer_id,
+        'review_lease_expires_at': now + timedelta(seconds=current_app.config['REVIEW_LEASE_SECONDS']),
+        # A claim is staff bookkeeping, not an edit: leave updated_at (and API ETags) alone
+        'updated_at': Complaint.updated_at,
+    }
+
+
+def _take(complaint_id, reviewer_id, now):
+    """Compare-and-set claim (or renewal, for the current holder); True if this reviewer now holds it"""
+    result = db.session.execute(
+        update(Complaint)
+        .where(Complaint.id == complaint_id, or_(_claimable(now), _held_by(reviewer_id, now)))
+        .values(**_lease(reviewer_id, now))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _supports_skip_locked():
+    return db.session.get_bind(Complaint.__mapper__).dialect.name == 'postgresql'
+
+
+def claim_next(reviewer_id, now=None):
+    """Claim the most urgent unclaimed submitted complaint; returns its id, or None if none is free. Commits."""
+    now = now or datetime.utcnow()
+    skip_locked = _supports_skip_locked()
+    for condition, order in _PHASES:
+        while True:
+            candidates = select(Complaint.id).where(_claimable(now), condition).order_by(*order)
+            if skip_locked:
+                candidates = candidates.limit(1).with_for_update(skip_locked=True)
+            else:
+                candidates = candidates.limit(CLAIM_CANDIDATES)
+            ids = db.session.execute(candidates).scalars().all()
+            if not ids:
+                break
+            for complaint_id in ids:
+                if _take(complaint_id, reviewer_id, now):
+                    db.session.commit()
+                    registry.inc('review_claims_total', labels=(('result', 'claimed'),))
+                    return complaint_id
+            # Every candidate went to another reviewer in the meantime; look again
+            registry.inc('review_claims_total', labels=(('result', 'contended'),))
+    db.session.rollback()
+    registry.inc('review_claims_total', labels=(('result', 'empty'),))
+    return None
+
+
+def claim_complaint(complaint_id, reviewer_id, now=None):
+    """
+    Claim a specific complaint, or renew the reviewer's own claim; commits
+
+    Raises LookupError if it is not in the queue, ClaimLost if another
+    reviewer holds it.
+    """
+    now = now or datetime.utcnow()
+    if _take(complaint_id, reviewer_id, now):
+        db.session.commit()
+        registry.inc('review_claims_total', labels=(('result', 'claimed'),))
+        return
+    db.session.rollback()
+    status = db.session.query(Complaint.status).filter(Complaint.id == complaint_id).scalar()
+    if status != QUEUE_STATUS:
+        raise LookupError(f'Complaint {complaint_id} is not awaiting review')
+    registry.inc('review_claims_total', labels=(('result', 'contended'),))
+    raise ClaimLost(f'Complaint {complaint_id} is claimed by another reviewer')
+
+
+def release_claim(complaint_id, reviewer_id, now=None):
+    """Hand a claimed complaint back to the queue; returns False if the reviewer did not hold it. Commits."""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(Complaint)
+        .where(Complaint.id == complaint_id, _held_by(reviewer_id, now))
+        .values(review_claimed_by=None, review_lease_expires_at=None, updated_at=Complaint.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def decide(complaint_id, reviewer_id, decision, comment=None, now=None):
+    """
+    Move a claimed complaint on to under_review or closed
+
+    The reviewer must still hold an unexpired claim; the claim check and
+    the status change happen in one transaction. The reviewer stays
+    recorded in review_claimed_by. Raises ValueError for an unknown
+    decision and ClaimLost without a valid claim. The caller commits.
+    """
+    if decision not in DECISIONS:
+        raise ValueError(f'Decision must be one of: {", ".join(DECISIONS)}')
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(Complaint)
+        .where(Complaint.id == complaint_id, _held_by(reviewer_id, now))
+        .values(review_lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        raise ClaimLost(f'You no longer hold the claim on complaint {complaint_id}')
+    return transition_complaints([complaint_id], decision, comment=comment)
+
+
+def encode_cursor(cursor):
+    """URL form of a queue cursor: 'YYYY-MM-DD.id', or '.id' past the deadline-less complaints"""
+    deadline, complaint_id = cursor
+    return f'{deadline.isoformat() if deadline else ""}.{complaint_id}'
+
+
+def decode_cursor(value):
+    """Inverse of encode_cursor(); None for no value, ValueError when malformed"""
+    if not value:
+        return None
+    deadline, _, complaint_id = value.partition('.')
+    return (date.fromisoformat(deadline) if deadline else None), int(complaint_id)
+
+
+def review_queue(after=None, limit=50):
+    """
+    One page of submitted complaints, most urgent filing deadline first
+
+    after is the cursor (filing_deadline, id) of the previous page's last
+    complaint. Returns ([(complaint, reviewer first name or None)], cursor
+    for the next page or None). Complaints carry only the columns the
+    queue shows.
+    """
+    reviewer = aliased(User)
+    base = db.session.query(Complaint, reviewer.first_name) \
+        .outerjoin(reviewer, reviewer.id == Complaint.review_claimed_by) \
+        .options(load_only(Complaint.id, Complaint.title, Complaint.state, Complaint.jurisdiction_type,
+                           Complaint.respondent_name, Complaint.filing_deadline, Complaint.submitted_date,
+                           Complaint.review_claimed_by, Complaint.review_lease_expires_at)) \
+        .filter(Complaint.status == QUEUE_STATUS)
+
+    rows = []
+    if after is None or after[0] is not None:
+        query = base.filter(Complaint.filing_deadline.isnot(None))
+        if after is not None:
+            query = query.filter(or_(Complaint.filing_deadline > after[0],
+                                     and_(Complaint.filing_deadline == after[0], Complaint.id > after[1])))
+        rows = query.order_by(Complaint.filing_deadline, Complaint.id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        query = base.filter(Complaint.filing_deadline.is_(None))
+        if after is not None and after[0] is None:
+            query = query.filter(Complaint.id > after[1])
+        rows += query.order_by(Complaint.id).limit(limit + 1 - len(rows)).all()
+
+    page = rows[:limit]
+    next_cursor = (page[-1][0].filing_deadline, page[-1][0].id) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def queue_size():
+    """Complaints awaiting review (claimed or not); an index-only count"""
+    return db.session.query(func.count(Complaint.id)).filter(Complaint.status == QUEUE_STATUS).scalar()
+
+
+def claims_held_by(reviewer_id, now=None):
+    """The reviewer's unexpired claims, soonest lease expiry first"""
+    now = now or datetime.utcnow()
+    return Complaint.query.options(load_only(Complaint.id, Complaint.title, Complaint.filing_deadline,
+                                             Complaint.review_lease_expires_at)) \
+        .filter(_held_by(reviewer_id, now)).order_by(Complaint.review_lease_expires_at).all()
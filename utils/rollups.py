@@ -0,0 +1,256 @@
+"""
+Report rollups: filed complaints per state, jurisdiction type, transaction
+type, cited NAR article and month
+
+complaint_rollups counts every filed complaint once under each of its
+dimension values (and once under 'total'), keyed by the month it was
+submitted and its current status. A complaint is counted from the
+transaction that submits it, and each later status change moves its counts
+in the transaction that makes the change (see utils/status_transitions.py).
+Drafts are left out: they are not filed yet and autosave keeps rewriting
+their fields, while nothing edits those fields once a complaint leaves
+draft. Archiving does not change the counts.
+
+Reports read only rollup rows, so their cost depends on how many states,
+articles, months and statuses there are, never on how many complaints
+exist. rebuild_rollups() recounts from the complaints, archived ones
+included.
+"""
+import json
+import re
+import zlib
+from collections import Counter, defaultdict
+from datetime import date
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Complaint, ComplaintArchive, ComplaintArticle, ComplaintRollup
+from utils.article_index import normalize_article_number
+
+
+TOTAL = 'total'
+DIMENSIONS = ('state', 'jurisdiction_type', 'transaction_type', 'article')
+REPORT_GROUPS = DIMENSIONS + ('month',)
+REPORT_STATUSES = ('submitted', 'under_review', 'closed')  # drafts are never counted
+UNSPECIFIED = 'Unspecified'
+MONTH_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+def is_counted(status, submitted_date):
+    """Whether a complaint in this state is filed: never drafts, nor drafts closed without being submitted"""
+    return status != 'draft' and not (status == 'closed' and submitted_date is None)
+
+
+def _month(submitted_date):
+    # '' for submitted complaints that predate submitted_date
+    return submitted_date.strftime('%Y-%m') if submitted_date else ''
+
+
+def _dimension_values(state, jurisdiction_type, transaction_type, articles):
+    """(dimension, value) pairs a filed complaint is counted under"""
+    values = [(TOTAL, ''), ('state', state or ''), ('jurisdiction_type', jurisdiction_type or ''),
+              ('transaction_type', (transaction_type or '')[:100])]
+    return values + [('article', number) for number in articles]
+
+
+def _legacy_articles(alleged_violations):
+    """Article numbers from the legacy alleged_violations JSON of a complaint not yet backfilled"""
+    try:
+        numbers = json.loads(alleged_violations or '[]')
+    except ValueError:
+        return []
+    return list(dict.fromkeys(filter(None, (normalize_article_number(n) for n in numbers if isinstance(n, str)))))
+
+
+def _apply(deltas):
+    """Add {(tenant_id, dimension, value, month, status): n} to the rollups; the caller commits"""
+    table = ComplaintRollup
+    # A fixed order keeps two transactions from locking the same rows in opposite orders
+    for key in sorted(deltas):
+        n = deltas[key]
+        if not n:
+            continue
+        tenant_id, dimension, value, month, status = key
+        match = (table.tenant_id == tenant_id, table.dimension == dimension, table.value == value,
+                 table.month == month, table.status == status)
+        result = db.session.execute(update(table).where(*match).values(count=table.count + n)
+                                    .execution_options(synchronize_session=False))
+        if result.rowcount or n < 0:
+            continue  # a missing row to decrement means the rollups predate this complaint; rebuild fixes it
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(tenant_id=tenant_id, dimension=dimension, value=value,
+                                                        month=month, status=status, count=n))
+        except IntegrityError:
+            # Another process created the row first
+            db.session.execute(update(table).where(*match).values(count=table.count + n)
+                               .execution_options(synchronize_session=False))
+
+
+def _complaint_dimensions(complaint_ids):
+    """{complaint id: (tenant_id, [(dimension, value)])} with cited articles read from the article index"""
+    rows = db.session.query(Complaint.id, Complaint.tenant_id, Complaint.state, Complaint.jurisdiction_type,
+                            Complaint.transaction_type, Complaint.alleged_violations) \
+        .filter(Complaint.id.in_(complaint_ids)).all()
+    articles = defaultdict(list)
+    for complaint_id, number in db.session.query(ComplaintArticle.complaint_id, ComplaintArticle.article_number) \
+            .filter(ComplaintArticle.complaint_id.in_(complaint_ids)):
+        articles[complaint_id].append(number)
+    return {
+        row.id: (row.tenant_id, _dimension_values(row.state, row.jurisdiction_type, row.transaction_type,
+                                                  articles.get(row.id) or _legacy_articles(row.alleged_violations)))
+        for row in rows
+    }
+
+
+def record_status_changes(changes, new_status, today=None):
+    """
+    Move complaints between rollup counts as their status changes
+
+    changes are (complaint_id, previous status, previous submitted_date).
+    Complaints being submitted start counting under today's month. The
+    caller commits, so the counts change in the same transaction as the
+    status.
+    """
+    today = today or date.today()
+    moves = []
+    for complaint_id, previous_status, submitted_date in changes:
+        new_submitted_date = today if new_status == 'submitted' else submitted_date
+        before = is_counted(previous_status, submitted_date)
+        after = is_counted(new_status, new_submitted_date)
+        if before or after:
+            moves.append((complaint_id, before and (_month(submitted_date), previous_status),
+                          after and (_month(new_submitted_date), new_status)))
+    if not moves:
+        return
+
+    dimensions = _complaint_dimensions([complaint_id for complaint_id, _, _ in moves])
+    deltas = Counter()
+    for complaint_id, removed, added in moves:
+        if complaint_id not in dimensions:
+            continue
+        tenant_id, values = dimensions[complaint_id]
+        for dimension, value in values:
+            if removed:
+                deltas[(tenant_id, dimension, value) + removed] -= 1
+            if added:
+                deltas[(tenant_id, dimension, value) + added] += 1
+    _apply(deltas)
+
+
+def _live_counts(counts, batch_size):
+    """Count every filed complaint in the live tables into counts, walking by id"""
+    last_id = 0
+    while True:
+        rows = db.session.query(Complaint.id, Complaint.status, Complaint.submitted_date) \
+            .filter(Complaint.id > last_id, Complaint.status != 'draft') \
+            .order_by(Complaint.id).limit(batch_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        filed = {row.id: row for row in rows if is_counted(row.status, row.submitted_date)}
+        for complaint_id, (tenant_id, values) in _complaint_dimensions(list(filed)).items():
+            row = filed[complaint_id]
+            for dimension, value in values:
+                counts[(tenant_id, dimension, value, _month(row.submitted_date), row.status)] += 1
+
+
+def _archived_counts(counts):
+    """Count archived complaints (all closed) into counts from their payloads"""
+    query = db.session.query(ComplaintArchive.tenant_id, ComplaintArchive.payload).execution_options(yield_per=100)
+    for tenant_id, payload in query:
+        payload = json.loads(zlib.decompress(payload))
+        complaint = payload['complaint']
+        submitted_date = date.fromisoformat(complaint['submitted_date']) if complaint.get('submitted_date') else None
+        if not is_counted(complaint['status'], submitted_date):
+            continue
+        articles = [row['article_number'] for row in sorted(payload.get('cited_articles', []),
+                                                             key=lambda row: row.get('position') or 0)]
+        values = _dimension_values(complaint.get('state'), complaint.get('jurisdiction_type'),
+                                   complaint.get('transaction_type'),
+                                   articles or _legacy_articles(complaint.get('alleged_violations')))
+        for dimension, value in values:
+            counts[(tenant_id, dimension, value, _month(submitted_date), complaint['status'])] += 1
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recount the rollups from every filed complaint, live and archived
+
+    Covers the current tenant, or every tenant in the database outside
+    one. Returns the number of complaints counted.
+    """
+    counts = Counter()
+    _live_counts(counts, batch_size)
+    _archived_counts(counts)
+
+    db.session.execute(delete(ComplaintRollup).execution_options(synchronize_session=False))
+    rows = [
+        {'tenant_id': tenant_id, 'dimension': dimension, 'value': value, 'month': month, 'status': status, 'count': n}
+        for (tenant_id, dimension, value, month, status), n in counts.items()
+    ]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(ComplaintRollup), rows[start:start + batch_size])
+    db.session.commit()
+    return sum(n for (_, dimension, _, _, _), n in counts.items() if dimension == TOTAL)
+
+
+def _months_between(first, last):
+    year, month = map(int, first.split('-'))
+    months = []
+    while f'{year:04d}-{month:02d}' <= last:
+        months.append(f'{year:04d}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def complaint_report(group_by, start_month=None, end_month=None, statuses=None):
+    """
+    Filed complaint counts grouped by one dimension, shaped for a stacked chart
+
+    group_by is one of REPORT_GROUPS; start_month and end_month (YYYY-MM,
+    inclusive) limit the months submitted; statuses limits the statuses
+    counted. Returns {'labels', 'series': [{'name': status, 'data'}],
+    'totals', 'total'} with one data point per label. Months run in order
+    with empty months filled in; other labels run from most to fewest
+    complaints. A complaint citing several articles counts once per article.
+    Raises ValueError for a bad argument.
+    """
+    if group_by not in REPORT_GROUPS:
+        raise ValueError(f'group_by must be one of: {", ".join(REPORT_GROUPS)}')
+    for month in (start_month, end_month):
+        if month is not None and not MONTH_PATTERN.match(month):
+            raise ValueError('Months must be YYYY-MM')
+    statuses = [status for status in REPORT_STATUSES if status in statuses] if statuses else list(REPORT_STATUSES)
+
+    table = ComplaintRollup
+    group = table.month if group_by == 'month' else table.value
+    query = db.session.query(group, table.status, func.sum(table.count)) \
+        .filter(table.dimension == (TOTAL if group_by == 'month' else group_by), table.status.in_(statuses))
+    if start_month:
+        query = query.filter(table.month >= start_month)
+    if end_month:
+        query = query.filter(table.month <= end_month)
+    if group_by == 'month':
+        query = query.filter(table.month != '')
+
+    by_label = defaultdict(Counter)
+    for label, status, n in query.group_by(group, table.status):
+        if n:
+            by_label[label][status] += int(n)
+
+    if group_by == 'month':
+        present = sorted(by_label)
+        first = start_month or (present[0] if present else None)
+        last = end_month or (present[-1] if present else None)
+        keys = _months_between(first, last) if first and last else []
+    else:
+        keys = sorted(by_label, key=lambda label: (-sum(by_label[label].values()), label))
+
+    totals = [sum(by_label[key].values()) for key in keys]
+    return {
+        'labels': [key or UNSPECIFIED for key in keys],
+        'series': [{'name': status, 'data': [by_label[key][status] for key in keys]} for status in statuses],
+        'totals': totals,
+        'total': sum(totals),
+    }
@@ -0,0 +1,67 @@
+"""
+Background scheduler for nightly maintenance and webhook dispatch
+"""
+import logging
+from apscheduler.schedulers.background import BackgroundScheduler
+
+logger = logging.getLogger(__name__)
+
+scheduler = BackgroundScheduler(daemon=True)
+
+
+def _run_in_app_context(app, func, per_database=True):
+    """Wrap func to run in an app context, once per database (see utils.tenants) unless per_database is False"""
+    from utils.tenants import tenant_database_slugs, tenant_scope
+
+    def job():
+        with app.app_context():
+            for tenant_slug in [None] + (tenant_database_slugs() if per_database else []):
+                try:
+                    with tenant_scope(tenant_slug):
+                        func()
+                except Exception:
+                    logger.exception('Scheduled job %s failed on %s', func.__name__,
+                                     f'tenant database {tenant_slug}' if tenant_slug else 'the primary database')
+    job.__name__ = func.__name__
+    return job
+
+
+def init_scheduler(app):
+    """Register nightly jobs and start the scheduler when SCHEDULER_ENABLED"""
+    if not app.config.get('SCHEDULER_ENABLED') or scheduler.running:
+        return
+
+    from utils.deadline_status import refresh_deadline_statuses
+    from utils.webhooks import dispatch_pending, prune_outbox
+    from utils.reminder_digest import send_due_reminders
+    from utils.replicas import replica_bind_keys, write_heartbeat
+    from utils.backup import scheduled_backup
+
+    # Jobs record their last run in job_runs, so a catch-up run at startup and
+    # duplicate runs from multiple workers are both no-ops once the day is covered.
+    scheduler.add_job(_run_in_app_context(app, refresh_deadline_statuses),
+                      'cron', hour=0, minute=5, id='refresh_deadline_statuses',
+                      replace_existing=True)
+    scheduler.add_job(_run_in_app_context(app, refresh_deadline_statuses),
+                      id='refresh_deadline_statuses_startup', replace_existing=True)
+    # The first process to claim the day sends; the others return immediately
+    scheduler.add_job(_run_in_app_context(app, send_due_reminders),
+                      'cron', hour=app.config['REMINDER_SEND_HOUR'], minute=0, id='send_due_reminders',
+                      replace_existing=True)
+    # Subscriptions are leased, so concurrent dispatchers in other workers are safe
+    scheduler.add_job(_run_in_app_context(app, dispatch_pending),
+                      'interval', seconds=app.config['WEBHOOK_DISPATCH_INTERVAL'],
+                      id='dispatch_webhooks', replace_existing=True, coalesce=True, max_instances=1)
+    scheduler.add_job(_run_in_app_context(app, prune_outbox),
+                      'cron', hour=0, minute=20, id='prune_outbox', replace_existing=True)
+    if app.config.get('BACKUP_HOUR') is not None:
+        # One job covers every SQLite database; the first process to claim the day takes the backup
+        scheduler.add_job(_run_in_app_context(app, scheduled_backup, per_database=False),
+                          'cron', hour=app.config['BACKUP_HOUR'], minute=30, id='database_backup',
+                          replace_existing=True, coalesce=True, max_instances=1)
+    if replica_bind_keys(app.config):
+        # Replica lag is measured against this heartbeat; without it replicas are not used
+        scheduler.add_job(_run_in_app_context(app, write_heartbeat, per_database=False),
+                          'interval', seconds=app.config['REPLICA_HEARTBEAT_SECONDS'],
+                          id='replica_heartbeat', replace_existing=True, coalesce=True, max_instances=1)
+    scheduler.start()
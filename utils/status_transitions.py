@@ -0,0 +1,143 @@
+"""
+Complaint status state machine and set-based bulk transitions
+"""
+from datetime import date, datetime
+from sqlalchemy import and_, case, insert, update
+
+from models import db, Complaint, Note
+from utils.investigation_estimates import estimate_completion_window, record_closures
+from utils.outbox import record_events, COMPLAINT_STATUS_CHANGED
+from utils.rollups import record_status_changes
+
+
+STATUSES = ('draft', 'submitted', 'under_review', 'closed')
+
+# Allowed next statuses for each status
+TRANSITIONS = {
+    'draft': {'submitted', 'closed'},
+    'submitted': {'under_review', 'closed'},
+    'under_review': {'closed'},
+    'closed': set(),
+}
+
+# The subset complainants may apply to their own complaints; the rest is staff-only
+OWNER_TRANSITIONS = {
+    'draft': {'submitted', 'closed'},
+    'submitted': {'closed'},
+}
+
+
+class TransitionConflict(Exception):
+    """Complaints changed status between validation and update"""
+
+
+def can_transition(current_status, new_status, transitions=TRANSITIONS):
+    return new_status in transitions.get(current_status, set())
+
+
+def allowed_transitions(current_status, transitions=TRANSITIONS):
+    """Next statuses in workflow order"""
+    return [status for status in STATUSES if can_transition(current_status, status, transitions)]
+
+
+def transition_complaints(complaint_ids, new_status, comment=None, user_id=None,
+                          transitions=TRANSITIONS, today=None):
+    """
+    Move many complaints to new_status in one UPDATE plus multi-row Note and outbox inserts
+
+    Complaints that are missing (or not owned by user_id, when given) or
+    whose current status does not allow the transition are skipped and
+    reported. Moving to 'submitted' sets submitted_date and the estimated
+    investigation completion range for each complaint's state and
+    jurisdiction; moving a submitted complaint to 'closed' adds its
+    duration to the estimates. Report rollups follow the new status.
+
+    Returns dict with 'updated' (ids) and 'skipped' (id -> reason). The
+    caller commits.
+    """
+    if new_status not in STATUSES:
+        raise ValueError(f'Unknown status: {new_status}')
+    today = today or date.today()
+    complaint_ids = list(dict.fromkeys(complaint_ids))
+
+    query = db.session.query(Complaint.id, Complaint.tenant_id, Complaint.status, Complaint.state,
+                             Complaint.jurisdiction_type, Complaint.submitted_date) \
+        .filter(Complaint.id.in_(complaint_ids))
+    if user_id is not None:
+        query = query.filter(Complaint.user_id == user_id)
+    current = {row.id: row for row in query}
+
+    skipped = {}
+    eligible = []
+    for complaint_id in complaint_ids:
+        row = current.get(complaint_id)
+        if row is None:
+            skipped[complaint_id] = 'not found'
+        elif not can_transition(row.status, new_status, transitions):
+            skipped[complaint_id] = f'cannot move from {row.status} to {new_status}'
+        else:
+            eligible.append(complaint_id)
+
+    if not eligible:
+        return {'updated': [], 'skipped': skipped}
+
+    now = datetime.utcnow()
+    values = {'status': new_status, 'updated_at': now}
+    if new_status == 'closed':
+        values['closed_at'] = now
+    if new_status == 'submitted':
+        values['submitted_date'] = today
+        scopes = {(current[complaint_id].state, current[complaint_id].jurisdiction_type) for complaint_id in eligible}
+        windows = {scope: estimate_completion_window(today, *scope) for scope in scopes}
+        for column, bound in (('investigation_completion_earliest', 'earliest'),
+                              ('investigation_expected_completion', 'expected'),
+                              ('investigation_completion_latest', 'latest')):
+            if len(windows) == 1:
+                values[column] = next(iter(windows.values()))[bound]
+            else:
+                values[column] = case(*[
+                    (and_(Complaint.state.is_(state) if state is None else Complaint.state == state,
+                          Complaint.jurisdiction_type.is_(jurisdiction_type) if jurisdiction_type is None
+                          else Complaint.jurisdiction_type == jurisdiction_type), window[bound])
+                    for (state, jurisdiction_type), window in windows.items()
+                ])
+
+    # Re-check the source status in the WHERE clause so a concurrent change cannot slip through
+    from_statuses = [status for status in STATUSES if can_transition(status, new_status, transitions)]
+    result = db.session.execute(
+        update(Complaint)
+        .where(Complaint.id.in_(eligible), Complaint.status.in_(from_statuses))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(eligible):
+        db.session.rollback()
+        raise TransitionConflict('Some complaints changed status during the transition; retry')
+
+    if new_status == 'closed':
+        record_closures([(current[complaint_id].state, current[complaint_id].jurisdiction_type,
+                          current[complaint_id].submitted_date) for complaint_id in eligible], today)
+    record_status_changes([(complaint_id, current[complaint_id].status, current[complaint_id].submitted_date)
+                           for complaint_id in eligible], new_status, today)
+
+    message = f'Status changed to {new_status.replace("_", " ")}'
+    db.session.execute(insert(Note), [
+        {
+            'complaint_id': complaint_id,
+            'content': f'{message} (was {current[complaint_id].status.replace("_", " ")})'
+                       + (f': {comment}' if comment else ''),
+            'note_type': 'status_update',
+            'created_at': now
+        }
+        for complaint_id in eligible
+    ])
+    record_events(COMPLAINT_STATUS_CHANGED, [
+        (current[complaint_id].tenant_id, {
+            'complaint_id': complaint_id,
+            'status': new_status,
+            'previous_status': current[complaint_id].status
+        })
+        for complaint_id in eligible
+    ])
+    db.session.expire_all()
+    return {'updated': eligible, 'skipped': skipped}
@@ -0,0 +1,152 @@
+"""
+Garbage collection of upload files no Document row refers to
+
+Uploads are written before their row commits, so a failed commit leaves
+the file behind, and deleting a complaint deletes its Document rows but
+not their files. collect_orphaned_files() walks the upload and thumbnail
+folders of the primary and of each tenant database with os.scandir,
+checking the names in fixed-size batches against that database's
+documents table with one IN query per batch, so memory stays bounded
+however many files there are. Orphans are moved to QUARANTINE_FOLDER (or
+deleted). Files younger than the grace period are left alone: they may
+belong to an upload or restore whose transaction has not committed yet.
+"""
+import os
+import shutil
+import time
+from datetime import datetime
+from itertools import islice
+from flask import current_app, g
+from sqlalchemy import select
+
+from models import db, Document
+from utils.db_routing import tenant_bind
+from utils.tenants import run_per_database, tenant_folder
+
+
+SCAN_BATCH_SIZE = 500
+
+
+def _scan_files(folder):
+    """Yield DirEntry objects for the files directly in folder as the OS lists them, skipping dotfiles (.gitkeep)"""
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.name.startswith('.') and entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _referenced_uploads(names):
+    """The names among names that are some Document's stored filename"""
+    rows = db.session.execute(select(Document.filename).where(Document.filename.in_(names)))
+    return {row[0] for row in rows}
+
+
+def _referenced_thumbnails(names):
+    """The names among names that are the thumbnail of an existing Document (<document id>.jpg)"""
+    by_id = {}
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == '.jpg' and stem.isdigit():
+            by_id[int(stem)] = name
+    if not by_id:
+        return set()
+    rows = db.session.execute(
+        select(Document.id).where(Document.id.in_(list(by_id)), Document.thumbnail_path.isnot(None))
+    )
+    return {by_id[row[0]] for row in rows}
+
+
+# (label, config key of the folder, referenced-name lookup)
+STORES = (
+    ('uploads', 'UPLOAD_FOLDER', _referenced_uploads),
+    ('thumbnails', 'THUMBNAIL_FOLDER', _referenced_thumbnails),
+)
+
+
+def _quarantine(path, destination):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.replace(path, destination)
+    except OSError:
+        shutil.move(path, destination)  # quarantine on another filesystem
+
+
+def _collect_database(action, cutoff, quarantine_root, dry_run, report):
+    """Orphans of the current database's folders (see utils.tenants.tenant_folder)"""
+    totals = {'scanned': 0, 'orphans': 0, 'bytes': 0, 'skipped_recent': 0}
+    for store, folder_key, referenced in STORES:
+        folder = tenant_folder(folder_key)
+        if tenant_bind() is not None:
+            store = f'{g.tenant_slug}/{store}'
+        for batch in _batched(_scan_files(folder), SCAN_BATCH_SIZE):
+            totals['scanned'] += len(batch)
+            # Ending the transaction per batch keeps each lookup on a fresh snapshot
+            # and avoids holding one read transaction open for the whole scan
+            kept = referenced([entry.name for entry in batch])
+            db.session.rollback()
+
+            for entry in batch:
+                if entry.name in kept:
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    totals['skipped_recent'] += 1
+                    continue
+                totals['orphans'] += 1
+                totals['bytes'] += stat.st_size
+                if report is not None:
+                    report(store, entry.path, stat.st_size)
+                if dry_run:
+                    continue
+                try:
+                    if action == 'delete':
+                        os.remove(entry.path)
+                    else:
+                        _quarantine(entry.path, os.path.join(quarantine_root, store, entry.name))
+                except FileNotFoundError:
+                    pass
+    return totals
+
+
+def collect_orphaned_files(action='quarantine', min_age_seconds=None, dry_run=False, report=None):
+    """
+    Quarantine or delete upload and thumbnail files with no Document row
+
+    action is 'quarantine' (move under QUARANTINE_FOLDER/<timestamp>/) or
+    'delete'. Files modified within min_age_seconds (default
+    STORAGE_GC_MIN_AGE_SECONDS) are skipped. With dry_run nothing is
+    touched. report, if given, is called with (store, path, size) for
+    every orphan found. The primary and each tenant database are checked
+    against their own folders. Queries never use replicas: a lagging one
+    would make just-uploaded files look orphaned.
+
+    Returns totals: scanned, orphans, bytes and skipped_recent per run.
+    """
+    if action not in ('quarantine', 'delete'):
+        raise ValueError(f'Unknown action: {action}')
+    config = current_app.config
+    if min_age_seconds is None:
+        min_age_seconds = config['STORAGE_GC_MIN_AGE_SECONDS']
+    cutoff = time.time() - min_age_seconds
+    quarantine_root = os.path.join(config['QUARANTINE_FOLDER'], datetime.utcnow().strftime('%Y%m%dT%H%M%S'))
+
+    totals = {'scanned': 0, 'orphans': 0, 'bytes': 0, 'skipped_recent': 0}
+    for database_totals in run_per_database(_collect_database, action, cutoff, quarantine_root, dry_run, report):
+        for key, value in database_totals.items():
+            totals[key] += value
+    return totals
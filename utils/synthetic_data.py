@@ -0,0 +1,269 @@
+"""
+Synthetic data generation for benchmarks and capacity planning
+"""
+import multiprocessing
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from werkzeug.security import generate_password_hash
+
+from models import db, User, Complaint, ComplaintArticle, Document, Note, Reminder
+from utils.deadline_calculator import calculate_filing_deadline, days_until_deadline, get_deadline_bucket
+from utils.nar_code_articles import NAR_CODE_ARTICLES
+from utils.state_forms import STATE_REQUIREMENTS
+
+
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.example.com'
+SYNTHETIC_PASSWORD = 'synthetic-password'
+
+# Rough production mix of jurisdictions and transaction types
+JURISDICTION_WEIGHTS = {'state_board': 0.55, 'nar_association': 0.35, 'civil_court': 0.10}
+TRANSACTION_WEIGHTS = {'buyer': 0.45, 'seller': 0.35, 'lease': 0.12, 'commercial': 0.05, 'other': 0.03}
+STATUS_WEIGHTS = {'draft': 0.40, 'submitted': 0.30, 'under_review': 0.20, 'closed': 0.10}
+INVESTIGATION_DAYS = {'state_board': 210, 'nar_association': 120, 'civil_court': 300}  # mean submitted-to-closed
+FILE_TYPES = ['contract', 'correspondence', 'check', 'listing_agreement', 'inspection_report', 'other']
+FILE_EXTENSIONS = ['pdf', 'pdf', 'pdf', 'jpg', 'png', 'docx', 'txt']
+REMINDER_INTERVALS = [90, 30, 7, 1]
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Maria', 'Carlos', 'Wei', 'Aisha']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Nguyen', 'Patel', 'Kim', 'Okafor', 'Cohen', 'Silva']
+BROKERAGES = ['Coastal Realty', 'Summit Properties', 'Keystone Homes', 'Lakeside Brokers',
+              'Prairie Real Estate Group', 'Metro Living Realty']
+NARRATIVE_SENTENCES = [
+    'The respondent failed to disclose a known defect in the roof.',
+    'Earnest money was not deposited within the required timeframe.',
+    'Multiple offers were received but only one was presented to the seller.',
+    'The listing described the property as renovated, which was not accurate.',
+    'The respondent did not return repeated phone calls and emails.',
+    'A referral fee was paid to the respondent without our knowledge.',
+    'The closing was delayed because required documents were never sent.',
+    'The respondent represented both parties without written consent.',
+]
+
+
+def _weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _user_row(rng, user_id, password_hash):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    return {
+        'id': user_id,
+        'email': f'user{user_id}@{SYNTHETIC_EMAIL_DOMAIN}',
+        'password_hash': password_hash,
+        'first_name': first_name,
+        'last_name': last_name,
+        'phone': f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+        'user_type': 'realtor' if rng.random() < 0.3 else 'consumer',
+        'created_at': datetime.utcnow() - timedelta(days=rng.randint(0, 1000))
+    }
+
+
+def _complaint_row(rng, complaint_id, user_id, today):
+    state = rng.choice(list(STATE_REQUIREMENTS))
+    jurisdiction_type = _weighted_choice(rng, JURISDICTION_WEIGHTS)
+    incident_date = today - timedelta(days=rng.randint(0, 900))
+    articles = []
+    if jurisdiction_type == 'nar_association':
+        articles = rng.sample(list(NAR_CODE_ARTICLES), rng.randint(1, 3))
+    created_at = datetime.combine(incident_date, datetime.min.time()) + timedelta(days=rng.randint(1, 60))
+    filing_deadline = calculate_filing_deadline(incident_date, jurisdiction_type, state)
+    deadline_status, _, _, urgency_rank = get_deadline_bucket(days_until_deadline(filing_deadline))
+    status = _weighted_choice(rng, STATUS_WEIGHTS)
+    submitted_date = closed_at = None
+    if status != 'draft':
+        submitted_date = min(today, created_at.date() + timedelta(days=rng.randint(0, 14)))
+    if status == 'closed':
+        duration = max(14, round(rng.gauss(INVESTIGATION_DAYS.get(jurisdiction_type, 180), 60)))
+        closed_at = datetime.combine(submitted_date, datetime.min.time()) + timedelta(days=duration)
+        if closed_at.date() > today:
+            status, closed_at = 'under_review', None  # still being investigated
+    return articles, {
+        'id': complaint_id,
+        'user_id': user_id,
+        'title': f'Complaint against {rng.choice(LAST_NAMES)} ({state})',
+        'status': status,
+        'jurisdiction_type': jurisdiction_type,
+        'state': state,
+        'respondent_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'respondent_license_number': f'{state}{rng.randint(100000, 999999)}',
+        'respondent_brokerage': rng.choice(BROKERAGES),
+        'respondent_is_realtor': jurisdiction_type == 'nar_association' or rng.random() < 0.5,
+        'incident_date': incident_date,
+        'incident_location': f'{rng.randint(1, 9999)} Main St',
+        'transaction_type': _weighted_choice(rng, TRANSACTION_WEIGHTS),
+        'complaint_narrative': ' '.join(rng.choices(NARRATIVE_SENTENCES, k=rng.randint(3, 12))),
+        'filing_deadline': filing_deadline,
+        'deadline_status': deadline_status,
+        'urgency_rank': urgency_rank,
+        'submitted_date': submitted_date,
+        'closed_at': closed_at,
+        'created_at': created_at,
+        'updated_at': created_at + timedelta(days=rng.randint(0, 30))
+    }
+
+
+def generate_rows(rng, first_ids, users, complaints_per_user, notes_per_complaint,
+                  documents_per_complaint, password_hash, today=None):
+    """
+    Generate row dicts for every table
+
+    Returns dict of table name -> list of row dicts with explicit primary keys,
+    starting at first_ids[table], so child rows can reference parents without
+    a round trip to the database.
+    """
+    today = today or date.today()
+    rows = {table: [] for table, _ in TABLE_MODELS}
+    complaint_id = first_ids['complaints']
+    note_id = first_ids['notes']
+    document_id = first_ids['documents']
+    reminder_id = first_ids['reminders']
+
+    for user_id in range(first_ids['users'], first_ids['users'] + users):
+        rows['users'].append(_user_row(rng, user_id, password_hash))
+
+        for _ in range(max(0, round(rng.gauss(complaints_per_user, complaints_per_user / 3)))):
+            articles, complaint = _complaint_row(rng, complaint_id, user_id, today)
+            rows['complaints'].append(complaint)
+            for position, article_number in enumerate(articles):
+                rows['complaint_articles'].append({
+                    'complaint_id': complaint_id, 'article_number': article_number, 'position': position
+                })
+
+            rows['notes'].append({
+                'id': note_id, 'complaint_id': complaint_id, 'content': 'Complaint created',
+                'note_type': 'system', 'created_at': complaint['created_at']
+            })
+            note_id += 1
+            for _ in range(rng.randint(0, notes_per_complaint * 2)):
+                rows['notes'].append({
+                    'id': note_id, 'complaint_id': complaint_id,
+                    'content': rng.choice(NARRATIVE_SENTENCES), 'note_type': 'user',
+                    'created_at': complaint['created_at'] + timedelta(hours=rng.randint(1, 2000))
+                })
+                note_id += 1
+
+            for _ in range(rng.randint(0, documents_per_complaint * 2)):
+                extension = rng.choice(FILE_EXTENSIONS)
+                filename = f'{complaint_id}_{document_id}_evidence.{extension}'
+                rows['documents'].append({
+                    'id': document_id, 'complaint_id': complaint_id, 'filename': filename,
+                    'original_filename': f'evidence.{extension}',
+                    'file_path': f'static/uploads/{filename}',
+                    'file_type': rng.choice(FILE_TYPES),
+                    'file_size': int(rng.lognormvariate(12, 1.2)),
+                    'uploaded_at': complaint['created_at'] + timedelta(hours=rng.randint(1, 2000))
+                })
+                document_id += 1
+
+            if complaint['filing_deadline']:
+                for days_before in REMINDER_INTERVALS:
+                    reminder_date = complaint['filing_deadline'] - timedelta(days=days_before)
+                    rows['reminders'].append({
+                        'id': reminder_id, 'user_id': user_id, 'complaint_id': complaint_id,
+                        'reminder_date': datetime.combine(reminder_date, datetime.min.time()),
+                        'reminder_type': 'filing_deadline',
+                        'message': f"{complaint['title']}: Filing deadline in {days_before} days",
+                        'is_sent': reminder_date < today,
+                        'created_at': complaint['created_at']
+                    })
+                    reminder_id += 1
+
+            complaint_id += 1
+
+    return rows
+
+
+TABLE_MODELS = [('users', User), ('complaints', Complaint), ('complaint_articles', ComplaintArticle),
+                ('notes', Note), ('documents', Document), ('reminders', Reminder)]
+
+
+def insert_rows(rows):
+    """Bulk insert generated rows in parent-before-child order"""
+    for table, model in TABLE_MODELS:
+        if rows[table]:
+            db.session.execute(model.__table__.insert(), rows[table])
+
+
+def _shift_ids(rows, bases):
+    """Offset chunk-local ids by the next free id of each table"""
+    for row in rows['users']:
+        row['id'] += bases['users']
+        row['email'] = f"user{row['id']}@{SYNTHETIC_EMAIL_DOMAIN}"
+    for row in rows['complaints']:
+        row['id'] += bases['complaints']
+        row['user_id'] += bases['users']
+    for row in rows['complaint_articles']:
+        row['complaint_id'] += bases['complaints']
+    for table in ('notes', 'documents', 'reminders'):
+        for row in rows[table]:
+            row['id'] += bases[table]
+            row['complaint_id'] += bases['complaints']
+            if 'user_id' in row:
+                row['user_id'] += bases['users']
+    for row in rows['documents']:
+        row['filename'] = f"{row['complaint_id']}_{row['id']}_{row['original_filename']}"
+        row['file_path'] = f"static/uploads/{row['filename']}"
+
+
+def _generate_chunk(args):
+    """Pool worker: generate one chunk of users with chunk-local ids"""
+    chunk_seed, users, complaints_per_user, notes_per_complaint, documents_per_complaint, password_hash = args
+    rng = random.Random(chunk_seed)
+    first_ids = {table: 0 for table, _ in TABLE_MODELS}
+    return generate_rows(rng, first_ids, users, complaints_per_user, notes_per_complaint,
+                         documents_per_complaint, password_hash)
+
+
+def seed_database(users=10, complaints_per_user=5, notes_per_complaint=3,
+                  documents_per_complaint=2, seed=42, password=SYNTHETIC_PASSWORD,
+                  workers=1, chunk_size=500, progress=None):
+    """
+    Seed the current app's database with synthetic data
+
+    Users are generated in chunks of chunk_size. With workers > 1, chunks are
+    generated in a process pool while the parent bulk-inserts and commits each
+    finished chunk, so memory stays bounded by a few chunks at any scale.
+    All synthetic users share one password (hashed once) so seeding stays fast.
+    Returns dict of table name -> rows inserted.
+    """
+    password_hash = generate_password_hash(password)
+    bases = {table: _next_id(model) for table, model in TABLE_MODELS if hasattr(model, 'id')}
+    counts = {table: 0 for table, _ in TABLE_MODELS}
+
+    chunk_args = []
+    for index, start in enumerate(range(0, users, chunk_size)):
+        chunk_args.append((seed + index, min(chunk_size, users - start), complaints_per_user,
+                           notes_per_complaint, documents_per_complaint, password_hash))
+
+    if workers > 1 and len(chunk_args) > 1:
+        pool = multiprocessing.Pool(workers)
+        chunks = pool.imap(_generate_chunk, chunk_args)
+    else:
+        pool = None
+        chunks = map(_generate_chunk, chunk_args)
+
+    try:
+        for rows in chunks:
+            _shift_ids(rows, bases)
+            insert_rows(rows)
+            db.session.commit()
+            for table, table_rows in rows.items():
+                if table in bases:
+                    bases[table] += len(table_rows)
+                counts[table] += len(table_rows)
+            if progress:
+                progress(counts)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return counts
@@ -0,0 +1,206 @@
+"""
+Multi-tenancy: one deployment serving several associations and state offices
+
+Every request belongs to a tenant, picked by its hostname (Tenant.hostname)
+and otherwise the default tenant. Tenant-owned models (TenantScoped: users,
+complaints, complaint archives, outbox events and webhook subscriptions)
+carry tenant_id, which new rows take from the current tenant, and every ORM
+SELECT, UPDATE and DELETE is filtered to the current tenant, so views need
+no tenant conditions of their own. Notes, documents and reminders belong to a tenant through their
+complaint or user. Code outside a request (CLI commands, scheduled jobs)
+has no current tenant and sees every tenant in the database it runs on.
+
+Tenants share the primary database unless TENANT_DATABASES gives one a
+database of its own: the session then sends all of that tenant's
+statements there (only the tenants directory stays on the primary), and
+its uploads, thumbnails and archive files go to per-tenant subfolders. A
+large tenant's tables, locks and maintenance never touch anyone else's.
+CLI commands work on one such database with --tenant; scheduled jobs run
+once per database.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import click
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import with_loader_criteria
+
+from models import db, Complaint, OutboxEvent, Tenant, TenantScoped, upgrade_schema
+from utils.db_routing import DEFAULT_TENANT_ID, route_to_tenant, tenant_bind
+
+
+DEFAULT_TENANT_SLUG = 'default'
+TENANT_CACHE_SECONDS = 60
+
+_directory_lock = threading.Lock()
+_directory = {'loaded_at': None, 'by_host': {}, 'by_slug': {}}
+
+
+def tenant_bind_key(slug):
+    """SQLALCHEMY_BINDS key of a tenant's own database"""
+    return f'tenant_{slug}'
+
+
+def tenant_database_slugs(config=None):
+    """Slugs of the tenants configured with a database of their own"""
+    config = config or current_app.config
+    return list(config.get('TENANT_DATABASES', {}))
+
+
+def _load_directory():
+    """(id, slug) of every tenant by hostname and by slug, reloaded every TENANT_CACHE_SECONDS"""
+    loaded_at = _directory['loaded_at']
+    if loaded_at is not None and time.monotonic() - loaded_at < TENANT_CACHE_SECONDS:
+        return _directory
+    with _directory_lock:
+        if _directory['loaded_at'] == loaded_at:
+            rows = db.session.query(Tenant.id, Tenant.slug, Tenant.hostname).all()
+            _directory['by_host'] = {row.hostname.lower(): (row.id, row.slug) for row in rows if row.hostname}
+            _directory['by_slug'] = {row.slug: (row.id, row.slug) for row in rows}
+            _directory['loaded_at'] = time.monotonic()
+    return _directory
+
+
+def invalidate_tenant_directory():
+    _directory['loaded_at'] = None
+
+
+def _activate(tenant_id, slug):
+    bind_key = tenant_bind_key(slug)
+    route_to_tenant(tenant_id, slug, bind_key if bind_key in current_app.config['SQLALCHEMY_BINDS'] else None)
+
+
+def tenant_for_host(host):
+    """(id, slug) of the tenant serving host (port ignored), or the default tenant"""
+    directory = _load_directory()
+    hostname = (host or '').split(':', 1)[0].lower()
+    return directory['by_host'].get(hostname) or directory['by_slug'].get(DEFAULT_TENANT_SLUG) or \
+        (DEFAULT_TENANT_ID, DEFAULT_TENANT_SLUG)
+
+
+@contextmanager
+def tenant_scope(slug):
+    """
+    Run the enclosed code as tenant slug (None: no tenant, all of the primary's)
+
+    The session is closed on entry and exit so objects loaded from one
+    database are never reused against another; commit before switching.
+    Raises LookupError for an unknown slug.
+    """
+    previous = (g.get('tenant_id'), g.get('tenant_slug'), g.get('_tenant_bind'))
+    if slug is not None:
+        invalidate_tenant_directory()
+        tenant = _load_directory()['by_slug'].get(slug)
+        if tenant is None:
+            raise LookupError(f'No tenant {slug!r}')
+    db.session.close()
+    if slug is None:
+        route_to_tenant(None)
+    else:
+        _activate(*tenant)
+    try:
+        yield
+    finally:
+        db.session.close()
+        route_to_tenant(*previous)
+
+
+def run_per_database(func, *args, **kwargs):
+    """Call func once on the primary (every tenant sharing it) and once per tenant database"""
+    results = []
+    for slug in [None] + tenant_database_slugs():
+        with tenant_scope(slug):
+            results.append(func(*args, **kwargs))
+    return results
+
+
+def tenant_folder(config_key):
+    """Folder setting config_key for the current tenant: a per-tenant subfolder when it has its own database"""
+    folder = current_app.config[config_key]
+    if tenant_bind() is not None:
+        return os.path.join(folder, g.tenant_slug)
+    return folder
+
+
+def tenant_option(command):
+    """Click option --tenant SLUG running the command against that tenant (and its own database)"""
+    @click.option('--tenant', 'tenant_slug', default=None, help="Scope to this tenant's rows, in its own database if it has one")
+    @wraps(command)
+    def wrapped(*args, tenant_slug=None, **kwargs):
+        if tenant_slug is None:
+            return command(*args, **kwargs)
+        try:
+            with tenant_scope(tenant_slug):
+                return command(*args, **kwargs)
+        except LookupError as e:
+            raise click.ClickException(str(e))
+    return wrapped
+
+
+def create_tenant(slug, name, hostname=None):
+    """Add a tenant to the directory; raises ValueError if the slug or hostname is taken"""
+    hostname = hostname.lower() if hostname else None
+    if db.session.query(Tenant.id).filter(Tenant.slug == slug).first():
+        raise ValueError(f'Tenant {slug!r} already exists')
+    if hostname and db.session.query(Tenant.id).filter(Tenant.hostname == hostname).first():
+        raise ValueError(f'Hostname {hostname} already belongs to a tenant')
+    tenant = Tenant(slug=slug, name=name, hostname=hostname)
+    db.session.add(tenant)
+    db.session.commit()
+    invalidate_tenant_directory()
+    return tenant
+
+
+def init_tenant_databases(app):
+    """
+    Ensure the default tenant exists, assign pre-tenancy rows to it, and
+    create or upgrade the tables of every tenant database
+    """
+    if db.session.get(Tenant, DEFAULT_TENANT_ID) is None:
+        db.session.add(Tenant(id=DEFAULT_TENANT_ID, slug=DEFAULT_TENANT_SLUG, name=app.config['TENANT_DEFAULT_NAME']))
+        db.session.commit()
+    # Events written before they carried a tenant take their complaint's
+    db.session.execute(update(OutboxEvent).where(OutboxEvent.tenant_id.is_(None))
+                       .values(tenant_id=select(Complaint.tenant_id)
+                               .where(Complaint.id == OutboxEvent.complaint_id).scalar_subquery())
+                       .execution_options(synchronize_session=False))
+    # Other rows written before tenant_id existed belong to the default tenant
+    for model in TenantScoped.__subclasses__():
+        db.session.execute(update(model).where(model.tenant_id.is_(None)).values(tenant_id=DEFAULT_TENANT_ID)
+                           .execution_options(synchronize_session=False))
+    db.session.commit()
+
+    tenant_tables = [table for table in db.metadata.sorted_tables if not table.info.get('shared')]
+    for slug in tenant_database_slugs(app.config):
+        engine = db.engines[tenant_bind_key(slug)]
+        existing = set(inspect(engine).get_table_names())
+        db.metadata.create_all(engine, tables=[table for table in tenant_tables if table.name not in existing])
+        upgrade_schema(engine)
+        # Everything in a tenant's own database is that tenant's, including rows from before tenant_id
+        tenant_id = db.session.query(Tenant.id).filter(Tenant.slug == slug).scalar()
+        if tenant_id is not None:
+            with engine.begin() as connection:
+                for model in TenantScoped.__subclasses__():
+                    connection.execute(update(model.__table__).where(model.__table__.c.tenant_id.is_(None))
+                                       .values(tenant_id=tenant_id))
+
+
+def init_tenants(app, session):
+    """Resolve each request's tenant from its host and filter tenant-owned queries to it"""
+
+    @app.before_request
+    def _resolve_tenant():
+        _activate(*tenant_for_host(request.host))
+
+    @event.listens_for(session, 'do_orm_execute')
+    def _scope_to_tenant(execute_state):
+        tenant_id = g.get('tenant_id') if has_app_context() else None
+        if tenant_id is None or execute_state.execution_options.get('all_tenants', False):
+            return
+        if execute_state.is_select or execute_state.is_update or execute_state.is_delete:
+            execute_state.statement = execute_state.statement.options(
+                with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+            )
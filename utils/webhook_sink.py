@@ -0,0 +1,87 @@
+"""
+Local HTTP stand-in for a partner webhook endpoint (flask webhook-sink)
+
+Accepts keep-alive POSTs, checks signatures, records event ids and can
+fail a fraction of requests to exercise retries.
+"""
+import hmac
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.webhooks import sign
+
+
+class WebhookSink:
+    """Records received events; start() serves in a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, secret=None, fail_rate=0.0, log=None):
+        self.secret = secret
+        self.fail_rate = fail_rate
+        self.log = log
+        self.event_ids = []
+        self.requests = 0
+        self.failures = 0
+        self.bad_signatures = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/webhook'
+
+    @property
+    def duplicates(self):
+        return len(self.event_ids) - len(set(self.event_ids))
+
+    def _handler_class(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep connections open between batches
+
+            def setup(self):
+                super().setup()
+                with sink._lock:
+                    sink.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status = sink.receive(body, self.headers)
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def receive(self, body, headers):
+        with self._lock:
+            self.requests += 1
+            if self.secret:
+                expected = sign(self.secret, headers.get('X-Webhook-Timestamp', ''), body)
+                if not hmac.compare_digest(expected, headers.get('X-Webhook-Signature', '')):
+                    self.bad_signatures += 1
+                    return 401
+            if random.random() < self.fail_rate:
+                self.failures += 1
+                return 503
+            events = json.loads(body)['events']
+            self.event_ids.extend(event['id'] for event in events)
+        if self.log:
+            self.log(f'{headers.get("X-Webhook-Delivery")}: {len(events)} events')
+        return 200
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
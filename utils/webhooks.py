@@ -0,0 +1,295 @@
+"""
+Batched webhook delivery of outbox events
+
+Each subscription keeps a cursor (last_event_id) that only advances after
+the partner acknowledges a batch with a 2xx response, so every event is
+delivered at least once; partners de-duplicate on the event id. Failed
+batches are retried with exponential backoff. Subscriptions are leased
+before delivery so several dispatchers can run at once.
+
+The cursor assumes outbox ids become visible in id order. SQLite serializes
+writers, so that holds there; on databases with concurrent writers only
+events older than WEBHOOK_SETTLE_SECONDS are sent, leaving time for slower
+transactions holding lower ids to commit.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from flask import current_app
+from sqlalchemy import or_, update, func
+
+from models import db, OutboxEvent, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 10
+MAX_ERROR_LENGTH = 500
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class KeepAliveClient:
+    """
+    Minimal thread-safe HTTP/1.1 client that reuses connections per host
+
+    A pooled connection the server has already closed fails on first use;
+    such requests are retried once on a fresh connection.
+    """
+
+    def __init__(self, timeout=10, max_idle_per_host=4):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            if self._idle[key]:
+                return self._idle[key].pop(), True
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            if len(self._idle[key]) < self.max_idle_per_host:
+                self._idle[key].append(connection)
+                return
+        connection.close()
+
+    def post(self, url, body, headers):
+        """POST body; returns (status, response body). Raises OSError/HTTPException on transport errors"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            connection, reused = self._acquire(key)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status, data
+
+    def close(self):
+        with self._lock:
+            connections = [c for pool in self._idle.values() for c in pool]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+
+_client = None
+
+
+def get_client():
+    """Process-wide pooled client"""
+    global _client
+    if _client is None:
+        _client = KeepAliveClient(timeout=current_app.config['WEBHOOK_TIMEOUT'])
+    return _client
+
+
+def generate_secret():
+    return secrets.token_hex(32)
+
+
+def sign(secret, timestamp, body):
+    """HMAC-SHA256 over '<timestamp>.<body>', as sent in X-Webhook-Signature"""
+    message = f'{timestamp}.'.encode() + body
+    return 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def deliver_batch(client, url, secret, body, delivery_id):
+    """Send one signed batch; returns None on success or an error string"""
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'GrievanceFilingService-Webhooks/1',
+        'X-Webhook-Delivery': delivery_id,
+        'X-Webhook-Timestamp': timestamp,
+        'X-Webhook-Signature': sign(secret, timestamp, body)
+    }
+    try:
+        status, data = client.post(url, body, headers)
+    except (http.client.HTTPException, OSError) as e:
+        return f'{type(e).__name__}: {e}'
+    if 200 <= status < 300:
+        return None
+    return f'HTTP {status}: {data[:200].decode("utf-8", "replace")}'
+
+
+def backoff_seconds(failure_count, max_backoff):
+    """Exponential backoff with jitter, capped at max_backoff"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (failure_count - 1), max_backoff)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _claim_subscriptions(now, lease_seconds):
+    """Lease every due subscription not already held by another dispatcher"""
+    available = or_(WebhookSubscription.locked_until.is_(None), WebhookSubscription.locked_until < now)
+    due = db.session.query(WebhookSubscription.id).filter(
+        WebhookSubscription.is_active.is_(True),
+        or_(WebhookSubscription.next_attempt_at.is_(None), WebhookSubscription.next_attempt_at <= now),
+        available
+    ).all()
+
+    claimed = []
+    for subscription_id, in due:
+        result = db.session.execute(
+            update(WebhookSubscription)
+            .where(WebhookSubscription.id == subscription_id, available)
+            .values(locked_until=now + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append(subscription_id)
+    db.session.commit()
+    return claimed
+
+
+def _event_json(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at.isoformat(),
+        'data': json.loads(event.payload)
+    }
+
+
+def dispatch_once(client=None, batch_size=None, max_workers=None, now=None):
+    """
+    Deliver at most one batch to each due subscription
+
+    Batches are built here, sent concurrently from a thread pool (HTTP only,
+    no database access) and their outcomes recorded here. Returns dict with
+    'batches', 'events', 'failures' and 'more' (a batch was full, so more
+    events are probably waiting).
+    """
+    config = current_app.config
+    client = client or get_client()
+    batch_size = batch_size or config['WEBHOOK_BATCH_SIZE']
+    now = now or datetime.utcnow()
+
+    stats = {'batches': 0, 'events': 0, 'failures': 0, 'more': False}
+    settled_before = now - timedelta(seconds=config['WEBHOOK_SETTLE_SECONDS'])
+    claimed = _claim_subscriptions(now, config['WEBHOOK_LEASE_SECONDS'])
+    if not claimed:
+        return stats
+
+    batches = []
+    for subscription in WebhookSubscription.query.filter(WebhookSubscription.id.in_(claimed)):
+        # Outside a tenant scope every tenant's events are visible; send only the subscriber's own
+        query = OutboxEvent.query.filter(OutboxEvent.tenant_id == subscription.tenant_id,
+                                         OutboxEvent.id > subscription.last_event_id,
+                                         OutboxEvent.created_at <= settled_before)
+        if subscription.event_type_list:
+            query = query.filter(OutboxEvent.event_type.in_(subscription.event_type_list))
+        events = query.order_by(OutboxEvent.id).limit(batch_size).all()
+        if not events:
+            subscription.locked_until = None
+            continue
+        delivery_id = f'{subscription.id}-{events[0].id}-{events[-1].id}'
+        body = json.dumps({
+            'subscription_id': subscription.id,
+            'delivery_id': delivery_id,
+            'events': [_event_json(event) for event in events]
+        }).encode()
+        batches.append((subscription, events[-1].id, len(events), subscription.url, subscription.secret,
+                        body, delivery_id))
+
+    with ThreadPoolExecutor(max_workers=max_workers or config['WEBHOOK_MAX_WORKERS']) as executor:
+        futures = [executor.submit(deliver_batch, client, url, secret, body, delivery_id)
+                   for _, _, _, url, secret, body, delivery_id in batches]
+        outcomes = [future.result() for future in futures]
+
+    finished = datetime.utcnow()
+    for (subscription, last_id, count, url, _, _, delivery_id), error in zip(batches, outcomes):
+        subscription.locked_until = None
+        stats['batches'] += 1
+        if error is None:
+            subscription.last_event_id = last_id
+            subscription.failure_count = 0
+            subscription.next_attempt_at = None
+            subscription.last_error = None
+            subscription.last_delivered_at = finished
+            stats['events'] += count
+            stats['more'] = stats['more'] or count == batch_size
+        else:
+            subscription.failure_count += 1
+            delay = backoff_seconds(subscription.failure_count, config['WEBHOOK_MAX_BACKOFF'])
+            subscription.next_attempt_at = finished + timedelta(seconds=delay)
+            subscription.last_error = error[:MAX_ERROR_LENGTH]
+            stats['failures'] += 1
+            logger.warning('Webhook delivery %s to %s failed (attempt %d, retry in %ds): %s',
+                           delivery_id, url, subscription.failure_count, delay, error)
+    db.session.commit()
+    return stats
+
+
+def dispatch_pending(max_passes=20):
+    """Drain the outbox: repeat dispatch_once while batches come back full"""
+    totals = {'batches': 0, 'events': 0, 'failures': 0}
+    for _ in range(max_passes):
+        stats = dispatch_once()
+        for key in totals:
+            totals[key] += stats[key]
+        if not stats['more']:
+            break
+    return totals
+
+
+def prune_outbox(retention_days=None):
+    """
+    Delete old events every active subscription has acknowledged
+
+    Returns the number of events deleted.
+    """
+    retention_days = retention_days or current_app.config['OUTBOX_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    query = OutboxEvent.query.filter(OutboxEvent.created_at < cutoff)
+
+    has_active = db.session.query(WebhookSubscription.id).filter(WebhookSubscription.is_active.is_(True)).first()
+    if has_active:
+        acknowledged = db.session.query(func.min(WebhookSubscription.last_event_id)) \
+            .filter(WebhookSubscription.is_active.is_(True)).scalar()
+        query = query.filter(OutboxEvent.id <= acknowledged)
+
+    deleted = query.delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def run_dispatcher(interval=None, once=False):
+    """Poll the outbox until interrupted, sleeping only when there is no backlog"""
+    interval = interval or current_app.config['WEBHOOK_DISPATCH_INTERVAL']
+    if once:
+        return dispatch_pending()
+    last_pruned = time.monotonic()
+    while True:
+        stats = dispatch_once()
+        if time.monotonic() - last_pruned > PRUNE_INTERVAL_SECONDS:
+            prune_outbox()
+            last_pruned = time.monotonic()
+        if not stats['more']:
+            time.sleep(interval)